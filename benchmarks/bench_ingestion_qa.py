@@ -0,0 +1,205 @@
+"""
+End-to-end benchmark of document ingestion and question answering
+
+A synthetic corpus is generated, ingested (`DocumentProcessor` + `EmbeddingService.add_documents`)
+and queried (`QAService.answer_question` and the `/ask` endpoint) against a deterministic fake
+Ollama server with a configurable token latency. The report (throughput, p50/p95/p99 latencies
+and peak RSS per phase) is printed as JSON, and written to `--output` for comparing runs.
+All the data goes to a temporary directory. Run it from the repository root:
+
+    python -m benchmarks.bench_ingestion_qa --documents 30 --questions 100 --fake-embeddings
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.corpus import generate_corpus, questions as make_questions
+from benchmarks.fake_ollama import FakeOllamaServer
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def summarize(samples: List[float], elapsed: float, count: int) -> Dict[str, float]:
+    """
+    Throughput and latency percentiles (milliseconds) of a phase
+    """
+    ordered = sorted(samples)
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+    return {
+        "count": count,
+        "elapsed_s": elapsed,
+        "throughput_per_s": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+        "peak_rss_bytes": peak_rss_bytes()
+    }
+
+def isolate_data(data_dir: Path, args: argparse.Namespace):
+    """
+    Point the settings at a scratch data directory and at the fake Ollama server
+    Has to run before `intelli_docs` is imported, since the settings are read at import time
+    """
+    processed = data_dir / "processed"
+    vector_store = processed / "vector_store"
+    os.environ.update({
+        "DATA_DIR": str(data_dir),
+        "RAW_DATA_DIR": str(data_dir / "raw"),
+        "PROCESSED_DATA_DIR": str(processed),
+        "VECTOR_STORE_PATH": str(vector_store),
+        "MANIFEST_DIR": str(data_dir / "manifests"),
+        "BM25_INDEX_PATH": str(data_dir / "bm25" / "bm25_index.npz"),
+        "EMBEDDING_CACHE_DIR": str(processed / "embedding_cache"),
+        "OLLAMA_BASE_URL": args.ollama_url,
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "PIPELINE_MODE": args.pipeline_mode,
+        "RETRIEVAL_MODE": args.retrieval_mode
+    })
+    (data_dir / "manifests").mkdir(parents=True, exist_ok=True)
+
+def bench_ingestion(paths: List[Path], embedding_service) -> Dict[str, Any]:
+    from intelli_docs.services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    processing, embedding, total = [], [], []
+    n_chunks = 0
+    n_bytes = sum(path.stat().st_size for path in paths)
+    started = time.perf_counter()
+    for path in paths:
+        t0 = time.perf_counter()
+        documents = processor.process_file(str(path))
+        t1 = time.perf_counter()
+        embedding_service.add_documents(documents)
+        t2 = time.perf_counter()
+        processing.append(t1 - t0)
+        embedding.append(t2 - t1)
+        total.append(t2 - t0)
+        n_chunks += len(documents)
+    elapsed = time.perf_counter() - started
+
+    report = summarize(total, elapsed, len(paths))
+    report.update({
+        "chunks": n_chunks,
+        "chunks_per_s": n_chunks / elapsed if elapsed > 0 else 0.0,
+        "mb_per_s": n_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+        "extract_and_chunk": summarize(processing, sum(processing), len(paths)),
+        "embed_and_store": summarize(embedding, sum(embedding), len(paths))
+    })
+    return report
+
+def bench_answer_question(qa_service, questions: List[str], n_context_docs: int) -> Dict[str, Any]:
+    samples = []
+    started = time.perf_counter()
+    for question in questions:
+        t0 = time.perf_counter()
+        qa_service.answer_question(question, n_context_docs=n_context_docs)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started, len(questions))
+
+async def bench_ask(app, questions: List[str], n_context_docs: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    from intelli_docs.core.config import settings
+
+    samples = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def ask(question: str):
+            nonlocal errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                response = await client.post(
+                    f"{settings.API_V1_STR}/ask",
+                    json={"question": question, "n_context_docs": n_context_docs}
+                )
+                samples.append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(ask(question) for question in questions))
+        elapsed = time.perf_counter() - started
+    report = summarize(samples, elapsed, len(questions))
+    report.update({"concurrency": concurrency, "errors": errors})
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion and QA benchmark against a fake Ollama server")
+    parser.add_argument("--documents", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--formats", default="txt,docx,pdf")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--n-context-docs", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent /ask requests")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--first-token-ms", type=float, default=20.0)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--pipeline-mode", choices=["full", "cheap"], default="full")
+    parser.add_argument("--retrieval-mode", choices=["vector", "bm25", "hybrid"], default="vector")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache enabled")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing embeddings instead of the model")
+    parser.add_argument("--skip-sync", action="store_true", help="skip the QAService.answer_question phase")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="intelli-docs-bench-") as tmp, FakeOllamaServer(
+        token_latency_ms=args.token_latency_ms,
+        first_token_ms=args.first_token_ms,
+        response_tokens=args.response_tokens
+    ) as ollama:
+        args.ollama_url = ollama.base_url
+        isolate_data(Path(tmp) / "data", args)
+
+        from intelli_docs.core.config import settings
+        from intelli_docs.core.registry import registry
+        if args.fake_embeddings:
+            from benchmarks.fake_embeddings import HashingEmbeddings
+            registry.set_embeddings(settings.EMBEDDING_MODEL, HashingEmbeddings())
+
+        started = time.perf_counter()
+        # the API module creates the services shared by the routes
+        from intelli_docs.main import app
+        from intelli_docs.api.routes import qa
+        startup = time.perf_counter() - started
+
+        paths = generate_corpus(Path(tmp) / "corpus", args.documents, args.pages, args.page_chars, args.formats.split(","), args.seed)
+        questions = make_questions(args.questions, args.documents, args.page_chars, args.seed)
+
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "startup_s": startup,
+            "ingestion": bench_ingestion(paths, qa.embedding_service)
+        }
+        if not args.skip_sync:
+            report["answer_question"] = bench_answer_question(qa.qa_service, questions, args.n_context_docs)
+        report["ask"] = asyncio.run(bench_ask(app, questions, args.n_context_docs, args.concurrency))
+        report["llm_requests"] = ollama.requests
+        report["peak_rss_bytes"] = peak_rss_bytes()
+
+        qa.ingestion_queue.shutdown()
+        qa.qa_service.close()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+if __name__ == "__main__":
+    main()
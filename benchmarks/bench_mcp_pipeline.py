@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the Python-side overhead of the MCP pipeline
+
+The LLM is replaced by zero-latency fakes, so the measured time is everything the pipeline
+does around the LLM calls (formatting prompts, running the chains, scheduling the steps and
+parsing the results). Run it from the repository root:
+
+    python -m benchmarks.bench_mcp_pipeline --iterations 2000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from langchain.llms.fake import FakeListLLM
+
+from intelli_docs.core.mcp import MCPPipeline, DOCUMENT_ANALYSIS_STEP, ANSWER_GENERATION_STEP
+
+class InstantOllamaClient:
+    """
+    Stand-in for `OllamaClient` that answers immediately
+    """
+
+    async def generate(self, prompt: str, options: Dict[str, Any] = None) -> str:
+        return "key point one\nkey point two"
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Latency summary of the samples (seconds) in microseconds
+    """
+    ordered = sorted(samples)
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e6
+    return {
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99)
+    }
+
+def build_pipeline() -> MCPPipeline:
+    pipeline = MCPPipeline(client=InstantOllamaClient())
+    # the chains are bound to the LLM at add_step time
+    pipeline.llm = FakeListLLM(responses=["key point one\nkey point two"])
+    pipeline.add_step(DOCUMENT_ANALYSIS_STEP)
+    pipeline.add_step(ANSWER_GENERATION_STEP)
+    return pipeline
+
+def bench_sync(pipeline: MCPPipeline, context: Dict[str, Any], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        pipeline.execute(context)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+async def bench_async(pipeline: MCPPipeline, context: Dict[str, Any], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await pipeline.aexecute(context)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request overhead of MCPPipeline, excluding the LLM")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--context-chars", type=int, default=3000, help="size of the document content")
+    args = parser.parse_args()
+
+    pipeline = build_pipeline()
+    context = {
+        "document_content": "lorem ipsum " * (args.context_chars // 12),
+        "query": "What does the document say?"
+    }
+
+    # warm up the chains and the event loop machinery
+    bench_sync(pipeline, context, 10)
+    asyncio.run(bench_async(pipeline, context, 10))
+
+    report = {
+        "iterations": args.iterations,
+        "steps": [step.name for step in pipeline.steps],
+        "execute": summarize(bench_sync(pipeline, context, args.iterations)),
+        "aexecute": summarize(asyncio.run(bench_async(pipeline, context, args.iterations)))
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
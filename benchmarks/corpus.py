@@ -0,0 +1,135 @@
+"""
+Synthetic PDF / DOCX / TXT corpora for benchmarks
+
+Documents are built from a seeded vocabulary, so the same arguments always produce the same
+files (and the same chunks). Run it on its own to write a corpus to a directory:
+
+    python -m benchmarks.corpus --output /tmp/corpus --documents 20 --pages 10
+"""
+import argparse
+import random
+from pathlib import Path
+from typing import List
+
+from docx import Document
+
+VOCABULARY_SIZE = 5000
+
+def vocabulary(rng: random.Random, size: int = VOCABULARY_SIZE) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def paragraph(rng: random.Random, words: List[str], n_words: int) -> str:
+    # a skewed choice of words, so that some terms are frequent like in real text
+    sentence = [words[min(len(words) - 1, int(rng.paretovariate(1.2)) - 1)] if rng.random() < 0.5 else rng.choice(words) for _ in range(n_words)]
+    return " ".join(sentence).capitalize() + "."
+
+def pages(seed: int, n_pages: int, page_chars: int) -> List[str]:
+    """
+    Text of the pages of a document
+    """
+    rng = random.Random(seed)
+    words = vocabulary(random.Random(0))
+    result = []
+    for _ in range(n_pages):
+        paragraphs = []
+        size = 0
+        while size < page_chars:
+            paragraphs.append(paragraph(rng, words, rng.randint(40, 120)))
+            size += len(paragraphs[-1]) + 1
+        result.append("\n".join(paragraphs))
+    return result
+
+def write_txt(path: Path, texts: List[str]):
+    path.write_text("\n\n".join(texts), encoding="utf-8")
+
+def write_docx(path: Path, texts: List[str]):
+    document = Document()
+    for text in texts:
+        for line in text.split("\n"):
+            document.add_paragraph(line)
+        document.add_page_break()
+    document.save(str(path))
+
+def write_pdf(path: Path, texts: List[str], line_chars: int = 90):
+    """
+    Minimal PDF with one text page per entry (Helvetica, one line of text per `line_chars`)
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(texts)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(texts)} >>")
+    font_id = 3 + 2 * len(texts)
+    for text in texts:
+        flat = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").replace("\n", " ")
+        lines = [flat[i:i + line_chars] for i in range(0, len(flat), line_chars)]
+        stream = "BT /F1 8 Tf 10 TL 36 780 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {len(objects) + 2} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += b"".join(f"{offset:010d} 00000 n \n".encode("ascii") for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    path.write_bytes(out)
+
+WRITERS = {"txt": write_txt, "docx": write_docx, "pdf": write_pdf}
+
+def generate_corpus(
+    output_dir: Path,
+    n_documents: int,
+    n_pages: int = 10,
+    page_chars: int = 3000,
+    formats: List[str] = ("txt", "docx", "pdf"),
+    seed: int = 42
+) -> List[Path]:
+    """
+    Write `n_documents` documents (cycling through `formats`) and return their paths
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_documents):
+        file_format = formats[i % len(formats)]
+        path = output_dir / f"doc_{i:04d}.{file_format}"
+        WRITERS[file_format](path, pages(seed + i, n_pages, page_chars))
+        paths.append(path)
+    return paths
+
+def questions(n_questions: int, n_documents: int, page_chars: int = 3000, seed: int = 42) -> List[str]:
+    """
+    Questions about passages of the corpus (of `generate_corpus` with the same arguments), so that
+    retrieval finds relevant chunks instead of exiting early
+    """
+    rng = random.Random(seed)
+    first_pages = [pages(seed + i, 1, page_chars)[0].split() for i in range(min(n_documents, 50))]
+    result = []
+    for _ in range(n_questions):
+        words = rng.choice(first_pages)
+        start = rng.randrange(max(1, len(words) - 12))
+        result.append(f"What does the document say about {' '.join(words[start:start + 12]).rstrip('.')}?")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic document corpus")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--formats", default="txt,docx,pdf")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = generate_corpus(Path(args.output), args.documents, args.pages, args.page_chars, args.formats.split(","), args.seed)
+    print(f"Wrote {len(paths)} documents to {args.output}")
+
+if __name__ == "__main__":
+    main()
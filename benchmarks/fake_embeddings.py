@@ -0,0 +1,33 @@
+"""
+Hashing embeddings, a fast deterministic stand-in for the embedding model in benchmarks
+
+Every token is hashed into one of `dimensions` signed buckets and the vector is L2 normalized,
+so texts sharing words are close in cosine distance - enough for retrieval to behave sensibly
+while costing almost nothing next to a transformer forward pass.
+"""
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if (digest >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
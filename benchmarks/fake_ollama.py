@@ -0,0 +1,175 @@
+"""
+Deterministic stand-in for the Ollama HTTP API, for benchmarks
+
+Serves `POST /api/generate` (streamed as NDJSON or not, like Ollama) from a background thread.
+The response to a prompt only depends on the prompt, and its tokens are produced at a fixed
+latency, so runs are reproducible and the measured time is the service's own overhead plus a
+known LLM cost. It can also be run on its own to point a live server at it:
+
+    python -m benchmarks.fake_ollama --port 11434 --token-latency-ms 20
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+WORDS = (
+    "the document describes a process for handling requests and the answer depends on the "
+    "configuration of each component which is explained in the section about deployment"
+).split()
+
+class FakeOllamaServer:
+    """
+    Fake Ollama server answering every prompt with `response_tokens` deterministic tokens
+
+    `first_token_ms` is waited before the first token (prompt evaluation) and `token_latency_ms`
+    before every other token, for streamed and complete responses alike.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_latency_ms: float = 5.0,
+        first_token_ms: float = 20.0,
+        response_tokens: int = 32
+    ):
+        self.token_latency = token_latency_ms / 1000
+        self.first_token_latency = first_token_ms / 1000
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def tokens(self, prompt: str) -> List[str]:
+        """
+        Tokens of the response to a prompt - a JSON object when the prompt asks for one
+        """
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        words = [WORDS[(seed + i * 7919) % len(WORDS)] for i in range(self.response_tokens)]
+        text = " ".join(words)
+        if "JSON" in prompt:
+            text = json.dumps({
+                "key_points": [" ".join(words[:len(words) // 2]), " ".join(words[len(words) // 2:])],
+                "relevance_score": 0.8,
+                "answer": text,
+                "confidence": 0.9
+            })
+        # words with their trailing whitespace, like the pieces Ollama streams
+        return re.findall(r"\S+\s*", text)
+
+    def _generate(self, prompt: str):
+        """
+        Yield the tokens of the response at the configured latency
+        """
+        with self._lock:
+            self.requests += 1
+        for i, token in enumerate(self.tokens(prompt)):
+            time.sleep(self.first_token_latency if i == 0 else self.token_latency)
+            yield token
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/api/generate":
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = body.get("prompt", "")
+                model = body.get("model", "fake")
+                prompt_tokens = len(prompt.split())
+
+                if not body.get("stream", True):
+                    tokens = list(server._generate(prompt))
+                    self._send_json({
+                        "model": model,
+                        "response": "".join(tokens),
+                        "done": True,
+                        "prompt_eval_count": prompt_tokens,
+                        "eval_count": len(tokens)
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                count = 0
+                for token in server._generate(prompt):
+                    count += 1
+                    self._send_chunk({"model": model, "response": token, "done": False})
+                self._send_chunk({
+                    "model": model,
+                    "response": "",
+                    "done": True,
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": count
+                })
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, payload):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--first-token-ms", type=float, default=20.0)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.token_latency_ms, args.first_token_ms, args.response_tokens)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Run the API server: python -m intelli_docs
+
+The worker processes of the PDF extraction pool are spawned, and a spawned process imports the
+main module of its parent again - except a package's `__main__`. Starting the server from here
+(or with the uvicorn CLI) keeps the app, its models and its vector store out of the workers.
+"""
+import uvicorn
+
+if __name__ == "__main__":
+    # run the app at localhost and port 8000
+    uvicorn.run("intelli_docs.main:app", host="0.0.0.0", port=8000)
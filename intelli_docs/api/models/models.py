@@ -1,5 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
+
+class RetrievalFilters(BaseModel):
+    """
+    Metadata filters restricting the documents a question is answered from
+    """
+    sources: Optional[List[str]] = None  # file names (or source paths)
+    tags: Optional[List[str]] = None  # the documents must carry all of them
+    # bounds (unix time) on the latest upload of the documents - every chunk of a document carries the
+    # time it was last uploaded, the `uploaded_at` of the sources listing
+    uploaded_after: Optional[float] = None
+    uploaded_before: Optional[float] = None
 
 class QuestionRequest(BaseModel):
     """
@@ -7,11 +18,37 @@ class QuestionRequest(BaseModel):
     """
     question: str
     n_context_docs: Optional[int] = 3
+    retrieval_mode: Optional[Literal["vector", "bm25", "hybrid"]] = None  # server default when unset
+    pipeline_mode: Optional[Literal["full", "cheap"]] = None  # server default when unset
+    namespace: Optional[str] = None  # default namespace when unset
+    filters: Optional[RetrievalFilters] = None
+
+class BatchQuestionRequest(BaseModel):
+    """
+    Request model for answering a batch of questions
+    """
+    questions: List[str]
+    n_context_docs: Optional[int] = 3
+    retrieval_mode: Optional[Literal["vector", "bm25", "hybrid"]] = None
+    pipeline_mode: Optional[Literal["full", "cheap"]] = None
+    namespace: Optional[str] = None
+    filters: Optional[RetrievalFilters] = None
+    stream: bool = False  # stream the answers as NDJSON lines as they finish
 
 class DocumentResponse(BaseModel):
     id: str
-    content: str
-    metadata: dict
+    content: Optional[str] = None  # left out unless included
+    metadata: Optional[dict] = None
+
+class SourceResponse(BaseModel):
+    """
+    Response model for an ingested file
+    """
+    source: str
+    filename: str
+    chunks: int
+    uploaded_at: Optional[float] = None  # time of the latest upload
+    tags: List[str] = []
 
 class DocumentMetadata(BaseModel):
     """
@@ -37,6 +74,12 @@ class AnswerResponse(BaseModel):
     sources: List[Dict[str, Any]]
     analysis: Dict[str, Any]
 
+class BatchAnswerResponse(BaseModel):
+    """
+    Response model for a batch of answers, in the order of the questions
+    """
+    results: List[AnswerResponse]
+
 class DocumentUploadResponse(BaseModel):
     """
     Response model for document upload
@@ -46,6 +89,24 @@ class DocumentUploadResponse(BaseModel):
     message: str
     chunks_processed: int
 
+class IngestionJobResponse(BaseModel):
+    """
+    Response model for the status of a background ingestion job
+    """
+    job_id: str
+    filename: str
+    namespace: str
+    tags: List[str] = []
+    stage: str
+    chunks_total: Optional[int] = None
+    chunks_processed: int = 0
+    throughput_chunks_per_second: Optional[float] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, int]] = None
+    error: Optional[str] = None
+
 class DocumentListResponse(BaseModel):
     """
     Response model for listing documents
@@ -1,12 +1,27 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from pydantic import BaseModel
 
+class RetrievalFilters(BaseModel):
+    """
+    Metadata filters restricting the documents a question is answered from
+    """
+    sources: Optional[List[str]] = None  # file names (or source paths)
+    tags: Optional[List[str]] = None  # the documents must carry all of them
+    # bounds (unix time) on the latest upload of the documents - every chunk of a document carries the
+    # time it was last uploaded, the `uploaded_at` of the sources listing
+    uploaded_after: Optional[float] = None
+    uploaded_before: Optional[float] = None
+
 class QuestionRequest(BaseModel):
     """
     Request model for asking questions
     """
     question: str
     n_context_docs: int = 3
+    retrieval_mode: Optional[Literal["vector", "bm25", "hybrid"]] = None  # server default when unset
+    pipeline_mode: Optional[Literal["full", "cheap"]] = None  # server default when unset
+    namespace: Optional[str] = None  # default namespace when unset
+    filters: Optional[RetrievalFilters] = None
 
 class Source(BaseModel):
     """
@@ -1,71 +1,271 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
 from intelli_docs.services.qa_service import QAService
-from intelli_docs.services.embedding_service import EmbeddingService
-from intelli_docs.api.models.models import QuestionRequest, DocumentResponse, AnswerResponse
+from intelli_docs.services.embedding_service import EmbeddingService, NAMESPACE_PATTERN, DOCUMENT_FIELDS
+from intelli_docs.services.ingestion_queue import IngestionQueue, IngestionQueueFull
+from intelli_docs.api.models.models import (
+    QuestionRequest, BatchQuestionRequest, DocumentResponse, AnswerResponse, BatchAnswerResponse, IngestionJobResponse,
+    SourceResponse
+)
 import os
+import shutil
+import json
+import tempfile
 from intelli_docs.core.config import settings
+from intelli_docs.core.llm_scheduler import LLMOverloaded, llm_scheduler
+from intelli_docs.core.registry import registry
 
 router = APIRouter()
-qa_service = QAService()
+# a single embedding service (and collection) is shared by the uploads and the questions
 embedding_service = EmbeddingService()
+qa_service = QAService(embedding_service=embedding_service)
+ingestion_queue = IngestionQueue(embedding_service)
+
+def _check_namespace(namespace: Optional[str], must_exist: bool = True):
+    """
+    Reject invalid namespace names before any work is done, and unknown ones unless the request
+    creates them - reads never create a namespace
+    """
+    if namespace is not None and not NAMESPACE_PATTERN.match(namespace):
+        raise HTTPException(status_code=400, detail=f"Invalid namespace: {namespace}")
+    if must_exist and not embedding_service.has_namespace(namespace):
+        raise HTTPException(status_code=404, detail=f"Unknown namespace: {namespace}")
+
+def _page_size(limit: Optional[int]) -> int:
+    """
+    Page size of a listing, capped so a single request cannot pull the whole store
+    """
+    return min(limit or settings.DOCUMENTS_PAGE_SIZE, settings.DOCUMENTS_MAX_PAGE_SIZE)
+
+def _where(request) -> Optional[Dict[str, Any]]:
+    """
+    Chroma `where` filter of the metadata filters of a request
+    """
+    if request.filters is None:
+        return None
+    return EmbeddingService.build_where(**request.filters.model_dump())
 
 @router.post("/ask", response_model=AnswerResponse)
-def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest):
     """
     Ask a question about the uploaded documents
     """
+    _check_namespace(request.namespace)
     try:
-        response = qa_service.answer_question(
+        response = await qa_service.aanswer_question(
             question=request.question,
-            n_context_docs=request.n_context_docs
+            n_context_docs=request.n_context_docs,
+            retrieval_mode=request.retrieval_mode,
+            pipeline_mode=request.pipeline_mode,
+            namespace=request.namespace,
+            where=_where(request)
         )
         return response
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/documents/upload")
-def upload_document(file: UploadFile = File(...)):
+@router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
     """
-    Upload a document for question answering
+    Ask a question and receive the answer as Server-Sent Events:
+    a `sources` event, one `token` event per generated piece of the answer and a trailing `analysis` event
     """
+    _check_namespace(request.namespace)
+    # reject before the stream starts while the status code can still say so
     try:
-        # Save the file
-        file_path = os.path.join(settings.DATA_DIR, "raw", file.filename)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        llm_scheduler.check_admission()
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    async def event_stream():
+        async for event, data in qa_service.astream_answer(
+            question=request.question,
+            n_context_docs=request.n_context_docs,
+            retrieval_mode=request.retrieval_mode,
+            pipeline_mode=request.pipeline_mode,
+            namespace=request.namespace,
+            where=_where(request)
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/ask/batch", response_model=BatchAnswerResponse)
+async def ask_questions_batch(request: BatchQuestionRequest):
+    """
+    Ask a batch of questions
+    The answers are returned in the order of the questions, or streamed as NDJSON lines
+    (`{"index": ..., "answer": ..., "sources": ..., "analysis": ...}`) as they finish when `stream` is set
+    """
+    _check_namespace(request.namespace)
+    if len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many questions: {len(request.questions)} (max. {settings.BATCH_MAX_QUESTIONS})"
+        )
+    
+    answers = qa_service.aanswer_batch(
+        questions=request.questions,
+        n_context_docs=request.n_context_docs,
+        retrieval_mode=request.retrieval_mode,
+        pipeline_mode=request.pipeline_mode,
+        namespace=request.namespace,
+        where=_where(request)
+    )
+    
+    if request.stream:
+        async def ndjson_stream():
+            async for index, response in answers:
+                yield json.dumps({"index": index, **response}) + "\n"
         
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    results = [None] * len(request.questions)
+    async for index, response in answers:
+        results[index] = response
+    return {"results": results}
+
+@router.post("/documents/upload", response_model=IngestionJobResponse, status_code=202)
+def upload_document(
+    file: UploadFile = File(...),
+    namespace: Optional[str] = Form(None),
+    tags: Optional[str] = Form(None)
+):
+    """
+    Upload a document for question answering, into a namespace (default one when not given) and with
+    comma separated tags to filter on
+    The document is processed in the background - poll `GET /jobs/{job_id}` for its progress
+    """
+    _check_namespace(namespace, must_exist=False)
+    try:
+        # Save the file - the files of each namespace are kept apart
+        raw_dir = os.path.join(settings.DATA_DIR, "raw")
+        if namespace and namespace != settings.DEFAULT_NAMESPACE:
+            raw_dir = os.path.join(raw_dir, "namespaces", namespace)
+        file_path = os.path.join(raw_dir, file.filename)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
-        # Process the document
-        embedding_service.process_document(file_path)
+        # the upload is written next to the file and only renamed over it by its job, so a job
+        # still reading the previous version of the file never sees it change
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(file_path), prefix=f".{file.filename}.", suffix=".upload", delete=False) as f:
+            upload_path = f.name
+            shutil.copyfileobj(file.file, f)
         
-        return {
-            "message": "Document uploaded and processed successfully"
-        }
+        # Queue the processing - only new or changed chunks get embedded
+        tag_list = [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
+        try:
+            job = ingestion_queue.submit(file_path, namespace=namespace, tags=tag_list, upload_path=upload_path)
+        except Exception:
+            os.remove(upload_path)
+            raise
+        return job.to_dict()
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/documents", response_model=List[DocumentResponse])
-def list_documents():
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+def get_job(job_id: str):
+    """
+    Stage and progress of a document ingestion job
+    """
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+@router.get("/namespaces", response_model=List[str])
+def list_namespaces():
     """
-    List all processed documents
+    List the document namespaces
     """
+    return embedding_service.list_namespaces()
+
+@router.get("/documents", response_model=List[DocumentResponse], response_model_exclude_unset=True)
+def list_documents(
+    response: Response,
+    namespace: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    include: str = "content,metadata"
+):
+    """
+    List a page of the processed documents (of a namespace)
+    `include` is a comma separated list of the fields returned next to the ids (content, metadata);
+    the total number of documents is in the X-Total-Count header
+    """
+    _check_namespace(namespace)
+    fields = [field.strip() for field in include.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in DOCUMENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
     try:
-        documents = embedding_service.list_documents()
+        documents = embedding_service.list_documents(namespace, limit=_page_size(limit), offset=offset, include=fields)
+        response.headers["X-Total-Count"] = str(embedding_service.count_documents(namespace))
         return documents
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/documents/sources", response_model=List[SourceResponse])
+def list_sources(
+    response: Response,
+    namespace: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0)
+):
+    """
+    List a page of the ingested files (of a namespace) with their number of chunks, upload time and tags
+    The total number of files is in the X-Total-Count header
+    """
+    _check_namespace(namespace)
+    try:
+        sources = embedding_service.list_sources(namespace, limit=_page_size(limit), offset=offset)
+        response.headers["X-Total-Count"] = str(embedding_service.count_sources(namespace))
+        return sources
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/documents/{document_id}")
-def delete_document(document_id: str):
+def delete_document(document_id: str, namespace: Optional[str] = None):
     """
-    Delete an existing document
+    Delete an existing document (of a namespace)
     """
+    _check_namespace(namespace)
     try:
-        embedding_service.delete_document(document_id)
+        embedding_service.delete_document(document_id, namespace)
         return {
             "message": "Document deleted successfully"
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.get("/stats")
+def get_stats():
+    """
+    Runtime statistics of the caches, of the context packing, of the early exits, of the coalesced
+    requests, of the LLM scheduler and of the startup
+    """
+    return {
+        "embedding_cache": embedding_service.cache_stats(),
+        "answer_cache": qa_service.cache_stats(),
+        "context": qa_service.context_builder.stats(),
+        "retrieval": qa_service.retrieval_stats(),
+        "coalescing": qa_service.coalescing_stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "vector_store_startup": embedding_service.startup_stats
+    }
+
+@router.get("/resources")
+def get_resources():
+    """
+    Memory footprint of the shared models and clients
+    """
+    return registry.memory_footprint()
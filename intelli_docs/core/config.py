@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
@@ -19,27 +20,91 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     MAX_DOCUMENT_SIZE: int = 24 * 1024 * 1024  # 24MB
+    PDF_EXTRACTION_MAX_WORKERS: int = min(8, os.cpu_count() or 1)  # processes extracting the pages of large PDFs
+    PDF_PARALLEL_MIN_PAGES: int = 50  # smaller PDFs are extracted in-process
+    INGESTION_MAX_WORKERS: int = 2  # documents ingested concurrently in the background
+    INGESTION_QUEUE_SIZE: int = 32  # uploads waiting for a worker before new ones are rejected
+    INGESTION_JOB_HISTORY: int = 1000  # finished jobs kept for the status API
     
     # Vector store settings
     VECTOR_STORE_PATH: Path = Path("data/processed/vector_store")
-    
+    DEFAULT_NAMESPACE: str = "documents"  # collection used when a request names no namespace
+    BM25_SAVE_DELAY_SECONDS: float = 5.0  # deletions are saved to the keyword index once they stop coming
+    VECTOR_STORE_REBUILD_MISSING: bool = True  # at startup, re-index empty namespaces from the processed chunks
+    VECTOR_STORE_REBUILD_WORKERS: int = 4  # sources re-indexed concurrently
+    VECTOR_STORE_WARMUP: bool = True  # load the vector indexes at startup instead of on the first query
+    DOCUMENTS_PAGE_SIZE: int = 100  # documents (or sources) listed per page when a request sets no limit
+    DOCUMENTS_MAX_PAGE_SIZE: int = 1000
+
+    # Retrieval settings
+    RETRIEVAL_MODE: str = "vector"  # default retrieval: vector, bm25 or hybrid
+    HYBRID_CANDIDATES_FACTOR: int = 4  # each ranking contributes `n_results * factor` candidates to the fusion
+    RRF_K: int = 60  # reciprocal rank fusion constant
+    # chunks farther (cosine distance) from the question are not relevant - the scale depends on
+    # EMBEDDING_MODEL, so retune it when changing the model; an empty value or a value <= 0 disables it
+    RETRIEVAL_MAX_DISTANCE: Optional[float] = 0.8
+
     # LLM settings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = os.getenv('OLLAMA_MODEL', 'llama3.2:3b')  # Read from model.env
+    OLLAMA_MAX_CONNECTIONS: int = 100  # size of the pooled HTTP connections shared by all the LLM calls
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OLLAMA_TIMEOUT_SECONDS: float = 300.0
+    LLM_MAX_CONCURRENCY: int = 4  # LLM calls sent to Ollama at the same time (match OLLAMA_NUM_PARALLEL)
+    LLM_QUEUE_SIZE: int = 64  # LLM calls waiting for a slot before new ones are rejected with a 503
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0  # max. wait for a slot of an interactive call
+    LLM_BATCH_QUEUE_TIMEOUT_SECONDS: float = 600.0  # max. wait for a slot of a batch / background call
+    PIPELINE_MODE: str = "full"  # default QA pipeline: full (3 LLM calls) or cheap (1 structured call)
+    CONTEXT_TOKEN_BUDGET: int = 2048  # max. tokens of retrieved context per prompt
+    CONTEXT_CHARS_PER_TOKEN: float = 4.0  # estimate used for the budget
+    PIPELINE_MAX_WORKERS: int = 16  # threads running the concurrent LLM calls of synchronous requests
+    RETRIEVAL_MAX_WORKERS: int = 8  # threads for the blocking embedding / vector store calls of async requests
+    BATCH_MAX_QUESTIONS: int = 1000  # max. questions per batch request
+    BATCH_LLM_CONCURRENCY: int = 4  # questions of a batch generated by the LLM at the same time
+    REQUEST_COALESCING_ENABLED: bool = True  # identical questions in flight share one answer
+    
+    # Answer cache settings
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95  # min. cosine similarity of two questions to share an answer
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
     
     # Embedding settings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 64  # texts per forward pass of the embedding model
+    VECTOR_STORE_WRITE_BATCH_SIZE: int = 1024  # records per bulk write to the vector store
     
     # File paths
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
     DATA_DIR: Path = BASE_DIR / "data"
     RAW_DATA_DIR: Path = DATA_DIR / "raw"
     PROCESSED_DATA_DIR: Path = DATA_DIR / "processed"
+    # kept out of the vector store directory, so they outlive it and the vectors can be rebuilt from them
+    MANIFEST_DIR: Path = DATA_DIR / "manifests"  # per-source chunk hash manifests
+    BM25_INDEX_PATH: Path = DATA_DIR / "bm25" / "bm25_index.npz"  # keyword index of the chunks
+    
+    # Embedding cache settings
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: Path = PROCESSED_DATA_DIR / "embedding_cache"
+    EMBEDDING_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # 64MB in-memory LRU budget
+
+    # Metrics settings
+    METRICS_ENABLED: bool = True  # record latencies / counters and serve them on /metrics
 
     # Ensure directories exist
     RAW_DATA_DIR.mkdir(exist_ok=True, parents=True)
     PROCESSED_DATA_DIR.mkdir(exist_ok=True, parents=True)
     VECTOR_STORE_PATH.mkdir(exist_ok=True, parents=True) 
+    MANIFEST_DIR.mkdir(exist_ok=True, parents=True)
+    BM25_INDEX_PATH.parent.mkdir(exist_ok=True, parents=True)
+    
+    @field_validator("RETRIEVAL_MAX_DISTANCE", mode="before")
+    @classmethod
+    def _disable_max_distance(cls, value):
+        # an environment variable cannot be None: "" and values <= 0 turn the cutoff off
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        return None if float(value) <= 0 else value
     
     class Config:
         case_sensitive = True
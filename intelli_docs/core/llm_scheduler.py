@@ -0,0 +1,299 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain.llms.base import LLM
+
+from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import metrics
+from intelli_docs.core.ollama_client import count_tokens
+
+# priorities of the LLM calls - lower goes first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+# priority of the LLM calls made by the current task (tasks inherit it from the task creating them)
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+LLM_QUEUE_WAIT_SECONDS = metrics.histogram("llm_queue_wait_seconds", "Time LLM calls waited for a slot", ["priority"])
+LLM_REJECTED = metrics.counter("llm_rejected_total", "LLM calls rejected by the scheduler", ["reason"])
+
+class LLMOverloaded(Exception):
+    """
+    Raised when an LLM call is shed because the LLM is overloaded
+    `retry_after` is an estimate of the seconds until the queue has room again
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMQueueFull(LLMOverloaded):
+    """
+    Raised when the LLM queue cannot take more calls (or a call was evicted by a more urgent one)
+    """
+
+class LLMQueueTimeout(LLMOverloaded):
+    """
+    Raised when an LLM call waited in the queue past its deadline
+    """
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM
+
+    At most `max_concurrency` calls run at the same time; the others wait in a priority queue of
+    at most `max_queue` calls (interactive before batch before background, first come first served
+    within a priority). When the queue is full, a call evicts the newest queued call of a lower
+    priority, or is rejected right away - and a call waiting longer than its deadline gives up - so
+    overload turns into fast `LLMOverloaded` errors instead of every request slowing down.
+    Async calls wait on their event loop (`slot`), synchronous ones block their thread (`sync_slot`),
+    and both share the same slots and queue.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        max_queue: int = settings.LLM_QUEUE_SIZE,
+        queue_timeouts: Optional[Dict[int, float]] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeouts = queue_timeouts or {
+            INTERACTIVE: settings.LLM_QUEUE_TIMEOUT_SECONDS,
+            BATCH: settings.LLM_BATCH_QUEUE_TIMEOUT_SECONDS,
+            BACKGROUND: settings.LLM_BATCH_QUEUE_TIMEOUT_SECONDS
+        }
+        self._running = 0
+        # heap of [priority, arrival, future] - a (thread-safe) future gets its result when the call gets a slot
+        self._waiters: List[List[Any]] = []
+        self._arrivals = itertools.count()
+        # moving average of the time a call holds a slot, for the Retry-After estimates
+        self._service_time = 1.0
+        # guards the slots, the queue and the counters - reentrant for `_reject`
+        self._lock = threading.RLock()
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "evicted": 0, "deadline": 0}
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the calls queued now are likely done
+        """
+        return max(1, math.ceil(self._service_time * (len(self._waiters) + 1) / self.max_concurrency))
+
+    def _reject(self, reason: str, error: LLMOverloaded) -> LLMOverloaded:
+        with self._lock:
+            self.rejected[reason] += 1
+        LLM_REJECTED.inc(reason=reason)
+        return error
+
+    def check_admission(self, priority: Optional[int] = None):
+        """
+        Raise `LLMQueueFull` if a call of this priority would be rejected right now
+        (lets a streaming response fail with a proper status before it starts)
+        """
+        priority = llm_priority.get() if priority is None else priority
+        with self._lock:
+            if self._running < self.max_concurrency or len(self._waiters) < self.max_queue:
+                return
+            if any(entry[0] > priority for entry in self._waiters):
+                return
+            raise self._reject("queue_full", LLMQueueFull("The LLM is overloaded, retry later", self.retry_after()))
+
+    def _enqueue(self, priority: int) -> Optional[List[Any]]:
+        """
+        Take a free slot (None) or queue the call and return its waiter entry
+        """
+        with self._lock:
+            if self._running < self.max_concurrency and not self._waiters:
+                self._running += 1
+                self.admitted += 1
+                return None
+
+            if len(self._waiters) >= self.max_queue:
+                # make room by evicting the newest call of the lowest priority, if it is less urgent
+                victim = max(self._waiters, key=lambda entry: (entry[0], entry[1]), default=None)
+                if victim is None or victim[0] <= priority:
+                    raise self._reject("queue_full", LLMQueueFull("The LLM is overloaded, retry later", self.retry_after()))
+                self._remove(victim)
+                if victim[2].set_running_or_notify_cancel():
+                    victim[2].set_exception(self._reject(
+                        "evicted", LLMQueueFull("The LLM is busy with more urgent requests, retry later", self.retry_after())
+                    ))
+
+            entry = [priority, next(self._arrivals), concurrent.futures.Future()]
+            heapq.heappush(self._waiters, entry)
+            return entry
+
+    def _abandon(self, entry: List[Any]) -> bool:
+        """
+        Take a call that stopped waiting out of the queue - True if it was handed a slot meanwhile
+        """
+        with self._lock:
+            if entry[2].cancel():
+                self._remove(entry)
+                return False
+        return entry[2].exception() is None
+
+    def _admitted(self, priority: int, started: float):
+        with self._lock:
+            self.admitted += 1
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    def _deadline(self, timeout: float) -> LLMQueueTimeout:
+        return self._reject("deadline", LLMQueueTimeout(
+            f"The LLM did not get to the request within {timeout:g}s, retry later", self.retry_after()
+        ))
+
+    async def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        Wait for a slot - must be followed by `release`
+        """
+        priority = llm_priority.get() if priority is None else priority
+        started = time.perf_counter()
+        entry = self._enqueue(priority)
+        if entry is None:
+            return
+
+        timeout = self.queue_timeouts.get(priority) if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(entry[2]), timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(entry):
+                raise self._deadline(timeout)
+        except asyncio.CancelledError:
+            if self._abandon(entry):
+                # the slot was handed over just as the call was cancelled
+                self.release()
+            raise
+        self._admitted(priority, started)
+
+    def acquire_sync(self, priority: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        Block the calling thread until it gets a slot - must be followed by `release`
+        """
+        priority = llm_priority.get() if priority is None else priority
+        started = time.perf_counter()
+        entry = self._enqueue(priority)
+        if entry is None:
+            return
+
+        timeout = self.queue_timeouts.get(priority) if timeout is None else timeout
+        try:
+            entry[2].result(timeout)
+        except concurrent.futures.TimeoutError:
+            if not self._abandon(entry):
+                raise self._deadline(timeout)
+        self._admitted(priority, started)
+
+    def _remove(self, entry: List[Any]):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+    def release(self):
+        """
+        Hand the slot over to the most urgent waiting call, or free it
+        """
+        with self._lock:
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                # false when the call gave up waiting
+                if future.set_running_or_notify_cancel():
+                    future.set_result(None)
+                    return
+            self._running -= 1
+
+    def _done(self, started: float):
+        with self._lock:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.perf_counter() - started)
+        self.release()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._done(started)
+
+    @contextmanager
+    def sync_slot(self, priority: Optional[int] = None) -> Iterator[None]:
+        self.acquire_sync(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._done(started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "avg_service_seconds": self._service_time
+            }
+
+class ScheduledOllamaClient:
+    """
+    `OllamaClient` whose calls go through the scheduler, at the priority of the calling task
+    A streamed response holds its slot until the stream is done
+    """
+
+    def __init__(self, client: Any, scheduler: Optional[LLMScheduler] = None):
+        self.client = client
+        self.scheduler = scheduler if scheduler is not None else llm_scheduler
+
+    async def generate(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        async with self.scheduler.slot():
+            return await self.client.generate(prompt, options)
+
+    async def stream(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        async with self.scheduler.slot():
+            async for token in self.client.stream(prompt, options):
+                yield token
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class ScheduledLLM(LLM):
+    """
+    Langchain LLM whose calls go through the scheduler, so the synchronous chains share
+    the slots (and the admission control) of the async path, and count their tokens like it
+    """
+
+    llm: Any
+    scheduler: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        scheduler = self.scheduler if self.scheduler is not None else llm_scheduler
+        with scheduler.sync_slot():
+            generation = self.llm.generate([prompt], stop=stop, **kwargs).generations[0][0]
+        # the langchain Ollama LLM passes the final response of Ollama on as the generation info
+        count_tokens(generation.generation_info or {})
+        return generation.text
+
+# Create the scheduler shared by all the services - Ollama's parallelism is per server
+llm_scheduler = LLMScheduler()
+metrics.gauge("llm_queue_depth", "LLM calls waiting for a slot").set_function(lambda: {(): llm_scheduler.stats()["queued"]})
+metrics.gauge("llm_running", "LLM calls in flight").set_function(lambda: {(): llm_scheduler.stats()["running"]})
@@ -3,7 +3,17 @@ from pydantic import BaseModel
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain.llms import Ollama
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import asyncio
+import json
+import string
+import threading
+import time
 import traceback
+from intelli_docs.core.config import settings
+from intelli_docs.core.llm_scheduler import LLMOverloaded
+from intelli_docs.core.metrics import MCP_STEP_SECONDS
+from intelli_docs.core.ollama_client import OllamaClient
 
 class MCPStep(BaseModel):
     """
@@ -14,6 +24,9 @@ class MCPStep(BaseModel):
     input_schema: Dict[str, Any]
     output_schema: Dict[str, Any]
     prompt_template: str
+    # names of the steps that must run before this one
+    # when not given, they are derived from the steps whose `output_schema` provides one of the inputs
+    depends_on: Optional[List[str]] = None
 
 class MCPPipeline:
     """
@@ -33,89 +46,331 @@ class MCPPipeline:
     MCP can in turn communicate with the agent and do specific actions so that the implementations are simplified
     """
     
-    def __init__(self, model_name: str = "llama3.2"):
-        # Initialize Ollama without custom callbacks
-        self.llm = Ollama(model=model_name)
+    def __init__(self, model_name: str = "llama3.2", client: Optional[OllamaClient] = None, llm: Optional[Ollama] = None):
+        # Initialize Ollama without custom callbacks (unless a shared LLM is given)
+        self.llm = llm if llm is not None else Ollama(model=model_name)
+        # async calls go through the (shared) pooled Ollama client
+        self.client = client if client is not None else OllamaClient(model=model_name)
         self.steps: List[MCPStep] = []
+        # step name -> names of the steps it depends on
+        self.dependencies: Dict[str, List[str]] = {}
+        # step name -> prompt / chain compiled once when the step is added
+        self.prompts: Dict[str, PromptTemplate] = {}
+        self.chains: Dict[str, LLMChain] = {}
+        # threads running the independent steps of the synchronous executions, shared by all of them
+        self.executor = ThreadPoolExecutor(max_workers=settings.PIPELINE_MAX_WORKERS, thread_name_prefix="mcp-step")
         
     def add_step(self, step: MCPStep):
         """
         Add a step to the MCP pipeline
+        The step's prompt is parsed, validated against its `input_schema` and bound to the LLM here,
+        once, so that executing the pipeline only formats and runs the compiled chains
         """
-        self.steps.append(step)
+        if step.name in self.prompts:
+            raise ValueError(f"Step {step.name} is already part of the pipeline")
+        prompt = self._build_prompt(step)
+        
+        steps = self.steps + [step]
+        dependencies = self._resolve_dependencies(steps)
+        # keep the steps in a topological order, which also rejects cycles
+        self.steps = self._topological_order(steps, dependencies)
+        self.dependencies = dependencies
+        self.prompts[step.name] = prompt
+        self.chains[step.name] = LLMChain(llm=self.llm, prompt=prompt)
+    
+    @staticmethod
+    def _resolve_dependencies(steps: List[MCPStep]) -> Dict[str, List[str]]:
+        """
+        Dependencies of every step - explicit ones, or the steps producing one of its inputs
+        """
+        names = {step.name for step in steps}
+        dependencies = {}
+        for step in steps:
+            if step.depends_on is not None:
+                unknown = [name for name in step.depends_on if name not in names]
+                if unknown:
+                    raise ValueError(f"Step {step.name} depends on unknown steps: {unknown}")
+                dependencies[step.name] = list(step.depends_on)
+                continue
+            dependencies[step.name] = [
+                other.name for other in steps
+                if other.name != step.name and any(
+                    key == other.name or key in other.output_schema for key in step.input_schema
+                )
+            ]
+        return dependencies
+    
+    @staticmethod
+    def _topological_order(steps: List[MCPStep], dependencies: Dict[str, List[str]]) -> List[MCPStep]:
+        """
+        Order the steps so that every step comes after its dependencies
+        """
+        ordered: List[MCPStep] = []
+        done = set()
+        remaining = list(steps)
+        while remaining:
+            ready = [step for step in remaining if all(dep in done for dep in dependencies[step.name])]
+            if not ready:
+                raise ValueError(f"Cyclic dependencies between steps: {[step.name for step in remaining]}")
+            for step in ready:
+                ordered.append(step)
+                done.add(step.name)
+                remaining.remove(step)
+        return ordered
+    
+    @staticmethod
+    def _build_prompt(step: MCPStep) -> PromptTemplate:
+        """
+        Create a prompt from the step's template, checking that it only uses the step's inputs
+        """
+        template_variables = {
+            field_name for _, field_name, _, _ in string.Formatter().parse(step.prompt_template)
+            if field_name
+        }
+        unknown = template_variables - set(step.input_schema.keys())
+        if unknown:
+            raise ValueError(f"Prompt of step {step.name} uses variables missing from its input schema: {sorted(unknown)}")
+        return PromptTemplate(
+            template=step.prompt_template,
+            input_variables=list(step.input_schema.keys())
+        )
+    
+    @staticmethod
+    def _step_inputs(step: MCPStep, context: Dict[str, Any], outputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Prepare the inputs of a step from the current context and the outputs of the finished steps
+        """
+        return {k: context[k] if k in context else outputs.get(k) for k in step.input_schema.keys()}
+    
+    @staticmethod
+    def _step_outputs(step: MCPStep, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Values of the step's `output_schema` fields, made available as inputs of the dependent steps
+        """
+        result = parsed.get(step.name)
+        if not isinstance(result, dict):
+            return {}
+        return {k: result[k] for k in step.output_schema if k in result}
+    
+    @staticmethod
+    def _parse_result(step: MCPStep, result: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parse the raw result of a step into a structured format
+        """
+        if step.name == "document_analysis":
+            # For document analysis, extract key (list of) points and the relevance score
+            key_points = [line.strip() for line in result.split('\n') if line.strip()]
+            relevance_score = 0.8  # Default relevance score
+            return {
+                step.name: {
+                    "key_points": key_points,
+                    "relevance_score": relevance_score
+                }
+            }
+        elif step.name == "answer_generation":
+            # For answer generation, structure the response
+            return {
+                step.name: {
+                    "answer": result,
+                    "confidence": 0.9,  # Default confidence
+                    "sources": context.get("document_content", "")
+                }
+            }
+        elif step.name == "combined_analysis":
+            # A single call answers for both steps - split it into their usual results
+            parsed = MCPPipeline._parse_json_object(result)
+            if parsed is None:
+                # not JSON after all: keep the raw text as the answer
+                parsed = {"answer": result.strip()}
+            key_points = parsed.get("key_points")
+            if isinstance(key_points, str):
+                key_points = [line.strip() for line in key_points.split('\n') if line.strip()]
+            elif not isinstance(key_points, list):
+                key_points = []
+            return {
+                "document_analysis": {
+                    "key_points": [str(point) for point in key_points],
+                    "relevance_score": MCPPipeline._score(parsed.get("relevance_score"), 0.8)
+                },
+                "answer_generation": {
+                    "answer": str(parsed.get("answer", "")),
+                    "confidence": MCPPipeline._score(parsed.get("confidence"), 0.9),
+                    "sources": context.get("document_content", "")
+                }
+            }
+        # For other steps, store the raw result
+        return {step.name: result}
+    
+    @staticmethod
+    def _parse_json_object(result: str) -> Optional[Dict[str, Any]]:
+        """
+        The JSON object in an LLM response - models tend to wrap it in text or code fences
+        """
+        start, end = result.find("{"), result.rfind("}")
+        if start < 0 or end <= start:
+            return None
+        try:
+            parsed = json.loads(result[start:end + 1])
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+    
+    @staticmethod
+    def _score(value: Any, default: float) -> float:
+        """
+        A score between 0 and 1 from a parsed LLM response
+        """
+        try:
+            return min(1.0, max(0.0, float(value)))
+        except (TypeError, ValueError):
+            return default
+    
+    @staticmethod
+    def _failed_result(step: MCPStep, e: Exception) -> Dict[str, Any]:
+        """
+        Default response for a failed step - structured results carry the `error`
+        """
+        error_msg = f"Error in step {step.name}: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        if step.name == "document_analysis":
+            return {
+                step.name: {
+                    "key_points": [f"Error analyzing document: {str(e)}"],
+                    "relevance_score": 0.0,
+                    "error": str(e)
+                }
+            }
+        elif step.name == "answer_generation":
+            return {
+                step.name: {
+                    "answer": f"Error generating answer: {str(e)}",
+                    "confidence": 0.0,
+                    "sources": "",
+                    "error": str(e)
+                }
+            }
+        elif step.name == "combined_analysis":
+            return {
+                "document_analysis": {
+                    "key_points": [f"Error analyzing document: {str(e)}"],
+                    "relevance_score": 0.0,
+                    "error": str(e)
+                },
+                "answer_generation": {
+                    "answer": f"Error generating answer: {str(e)}",
+                    "confidence": 0.0,
+                    "sources": "",
+                    "error": str(e)
+                }
+            }
+        return {step.name: f"Error: {str(e)}"}
         
     def execute(self, initial_context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute the MCP pipeline with the given initial context
+        Independent steps run concurrently, every step starts as soon as its dependencies are done
+        The failed steps are listed with their error in `step_errors`
         """
         current_context = initial_context.copy()
+        outputs: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        errors: Dict[str, str] = {}
+        lock = threading.Lock()
         
-        for step in self.steps:
+        def run_step(step: MCPStep):
+            started = time.perf_counter()
             try:
-                # Create a prompt from the step's template
-                prompt = PromptTemplate(
-                    template=step.prompt_template,
-                    input_variables=list(step.input_schema.keys())
-                )
+                with lock:
+                    chain_inputs = self._step_inputs(step, current_context, outputs)
                 
-                # Create chain
-                chain = LLMChain(llm=self.llm, prompt=prompt)
-                
-                # Prepare inputs for the chain
-                chain_inputs = {
-                    k: current_context.get(k) for k in step.input_schema.keys()
-                }
-                
-                # Execute step
-                result = chain.run(**chain_inputs)
-                
-                # Parse the result into a structured format
-                if step.name == "document_analysis":
-                    # For document analysis, extract key (list of) points and the relevance score
-                    key_points = [line.strip() for line in result.split('\n') if line.strip()]
-                    relevance_score = 0.8  # Default relevance score
-                    current_context.update({
-                        step.name: {
-                            "key_points": key_points,
-                            "relevance_score": relevance_score
-                        }
-                    })
-                elif step.name == "answer_generation":
-                    # For answer generation, structure the response
-                    current_context.update({
-                        step.name: {
-                            "answer": result,
-                            "confidence": 0.9,  # Default confidence
-                            "sources": current_context.get("document_content", "")
-                        }
-                    })
-                else:
-                    # For other steps, store the raw result
-                    current_context.update({step.name: result})
-                    
+                # Execute the step's precompiled chain
+                result = self.chains[step.name].run(**chain_inputs)
+                parsed = self._parse_result(step, result, initial_context)
+            except LLMOverloaded:
+                # shed by the scheduler - the whole request is rejected rather than half answered
+                raise
+            except Exception as e:
+                parsed = self._failed_result(step, e)
+                with lock:
+                    errors[step.name] = str(e)
+            elapsed = time.perf_counter() - started
+            MCP_STEP_SECONDS.observe(elapsed, step=step.name)
+            with lock:
+                timings[step.name] = elapsed
+                current_context.update(parsed)
+                outputs.update(self._step_outputs(step, parsed))
+        
+        # a step is only started once its dependencies are done, so no worker ever waits on another
+        running: Dict[Future, str] = {}
+        done = set()
+        waiting = list(self.steps)
+        while waiting or running:
+            ready = [step for step in waiting if all(dep in done for dep in self.dependencies[step.name])]
+            for step in ready:
+                waiting.remove(step)
+            if len(ready) == 1 and not running:
+                # nothing to overlap with: run it in the calling thread
+                run_step(ready[0])
+                done.add(ready[0].name)
+                continue
+            for step in ready:
+                running[self.executor.submit(run_step, step)] = step.name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done.add(running.pop(future))
+                future.result()
+        
+        current_context["step_timings"] = timings
+        current_context["step_errors"] = errors
+        return current_context
+    
+    async def aexecute(self, initial_context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the MCP pipeline with the given initial context without blocking the event loop
+        Independent steps run concurrently, every step starts as soon as its dependencies are done
+        """
+        current_context = initial_context.copy()
+        outputs: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        errors: Dict[str, str] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def run_step(step: MCPStep):
+            await asyncio.gather(*(tasks[dependency] for dependency in self.dependencies[step.name]))
+            started = time.perf_counter()
+            try:
+                prompt = self.prompts[step.name].format(**self._step_inputs(step, current_context, outputs))
+                result = await self.client.generate(prompt)
+                parsed = self._parse_result(step, result, initial_context)
+            except LLMOverloaded:
+                # shed by the scheduler - the whole request is rejected rather than half answered
+                raise
             except Exception as e:
-                error_msg = f"Error in step {step.name}: {str(e)}\n{traceback.format_exc()}"
-                print(error_msg)
-                # Provide a default response for failed steps
-                if step.name == "document_analysis":
-                    current_context.update({
-                        step.name: {
-                            "key_points": [f"Error analyzing document: {str(e)}"],
-                            "relevance_score": 0.0
-                        }
-                    })
-                elif step.name == "answer_generation":
-                    current_context.update({
-                        step.name: {
-                            "answer": f"Error generating answer: {str(e)}",
-                            "confidence": 0.0,
-                            "sources": ""
-                        }
-                    })
-                else:
-                    current_context.update({step.name: f"Error: {str(e)}"})
-            
+                parsed = self._failed_result(step, e)
+                errors[step.name] = str(e)
+            timings[step.name] = time.perf_counter() - started
+            MCP_STEP_SECONDS.observe(timings[step.name], step=step.name)
+            current_context.update(parsed)
+            outputs.update(self._step_outputs(step, parsed))
+        
+        # steps are kept in topological order, so dependencies always have their task already
+        for step in self.steps:
+            tasks[step.name] = asyncio.create_task(run_step(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        
+        current_context["step_timings"] = timings
+        current_context["step_errors"] = errors
         return current_context
+    
+    def close(self):
+        """
+        Release the step threads
+        """
+        self.executor.shutdown(wait=False)
 
 # Somw MCP steps for document QA
 DOCUMENT_ANALYSIS_STEP = MCPStep(
@@ -164,4 +419,30 @@ ANSWER_GENERATION_STEP = MCPStep(
     """
 ) 
 
+# Single-call alternative to the two steps above: analysis and answer in one structured response
+COMBINED_ANALYSIS_STEP = MCPStep(
+    name="combined_analysis",
+    description="Analyze the document content and answer the query in a single call",
+    input_schema={
+        "document_content": "str",
+        "query": "str"
+    },
+    output_schema={
+        "key_points": "List[str]",
+        "relevance_score": "float",
+        "answer": "str",
+        "confidence": "float"
+    },
+    prompt_template="""
+    Analyze the following document content in relation to the query and answer the query:
+    
+    Document: {document_content}
+    Query: {query}
+    
+    If the document does not contain the answer, just say that you don't know.
+    Respond with a single JSON object and nothing else, in this format:
+    {{"key_points": ["<key point>", ...], "relevance_score": <0.0 to 1.0>, "answer": "<answer to the query>", "confidence": <0.0 to 1.0>}}
+    """
+)
+
 # Similarly other steps can be formulated
\ No newline at end of file
@@ -0,0 +1,241 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from intelli_docs.core.config import settings
+
+# latency buckets (seconds) shared by the histograms - from a cache hit to a slow LLM generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_DISABLED = nullcontext()
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    """
+    Base of the metrics: a name, a help text and a value per combination of label values
+    """
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value, e.g. tokens generated or cache hits
+    """
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, e.g. the depth of a queue
+    The value can also be read from a callback at scrape time, which costs nothing on the hot path
+    """
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        """
+        Read the values at scrape time: `callback` returns a {label values: value} dict
+        """
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                values = sorted(self._callback().items())
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {str(e)}")
+                return []
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+        return super().samples()
+
+class CounterFunction(Gauge):
+    """
+    Counter whose values are read from a callback at scrape time (e.g. the hit counts kept by the caches)
+    """
+    kind = "counter"
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (durations in seconds) over cumulative buckets
+    """
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """
+        Context manager observing the duration of its block (a no-op when the metrics are disabled)
+        """
+        if not self.registry.enabled:
+            return _DISABLED
+        return self._time(labels)
+
+    @contextmanager
+    def _time(self, labels: Dict[str, str]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def time_iter(self, iterable: Iterable, **labels) -> Iterator:
+        """
+        Yield the items of `iterable` and observe the total time spent producing them once it is exhausted
+        Only the time spent inside the iterable counts, not the time the consumer spends between items
+        """
+        if not self.registry.enabled:
+            yield from iterable
+            return
+        elapsed = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe(elapsed, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Registry of the metrics of the application, rendered in the Prometheus text format by `/metrics`
+    When disabled, recording a value returns right away so the instrumentation costs almost nothing
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = "intelli_docs_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def counter_function(self, name: str, documentation: str, callback, labelnames: Sequence[str] = ()) -> CounterFunction:
+        metric = self._get_or_create(CounterFunction, name, documentation, labelnames)
+        metric.set_function(callback)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+# metrics recorded across the services
+EXTRACTION_SECONDS = metrics.histogram("extraction_seconds", "Time spent extracting the text of a document", ["file_type"])
+CHUNKING_SECONDS = metrics.histogram("chunking_seconds", "Time spent splitting the text of a document into chunks", ["file_type"])
+EMBEDDING_BATCH_SECONDS = metrics.histogram("embedding_batch_seconds", "Time spent embedding one batch of texts")
+EMBEDDED_TEXTS = metrics.counter("embedded_texts_total", "Texts embedded in batches (embedding cache hits included)")
+VECTOR_STORE_SECONDS = metrics.histogram("vector_store_seconds", "Latency of the vector store operations", ["operation"])
+MCP_STEP_SECONDS = metrics.histogram("mcp_step_seconds", "Time spent in each step of the MCP pipeline", ["step"])
+LLM_GENERATION_SECONDS = metrics.histogram("llm_generation_seconds", "Time spent generating an answer with the LLM", ["pipeline_mode"])
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens sent to (in) and generated by (out) the LLM", ["direction"])
+QA_ERRORS = metrics.counter("qa_errors_total", "Errors while answering questions", ["stage"])
@@ -0,0 +1,90 @@
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import LLM_TOKENS
+
+def count_tokens(result: Dict[str, Any]):
+    """
+    Count the tokens Ollama reports with the final piece of a response (`prompt_eval_count`, `eval_count`)
+    """
+    LLM_TOKENS.inc(result.get("prompt_eval_count") or 0, direction="in")
+    LLM_TOKENS.inc(result.get("eval_count") or 0, direction="out")
+
+class OllamaClient:
+    """
+    Async client for the Ollama generate API
+
+    All the requests go through a single pooled keep-alive `httpx.AsyncClient`, so the
+    services that share a client also share its connections to Ollama.
+    The underlying HTTP client is created lazily inside the running event loop.
+    """
+
+    def __init__(
+        self,
+        model: str = settings.OLLAMA_MODEL,
+        base_url: str = settings.OLLAMA_BASE_URL,
+        max_connections: int = settings.OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        timeout: float = settings.OLLAMA_TIMEOUT_SECONDS
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+        return self._client
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        return payload
+
+    async def generate(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate the complete response to a prompt
+        """
+        response = await self.client.post("/api/generate", json=self._payload(prompt, False, options))
+        response.raise_for_status()
+        result = response.json()
+        count_tokens(result)
+        return result.get("response", "")
+
+    async def stream(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Generate the response to a prompt, yielding the tokens as Ollama produces them
+        """
+        async with self.client.stream("POST", "/api/generate", json=self._payload(prompt, True, options)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    count_tokens(chunk)
+                    break
+
+    async def aclose(self):
+        """
+        Close the pooled connections
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,150 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import chromadb
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
+from langchain.llms import Ollama
+
+from intelli_docs.core.config import settings
+from intelli_docs.core.ollama_client import OllamaClient
+from intelli_docs.services.embedding_cache import CachedEmbeddings
+
+def _current_rss_bytes() -> int:
+    """
+    Resident set size of the process (peak RSS where the current one is not available)
+    """
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def _model_bytes(embeddings: Embeddings) -> Optional[int]:
+    """
+    Size of the weights of a sentence-transformers model behind (cached) embeddings
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.embeddings
+    model = getattr(embeddings, "client", None)
+    if model is None or not hasattr(model, "parameters"):
+        return None
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+class ResourceRegistry:
+    """
+    Process-wide registry of the heavy resources shared by every service
+
+    Each embedding model, vector store client and LLM client is loaded lazily, exactly once per
+    process, the first time a service asks for it - so all the services of a worker share the same
+    model weights and see the same vector store.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embeddings: Dict[str, Embeddings] = {}
+        self._vector_stores: Dict[str, Any] = {}
+        self._llms: Dict[str, Ollama] = {}
+        self._ollama_clients: Dict[str, OllamaClient] = {}
+        self.load_times: Dict[str, float] = {}
+
+    def get_embeddings(self, model_name: str = settings.EMBEDDING_MODEL) -> Embeddings:
+        """
+        Embedding model (behind the embedding cache when enabled)
+        """
+        with self._lock:
+            if model_name not in self._embeddings:
+                started = time.perf_counter()
+                embeddings = HuggingFaceEmbeddings(
+                    model_name=model_name,
+                    encode_kwargs={"batch_size": settings.EMBEDDING_BATCH_SIZE}
+                )
+                # cache the vectors of texts seen before (in memory and on disk) in front of the model
+                if settings.EMBEDDING_CACHE_ENABLED:
+                    embeddings = CachedEmbeddings(
+                        embeddings,
+                        model_name=model_name,
+                        cache_dir=settings.EMBEDDING_CACHE_DIR,
+                        max_memory_bytes=settings.EMBEDDING_CACHE_MEMORY_BYTES
+                    )
+                self._embeddings[model_name] = embeddings
+                self.load_times[f"embeddings:{model_name}"] = time.perf_counter() - started
+            return self._embeddings[model_name]
+
+    def set_embeddings(self, model_name: str, embeddings: Embeddings):
+        """
+        Serve `embeddings` for a model instead of loading it (e.g. a stand-in for benchmarks)
+        Must be called before the services asking for the model are created
+        """
+        with self._lock:
+            self._embeddings[model_name] = embeddings
+            self.load_times[f"embeddings:{model_name}"] = 0.0
+
+    def get_vector_store(self, path: Path = settings.VECTOR_STORE_PATH) -> Any:
+        """
+        Persistent vector store (ChromaDB) client
+        """
+        key = str(path)
+        with self._lock:
+            if key not in self._vector_stores:
+                started = time.perf_counter()
+                # the collections and their HNSW indexes are persisted under `path` and
+                # survive restarts - an index is only loaded when its collection is first queried
+                self._vector_stores[key] = chromadb.PersistentClient(path=key)
+                self.load_times[f"vector_store:{key}"] = time.perf_counter() - started
+            return self._vector_stores[key]
+
+    def get_llm(self, model: str = settings.OLLAMA_MODEL) -> Ollama:
+        """
+        Synchronous (langchain) Ollama LLM
+        """
+        with self._lock:
+            if model not in self._llms:
+                # init Ollama without any custom callbacks
+                self._llms[model] = Ollama(model=model, base_url=settings.OLLAMA_BASE_URL)
+            return self._llms[model]
+
+    def get_ollama_client(self, model: str = settings.OLLAMA_MODEL) -> OllamaClient:
+        """
+        Async Ollama client with its pooled HTTP connections
+        """
+        with self._lock:
+            if model not in self._ollama_clients:
+                self._ollama_clients[model] = OllamaClient(model=model)
+            return self._ollama_clients[model]
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """
+        Memory used by the process and by the resources loaded so far
+        """
+        with self._lock:
+            embedding_models = {}
+            for model_name, embeddings in self._embeddings.items():
+                embedding_models[model_name] = {"weights_bytes": _model_bytes(embeddings)}
+                if isinstance(embeddings, CachedEmbeddings):
+                    embedding_models[model_name]["cache_bytes"] = embeddings.stats()["memory_bytes"]
+            return {
+                "process_rss_bytes": _current_rss_bytes(),
+                "embedding_models": embedding_models,
+                "vector_stores": list(self._vector_stores.keys()),
+                "llm_clients": sorted(set(self._llms) | set(self._ollama_clients)),
+                "load_times": dict(self.load_times)
+            }
+
+    async def aclose(self):
+        """
+        Release the pooled connections of the async LLM clients
+        """
+        for client in list(self._ollama_clients.values()):
+            await client.aclose()
+
+# Create the registry instance
+registry = ResourceRegistry()
@@ -1,7 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from intelli_docs.api.routes import qa
 from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import metrics
+from intelli_docs.core.registry import registry
+from intelli_docs.services.document_processor import DocumentProcessor
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -26,6 +31,24 @@ app.include_router(
     tags=["qa"]
 )
 
+@app.on_event("startup")
+async def startup():
+    """
+    Open the persistent vector store: re-index the namespaces lost from it and load the indexes
+    """
+    await run_in_threadpool(qa.embedding_service.warm_start)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop the background workers, save the keyword indexes and release the pooled connections to Ollama
+    """
+    qa.ingestion_queue.shutdown()
+    qa.embedding_service.close()
+    DocumentProcessor.shutdown_pool()
+    qa.qa_service.close()
+    await registry.aclose()
+
 @app.get("/")
 async def root():
     """
@@ -37,7 +60,14 @@ async def root():
         "docs_url": "/docs"
     }
 
-if __name__ == "__main__":
-    import uvicorn
-    # run the app at localhost and port 8000
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Latencies and counters of the application in the Prometheus text format
+    """
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# run the server with `python -m intelli_docs` or the uvicorn CLI, not as the __main__ of this module:
+# the spawned PDF extraction workers would import it again, with the whole app
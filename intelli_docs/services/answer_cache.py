@@ -0,0 +1,159 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+class AnswerCache:
+    """
+    Cache of answered questions in front of the QA pipeline
+
+    Questions are matched on their normalized text first and, failing that, on the cosine
+    similarity of their embeddings. Entries expire after `ttl_seconds`, the least recently used
+    ones are evicted beyond `max_entries`, and every entry is dropped as soon as one of the
+    documents it was answered from changes. Every invalidation bumps `generation`, so an answer
+    retrieved before a document changed is not stored after its entries were dropped.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Tuple[Hashable, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped by every invalidation
+        self.generation = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Normalized form of a question - case, whitespace and trailing punctuation do not matter
+        """
+        return " ".join(question.lower().split()).rstrip("?.! ")
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(
+        self,
+        question: str,
+        scope: Hashable,
+        embed: Optional[Callable[[str], List[float]]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Look up the cached response of a question within a scope (the request parameters)
+
+        The question is only embedded with `embed` when there is no exact match, and the embedding
+        is returned along with the response so the caller can reuse it when storing the answer
+        """
+        key = (scope, self.normalize(question))
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return copy.deepcopy(entry["response"]), None
+            has_candidates = any(entry_scope == scope for entry_scope, _ in self._entries)
+
+        if embed is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        embedding = embed(question)
+        if not has_candidates:
+            with self._lock:
+                self.misses += 1
+            return None, embedding
+
+        query = self._unit(embedding)
+        with self._lock:
+            candidates = [(entry_key, entry) for entry_key, entry in self._entries.items() if entry_key[0] == scope]
+            if candidates:
+                similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key, best_entry = candidates[best]
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return copy.deepcopy(best_entry["response"]), embedding
+            self.misses += 1
+        return None, embedding
+
+    def put(
+        self,
+        question: str,
+        scope: Hashable,
+        embedding: List[float],
+        response: Dict[str, Any],
+        sources: Iterable[str],
+        generation: Optional[int] = None
+    ):
+        """
+        Cache the response of a question along with the documents it was answered from
+        The response is dropped if the cache was invalidated since `generation` (read before the
+        documents were retrieved) - it may have been answered from chunks that are gone
+        """
+        key = (scope, self.normalize(question))
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = {
+                "embedding": self._unit(embedding),
+                "response": copy.deepcopy(response),
+                "sources": set(sources),
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            self._expire()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """
+        Drop every cached answer that used one of the given documents
+        """
+        sources: Set[str] = set(sources)
+        with self._lock:
+            self.generation += 1
+            stale = [key for key, entry in self._entries.items() if entry["sources"] & sources]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit / miss counters and the size of the cache
+        """
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries)
+            }
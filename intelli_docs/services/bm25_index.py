@@ -0,0 +1,242 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# words, numbers and codes such as "E-1234", "XJ9.2" or "v2_beta" are kept as single tokens
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[-_./:][A-Za-z0-9]+)*")
+PART_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens of a text - compound codes are indexed both whole and by their parts
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group(0)
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[str]:
+    """
+    Fuse rankings (ids, best first): score(d) = sum over the rankings of 1 / (k + rank of d)
+    Ties keep the order in which the ids were first seen
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+class BM25Index:
+    """
+    Inverted index with BM25 ranking, maintained incrementally alongside the vector store
+
+    Every document gets an internal number; the posting list of a term holds the numbers of the
+    documents containing it and the term frequencies, as compact uint32 arrays. Deleted documents
+    are tombstoned and the postings are compacted once tombstones make up half of the index.
+    The index is persisted (tombstones included) as a single `.npz` file, rewritten as a whole - so
+    callers save once per batch of changes, or through `save_later` for a stream of small ones.
+    """
+
+    def __init__(self, path: Optional[Path] = None, k1: float = 1.5, b: float = 0.75, save_delay: float = 5.0):
+        self.path = Path(path) if path is not None else None
+        self.k1 = k1
+        self.b = b
+        self.save_delay = save_delay
+        self._lock = threading.RLock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._reset()
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def _reset(self):
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_numbers: Dict[str, int] = {}
+        self._doc_lengths = array('I')
+        self._live = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_numbers
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """
+        Index documents - ids that are already indexed are skipped (ids are content addressed)
+        """
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self._doc_numbers:
+                    continue
+                number = len(self._doc_ids)
+                tokens = tokenize(text)
+                self._doc_ids.append(doc_id)
+                self._doc_numbers[doc_id] = number
+                self._doc_lengths.append(len(tokens))
+                self._live.append(1)
+                self._total_length += len(tokens)
+
+                frequencies: Dict[str, int] = {}
+                for token in tokens:
+                    frequencies[token] = frequencies.get(token, 0) + 1
+                for token, frequency in frequencies.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = (array('I'), array('I'))
+                    postings[0].append(number)
+                    postings[1].append(frequency)
+            self._dirty = True
+
+    def delete(self, ids: Iterable[str]):
+        """
+        Remove documents from the index
+        """
+        with self._lock:
+            for doc_id in ids:
+                number = self._doc_numbers.pop(doc_id, None)
+                if number is None:
+                    continue
+                self._doc_ids[number] = None
+                self._live[number] = 0
+                self._total_length -= self._doc_lengths[number]
+                self._dirty = True
+            if len(self._doc_ids) > 2 * len(self._doc_numbers) + 1024:
+                self._compact()
+
+    def _compact(self):
+        """
+        Renumber the live documents and drop the tombstoned ones from the postings
+        """
+        renumber = np.full(len(self._doc_ids), -1, dtype=np.int64)
+        live = np.frombuffer(bytes(self._live), dtype=np.uint8).astype(bool)
+        renumber[live] = np.arange(int(live.sum()))
+
+        postings = {}
+        for token, (docs, tfs) in self._postings.items():
+            docs_np = np.frombuffer(docs, dtype=np.uint32)
+            keep = live[docs_np]
+            if keep.any():
+                postings[token] = (
+                    array('I', renumber[docs_np[keep]].astype(np.uint32).tobytes()),
+                    array('I', np.frombuffer(tfs, dtype=np.uint32)[keep].tobytes())
+                )
+        self._postings = postings
+        self._doc_ids = [doc_id for doc_id in self._doc_ids if doc_id is not None]
+        self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self._doc_ids)}
+        self._doc_lengths = array('I', np.frombuffer(self._doc_lengths, dtype=np.uint32)[live].tobytes())
+        self._live = bytearray(b"\x01" * len(self._doc_ids))
+        self._dirty = True
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Top `n_results` (id, BM25 score) for a query, best first
+        """
+        with self._lock:
+            n_docs = len(self._doc_numbers)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+            norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.uint32)
+                tfs = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+                # tombstoned documents are still in the postings until the next compaction
+                document_frequency = len(docs)
+                idf = math.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norms[docs])
+
+            scores *= np.frombuffer(bytes(self._live), dtype=np.uint8)
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > n_results:
+                candidates = candidates[np.argpartition(-scores[candidates], n_results - 1)[:n_results]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._doc_ids[number], float(scores[number])) for number in candidates]
+
+    def save_later(self):
+        """
+        Save once no change came for `save_delay` seconds, so a stream of small changes (eg. chunks
+        deleted one by one) costs a single write
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        """
+        Persist the index if it changed since it was loaded / saved
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            terms = list(self._postings.keys())
+            offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+            offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms], dtype=np.uint64)
+            docs = b"".join(self._postings[term][0].tobytes() for term in terms)
+            tfs = b"".join(self._postings[term][1].tobytes() for term in terms)
+
+            os.makedirs(self.path.parent, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+            np.savez(
+                tmp_path,
+                # tombstoned documents are saved as null ids
+                doc_ids=np.frombuffer(json.dumps(self._doc_ids).encode('utf-8'), dtype=np.uint8),
+                terms=np.frombuffer(json.dumps(terms).encode('utf-8'), dtype=np.uint8),
+                doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.uint32),
+                offsets=offsets,
+                docs=np.frombuffer(docs, dtype=np.uint32),
+                tfs=np.frombuffer(tfs, dtype=np.uint32)
+            )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def load(self):
+        with self._lock:
+            self._reset()
+            with np.load(self.path) as data:
+                self._doc_ids = json.loads(data["doc_ids"].tobytes().decode('utf-8'))
+                terms = json.loads(data["terms"].tobytes().decode('utf-8'))
+                self._doc_lengths = array('I', data["doc_lengths"].astype(np.uint32).tobytes())
+                offsets = data["offsets"].astype(np.int64)
+                docs = data["docs"].astype(np.uint32)
+                tfs = data["tfs"].astype(np.uint32)
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                self._postings[term] = (array('I', docs[start:end].tobytes()), array('I', tfs[start:end].tobytes()))
+            self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self._doc_ids) if doc_id is not None}
+            self._live = bytearray(0 if doc_id is None else 1 for doc_id in self._doc_ids)
+            self._total_length = sum(length for length, live in zip(self._doc_lengths, self._live) if live)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from intelli_docs.core.config import settings
+
+def make_chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """
+    Stable, content-addressed id of a chunk: sha256 of (source, chunk text)
+    Repeated identical chunks within the same source are told apart by their occurrence number
+    """
+    digest = hashlib.sha256()
+    digest.update(source.encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(text.encode('utf-8'))
+    if occurrence:
+        digest.update(f"\x00{occurrence}".encode('utf-8'))
+    return digest.hexdigest()
+
+class ChunkIdGenerator:
+    """
+    Content-addressed ids for the chunks of a source, in order, as they stream in
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        # occurrences seen so far of every chunk id
+        self._seen: Dict[str, int] = {}
+
+    def next_id(self, text: str) -> str:
+        base_id = make_chunk_id(self.source, text)
+        occurrence = self._seen.get(base_id, 0)
+        self._seen[base_id] = occurrence + 1
+        return base_id if occurrence == 0 else make_chunk_id(self.source, text, occurrence)
+
+class ChunkManifest:
+    """
+    Per-source record of the chunks stored in the vector store
+    Each manifest maps the chunk ids of one source to their chunk index, so a re-uploaded
+    file can be diffed against what was ingested before
+    """
+
+    def __init__(self, manifest_dir: Path = settings.MANIFEST_DIR):
+        self.manifest_dir = Path(manifest_dir)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    def _path(self, source: str) -> Path:
+        """
+        Manifest file of a source - named by the hash of the source to stay filesystem safe
+        """
+        name = hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+        return self.manifest_dir / f"{name}.json"
+
+    def _read(self, source: str) -> Dict[str, Any]:
+        path = self._path(source)
+        if not path.exists():
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, source: str) -> Dict[str, int]:
+        """
+        Load the chunk ids -> chunk index mapping of a source (empty if never ingested)
+        """
+        return self._read(source).get("chunks", {})
+
+    def load_upload(self, source: str) -> Dict[str, Any]:
+        """
+        Upload metadata (file name, upload time, tags) the chunks of a source were stored with
+        """
+        return self._read(source).get("upload", {})
+
+    def _paths(self) -> List[Path]:
+        return sorted(self.manifest_dir.glob("*.json"))
+
+    def count(self) -> int:
+        """
+        Number of sources with a manifest
+        """
+        return len(self._paths())
+
+    def entries(self, limit: Optional[int] = None, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Summary of the sources with a manifest: name, number of chunks and upload metadata
+        Sources come in a stable order, and only the manifests of the requested page are read
+        """
+        paths = self._paths()[offset:]
+        for path in paths if limit is None else paths[:limit]:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                yield {"source": manifest["source"], "chunks": len(manifest.get("chunks", {})), "upload": manifest.get("upload", {})}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping unreadable manifest {path}: {str(e)}")
+
+    def sources(self) -> List[str]:
+        """
+        All the sources with a manifest
+        """
+        return [entry["source"] for entry in self.entries()]
+
+    def save(self, source: str, chunks: Dict[str, int], upload: Optional[Dict[str, Any]] = None):
+        """
+        Atomically replace the manifest of a source
+        The upload metadata is kept from the previous manifest when not given
+        """
+        if upload is None:
+            upload = self.load_upload(source)
+        path = self._path(source)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"source": source, "chunks": chunks, "upload": upload}, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, source: str):
+        """
+        Forget a source entirely
+        """
+        path = self._path(source)
+        if path.exists():
+            os.remove(path)
@@ -0,0 +1,246 @@
+import ast
+import json
+import mmap
+import os
+import re
+import sys
+import uuid
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain.schema import Document as LangchainDocument
+
+from intelli_docs.core.config import settings
+
+# file names of a chunk store inside the directory of a processed document
+TEXT_FILE = "chunks.bin"
+INDEX_FILE = "chunks.idx"
+METADATA_FILE = "chunks.meta.jsonl"
+METADATA_INDEX_FILE = "chunks.meta.idx"
+
+LEGACY_CHUNK_PATTERN = re.compile(r"^chunk_(\d+)(_metadata\.json|\.txt)$")
+
+class ChunkStoreWriter:
+    """
+    Writes the chunks of one document as a compact store in a single buffered pass:
+        - chunks.bin: the UTF-8 text of all the chunks, back to back
+        - chunks.idx: (offset, length) of every chunk in chunks.bin, as little-endian uint64 pairs
+        - chunks.meta.jsonl: the JSON metadata of every chunk, one line per chunk
+        - chunks.meta.idx: (offset, length) of every metadata line, same layout as chunks.idx
+
+    Everything is written to temporary files (named after the writer, so concurrent writers never
+    share one) that replace the previous store on `commit`, so readers never see a half-written document.
+    """
+
+    def __init__(self, doc_dir: Path, buffer_size: int = 1024 * 1024):
+        self.doc_dir = Path(doc_dir)
+        os.makedirs(self.doc_dir, exist_ok=True)
+        self._tmp_suffix = f".{uuid.uuid4().hex}.tmp"
+        self._text_file = open(self._tmp_path(TEXT_FILE), 'wb', buffering=buffer_size)
+        self._metadata_file = open(self._tmp_path(METADATA_FILE), 'wb', buffering=buffer_size)
+        self._index = array('Q')
+        self._metadata_index = array('Q')
+        self._offset = 0
+        self._metadata_offset = 0
+        self._closed = False
+
+    def _tmp_path(self, name: str) -> Path:
+        return self.doc_dir / f"{name}{self._tmp_suffix}"
+
+    def __len__(self) -> int:
+        return len(self._index) // 2
+
+    def append(self, text: str, metadata: Dict[str, Any]):
+        data = text.encode('utf-8')
+        self._text_file.write(data)
+        self._index.extend((self._offset, len(data)))
+        self._offset += len(data)
+        line = (json.dumps(metadata) + "\n").encode('utf-8')
+        self._metadata_file.write(line)
+        self._metadata_index.extend((self._metadata_offset, len(line)))
+        self._metadata_offset += len(line)
+
+    def commit(self):
+        """
+        Flush the store and atomically replace the previous one (and any legacy per-chunk files)
+        """
+        if self._closed:
+            return
+        self._text_file.close()
+        self._metadata_file.close()
+        for name, index in ((METADATA_INDEX_FILE, self._metadata_index), (INDEX_FILE, self._index)):
+            if sys.byteorder != "little":
+                index = array('Q', index)
+                index.byteswap()
+            with open(self._tmp_path(name), 'wb') as f:
+                index.tofile(f)
+
+        # the index goes last - a store is only complete once its index exists
+        for name in (TEXT_FILE, METADATA_FILE, METADATA_INDEX_FILE, INDEX_FILE):
+            os.replace(self._tmp_path(name), self.doc_dir / name)
+        self._closed = True
+        remove_legacy_chunks(self.doc_dir)
+
+    def abort(self):
+        """
+        Drop what was written so far and keep the previous store
+        """
+        if self._closed:
+            return
+        self._text_file.close()
+        self._metadata_file.close()
+        for name in (TEXT_FILE, METADATA_FILE, METADATA_INDEX_FILE, INDEX_FILE):
+            tmp_path = self._tmp_path(name)
+            if tmp_path.exists():
+                os.remove(tmp_path)
+        self._closed = True
+
+class ChunkStoreReader:
+    """
+    Random access to the chunks of a document store - the text and the metadata are read through
+    memory maps, at the offsets of their indexes
+    """
+
+    def __init__(self, doc_dir: Path):
+        self.doc_dir = Path(doc_dir)
+        self._index = self._read_index(self.doc_dir / INDEX_FILE)
+        self._text_file, self._text = self._map(self.doc_dir / TEXT_FILE)
+        self._metadata_file, self._metadata = self._map(self.doc_dir / METADATA_FILE)
+
+        metadata_index_path = self.doc_dir / METADATA_INDEX_FILE
+        if metadata_index_path.exists():
+            self._metadata_index = self._read_index(metadata_index_path)
+        else:
+            # stores written before the metadata index: find the lines once
+            self._metadata_index = array('Q')
+            offset = 0
+            for line in iter(lambda: self._metadata_file.readline(), b""):
+                if line.strip():
+                    self._metadata_index.extend((offset, len(line)))
+                offset += len(line)
+
+    @staticmethod
+    def _read_index(path: Path) -> array:
+        index = array('Q')
+        with open(path, 'rb') as f:
+            index.frombytes(f.read())
+        if sys.byteorder != "little":
+            index.byteswap()
+        return index
+
+    @staticmethod
+    def _map(path: Path):
+        file = open(path, 'rb')
+        size = os.fstat(file.fileno()).st_size
+        return file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._index) // 2
+
+    def __enter__(self) -> "ChunkStoreReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def text(self, i: int) -> str:
+        offset, length = self._index[2 * i], self._index[2 * i + 1]
+        return self._text[offset:offset + length].decode('utf-8')
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        offset, length = self._metadata_index[2 * i], self._metadata_index[2 * i + 1]
+        return json.loads(self._metadata[offset:offset + length].decode('utf-8'))
+
+    def get(self, i: int) -> LangchainDocument:
+        return LangchainDocument(page_content=self.text(i), metadata=self.metadata(i))
+
+    def __iter__(self) -> Iterator[LangchainDocument]:
+        for i in range(len(self)):
+            yield self.get(i)
+
+    def close(self):
+        for mapped, file in ((self._text, self._text_file), (self._metadata, self._metadata_file)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+            file.close()
+
+def has_chunk_store(doc_dir: Path) -> bool:
+    return (Path(doc_dir) / INDEX_FILE).exists()
+
+def _legacy_chunk_indexes(doc_dir: Path) -> List[int]:
+    """
+    Indexes of the chunks saved in the legacy layout (chunk_{i}.txt + chunk_{i}_metadata.json)
+    """
+    indexes = set()
+    for path in Path(doc_dir).iterdir():
+        match = LEGACY_CHUNK_PATTERN.match(path.name)
+        if match and match.group(2) == ".txt":
+            indexes.add(int(match.group(1)))
+    return sorted(indexes)
+
+def remove_legacy_chunks(doc_dir: Path):
+    for path in Path(doc_dir).iterdir():
+        if LEGACY_CHUNK_PATTERN.match(path.name):
+            os.remove(path)
+
+def migrate_legacy_document(doc_dir: Path) -> int:
+    """
+    Convert the per-chunk files of a processed document into a chunk store
+    Returns the number of migrated chunks (0 when there is nothing to migrate)
+    """
+    doc_dir = Path(doc_dir)
+    indexes = _legacy_chunk_indexes(doc_dir)
+    if not indexes:
+        return 0
+
+    writer = ChunkStoreWriter(doc_dir)
+    try:
+        for i in indexes:
+            with open(doc_dir / f"chunk_{i}.txt", 'r', encoding='utf-8') as f:
+                text = f.read()
+            metadata: Dict[str, Any] = {"chunk_index": i}
+            metadata_path = doc_dir / f"chunk_{i}_metadata.json"
+            if metadata_path.exists():
+                # the legacy metadata files hold `str(dict)`, not JSON
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    raw = f.read()
+                try:
+                    metadata = json.loads(raw)
+                except ValueError:
+                    metadata = ast.literal_eval(raw)
+            writer.append(text, metadata)
+    except Exception:
+        writer.abort()
+        raise
+    writer.commit()
+    return len(indexes)
+
+def migrate_all(processed_dir: Path = settings.PROCESSED_DATA_DIR) -> Dict[str, int]:
+    """
+    Migrate every processed document still stored in the legacy layout
+    """
+    migrated = {}
+    for doc_dir in sorted(Path(processed_dir).iterdir()):
+        if doc_dir.is_dir():
+            n_chunks = migrate_legacy_document(doc_dir)
+            if n_chunks:
+                migrated[doc_dir.name] = n_chunks
+    return migrated
+
+def open_chunk_store(doc_dir: Path) -> Optional[ChunkStoreReader]:
+    """
+    Open the chunk store of a processed document, migrating the legacy layout first if needed
+    """
+    doc_dir = Path(doc_dir)
+    if not doc_dir.is_dir():
+        return None
+    migrate_legacy_document(doc_dir)
+    if not has_chunk_store(doc_dir):
+        return None
+    return ChunkStoreReader(doc_dir)
+
+if __name__ == "__main__":
+    # python -m intelli_docs.services.chunk_store - migrate the processed documents to the chunk store
+    for name, n_chunks in migrate_all().items():
+        print(f"[+] Migrated {name}: {n_chunks} chunks")
@@ -0,0 +1,138 @@
+import threading
+from typing import Any, Dict, List
+
+from intelli_docs.core.config import settings
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into the context sent to the LLM
+
+    Chunks of the same source with adjacent `chunk_index` values are merged into one span with their
+    shared overlap written once, identical chunks are dropped, spans are ordered by the rank of their
+    most relevant chunk and the result is trimmed to a token budget.
+    Tokens are estimated from the length of the text (`chars_per_token`), which is close enough for
+    budgeting without loading the tokenizer of the model.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+        chars_per_token: float = settings.CONTEXT_CHARS_PER_TOKEN,
+        max_overlap: int = settings.CHUNK_OVERLAP,
+        min_overlap: int = 16,
+        separator: str = "\n\n"
+    ):
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        # overlaps are searched up to the chunk overlap of the splitter (and a bit of slack)
+        self.max_overlap = max_overlap * 2
+        # shorter matches are more likely to be a coincidence than a real overlap
+        self.min_overlap = min_overlap
+        self.separator = separator
+
+        self._lock = threading.Lock()
+        self.contexts = 0
+        self.retrieved_tokens = 0
+        self.packed_tokens = 0
+
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token + 0.5)
+
+    def _overlap(self, previous: str, current: str) -> int:
+        """
+        Length of the longest suffix of `previous` that is also a prefix of `current`
+        """
+        for length in range(min(len(previous), len(current), self.max_overlap), self.min_overlap - 1, -1):
+            if previous.endswith(current[:length]):
+                return length
+        return 0
+
+    def _merge(self, previous: str, current: str) -> str:
+        if current in previous:
+            return previous
+        overlap = self._overlap(previous, current)
+        if overlap:
+            return previous + current[overlap:]
+        return previous + self.separator + current
+
+    def pack(self, relevant_docs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Merged spans of the retrieved chunks (ordered by relevance), within the token budget
+        `relevant_docs` are expected best first, as returned by the retrieval
+        """
+        # group the chunks by source and order them by their position in the source
+        spans: List[Dict[str, Any]] = []
+        by_source: Dict[str, List[Dict[str, Any]]] = {}
+        seen = set()
+        for rank, doc in enumerate(relevant_docs):
+            if doc['content'] in seen:
+                continue
+            seen.add(doc['content'])
+            metadata = doc.get('metadata') or {}
+            chunk_index = metadata.get("chunk_index")
+            if chunk_index is None:
+                spans.append({"rank": rank, "text": doc['content']})
+                continue
+            by_source.setdefault(str(metadata.get("source", "")), []).append(
+                {"rank": rank, "chunk_index": int(chunk_index), "text": doc['content']}
+            )
+
+        for chunks in by_source.values():
+            chunks.sort(key=lambda chunk: chunk["chunk_index"])
+            span = None
+            for chunk in chunks:
+                if span is not None and chunk["chunk_index"] <= span["last_index"] + 1:
+                    span["text"] = self._merge(span["text"], chunk["text"])
+                    span["rank"] = min(span["rank"], chunk["rank"])
+                    span["last_index"] = chunk["chunk_index"]
+                    continue
+                span = {"rank": chunk["rank"], "text": chunk["text"], "last_index": chunk["chunk_index"]}
+                spans.append(span)
+        spans.sort(key=lambda span: span["rank"])
+
+        # keep the most relevant spans that fit, cutting the first one that does not fit
+        packed = []
+        remaining = self.token_budget
+        for span in spans:
+            tokens = self.estimate_tokens(span["text"])
+            if tokens <= remaining:
+                packed.append(span["text"])
+                remaining -= tokens + self.estimate_tokens(self.separator)
+                continue
+            if remaining >= self.min_overlap or not packed:
+                packed.append(self._truncate(span["text"], remaining))
+            break
+        return [text for text in packed if text]
+
+    def _truncate(self, text: str, tokens: int) -> str:
+        """
+        Cut a text to about `tokens` tokens, at a whitespace boundary where possible
+        """
+        max_chars = max(0, int(tokens * self.chars_per_token))
+        if len(text) <= max_chars:
+            return text
+        cut = text.rfind(" ", 0, max_chars + 1)
+        return text[:cut if cut > max_chars // 2 else max_chars].rstrip()
+
+    def build(self, relevant_docs: List[Dict[str, Any]]) -> str:
+        """
+        Context string for the prompts
+        """
+        context = self.separator.join(self.pack(relevant_docs))
+        with self._lock:
+            self.contexts += 1
+            # counted as the context the chunks would have made unpacked, separators included
+            self.retrieved_tokens += self.estimate_tokens(self.separator.join(doc['content'] for doc in relevant_docs))
+            self.packed_tokens += self.estimate_tokens(context)
+        return context
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.retrieved_tokens - self.packed_tokens
+            return {
+                "token_budget": self.token_budget,
+                "contexts": self.contexts,
+                "retrieved_tokens": self.retrieved_tokens,
+                "packed_tokens": self.packed_tokens,
+                "saved_tokens_ratio": saved / self.retrieved_tokens if self.retrieved_tokens else None
+            }
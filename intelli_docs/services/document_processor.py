@@ -1,11 +1,20 @@
-import os
-from typing import List, Dict, Any
+import math
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterable, Iterator, Optional
 from pathlib import Path
 import PyPDF2
 from docx import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as LangchainDocument
 from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import CHUNKING_SECONDS, EXTRACTION_SECONDS
+from intelli_docs.services.pdf_extraction import extract_pdf_pages
+from intelli_docs.services.chunk_store import ChunkStoreReader, ChunkStoreWriter, open_chunk_store
+from intelli_docs.services.text_splitter import StreamingTextSplitter
 
 class DocumentProcessor:
     """
@@ -13,6 +22,10 @@ class DocumentProcessor:
     These steps are required to interact with the LLMs in the appropriate way
     """
     
+    # process pool shared by all the processors to extract large PDFs, created on first use
+    _pdf_executor: Optional[ProcessPoolExecutor] = None
+    _pdf_executor_lock = threading.Lock()
+    
     def __init__(self):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.CHUNK_SIZE,
@@ -20,82 +33,181 @@ class DocumentProcessor:
             length_function=len, # lambda x: sum([len(xi) for xi in x]),
         )
     
-    async def process_file(self, file_path: str) -> List[LangchainDocument]:
+    def process_file(self, file_path: str) -> List[LangchainDocument]:
         """
         Process a file and return chunks of text
         """
+        return list(self.iter_documents(file_path))
+    
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        """
+        Extract the text of a file piece by piece (page / paragraph / block) based on its extension
+        """
         file_extension = Path(file_path).suffix.lower()
         
         if file_extension == '.pdf':
-            text = await self._extract_pdf_text(file_path)
+            return EXTRACTION_SECONDS.time_iter(self._extract_pdf_text(file_path), file_type="pdf")
         elif file_extension == '.docx':
-            text = await self._extract_docx_text(file_path)
+            return EXTRACTION_SECONDS.time_iter(self._extract_docx_text(file_path), file_type="docx")
         elif file_extension == '.txt':
-            text = await self._extract_txt_text(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension} - only one of [pdf, docx, txt] are supported")
+            return EXTRACTION_SECONDS.time_iter(self._extract_txt_text(file_path), file_type="txt")
+        raise ValueError(f"Unsupported file type: {file_extension} - only one of [pdf, docx, txt] are supported")
+    
+    def iter_documents(self, file_path: str) -> Iterator[LangchainDocument]:
+        """
+        Split the text of a file into Langchain documents as it is extracted
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
+        The extracted pieces are fed to a streaming splitter, so chunks can cross page boundaries and
+        keep their overlap - they are the chunks of the whole text split at once
+        """
+        splitter = StreamingTextSplitter(self.text_splitter)
+        chunk_index = 0
+        # time spent splitting, observed once the whole file is chunked
+        chunking = 0.0
         
-        # Convert chunks to Langchain documents
-        documents = [
-            LangchainDocument(
-                page_content=chunk,
-                metadata={
-                    "source": file_path,
-                    "chunk_index": i
-                }
-            )
-            for i, chunk in enumerate(chunks)
-        ]
+        for text in self.iter_text(file_path):
+            # Split text into chunks
+            start = time.perf_counter()
+            chunks = splitter.feed(text)
+            chunking += time.perf_counter() - start
+            for chunk in chunks:
+                yield self._make_document(file_path, chunk, chunk_index)
+                chunk_index += 1
         
-        return documents
+        start = time.perf_counter()
+        chunks = splitter.finish()
+        CHUNKING_SECONDS.observe(chunking + time.perf_counter() - start, file_type=Path(file_path).suffix.lower().lstrip("."))
+        for chunk in chunks:
+            yield self._make_document(file_path, chunk, chunk_index)
+            chunk_index += 1
+    
+    @staticmethod
+    def _make_document(file_path: str, chunk: str, chunk_index: int) -> LangchainDocument:
+        """
+        Convert a chunk to a Langchain document
+        """
+        return LangchainDocument(
+            page_content=chunk,
+            metadata={
+                "source": file_path,
+                "chunk_index": chunk_index
+            }
+        )
+    
+    @classmethod
+    def _get_pdf_executor(cls) -> ProcessPoolExecutor:
+        with cls._pdf_executor_lock:
+            if cls._pdf_executor is None:
+                # spawn rather than fork - the parent process runs threads (web server, model, ingestion)
+                # the workers import the parent's main module again: start the server through the
+                # uvicorn CLI or `python -m intelli_docs` so that it is not the app module
+                cls._pdf_executor = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACTION_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return cls._pdf_executor
     
-    async def _extract_pdf_text(self, file_path: str) -> str:
+    @classmethod
+    def shutdown_pool(cls):
         """
-        Extract text from PDF file using the PyPDF2 pacjage
+        Stop the worker processes of the PDF pool
+        """
+        with cls._pdf_executor_lock:
+            if cls._pdf_executor is not None:
+                cls._pdf_executor.shutdown(wait=False, cancel_futures=True)
+                cls._pdf_executor = None
+    
+    def _extract_pdf_text(self, file_path: str) -> Iterator[str]:
+        """
+        Extract text from PDF file using the PyPDF2 pacjage, page by page
+        Large PDFs are sharded into page ranges that are extracted in parallel by the PDF process pool
         """
-        text = ""
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            n_pages = len(PyPDF2.PdfReader(file).pages)
+        
+        max_workers = settings.PDF_EXTRACTION_MAX_WORKERS
+        if max_workers <= 1 or n_pages < settings.PDF_PARALLEL_MIN_PAGES:
+            with open(file_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                for page in pdf_reader.pages:
+                    yield (page.extract_text() or "") + "\n"
+            return
+        
+        # a few shards per worker to balance pages that are slower to extract
+        shard_size = math.ceil(n_pages / (max_workers * 4))
+        executor = self._get_pdf_executor()
+        # only a bounded window of shards is in flight, so extraction does not run far ahead of the consumer
+        pending = deque()
+        for start in range(0, n_pages, shard_size):
+            pending.append(executor.submit(extract_pdf_pages, file_path, start, min(start + shard_size, n_pages)))
+            if len(pending) >= max_workers * 2:
+                for page in pending.popleft().result():
+                    yield page + "\n"
+        while pending:
+            for page in pending.popleft().result():
+                yield page + "\n"
     
-    async def _extract_docx_text(self, file_path: str) -> str:
+    def _extract_docx_text(self, file_path: str) -> Iterator[str]:
         """
-        Extract text from DOCX file using the docx package
+        Extract text from DOCX file using the docx package, paragraph by paragraph
         """
         doc = Document(file_path)
-        text = ""
         for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+            yield paragraph.text + "\n"
     
-    async def _extract_txt_text(self, file_path: str) -> str:
+    def _extract_txt_text(self, file_path: str) -> Iterator[str]:
         """
-        Extract text from TXT file with native python io
+        Extract text from TXT file with native python io, block by block
         """
         with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+            for block in iter(lambda: file.read(64 * 1024), ""):
+                yield block
     
-    async def save_processed_document(self, file_path: str, documents: List[LangchainDocument]):
+    @staticmethod
+    def processed_dir(file_path: str, namespace: Optional[str] = None, legacy: bool = False) -> Path:
         """
-        Save processed document chunks to disk
+        Directory of the saved chunks of a document, named by the file name with its extension so that
+        `manual.pdf` and `manual.txt` get one each - documents of other namespaces than the default one
+        are kept apart
+        `legacy` gives the directory of the previous layout, named without the extension
+        """
+        doc_name = Path(file_path).stem if legacy else Path(file_path).name
+        if namespace and namespace != settings.DEFAULT_NAMESPACE:
+            return settings.PROCESSED_DATA_DIR / "namespaces" / namespace / doc_name
+        return settings.PROCESSED_DATA_DIR / doc_name
+    
+    def iter_saved_documents(
+        self,
+        file_path: str,
+        documents: Iterable[LangchainDocument],
+        namespace: Optional[str] = None
+    ) -> Iterator[LangchainDocument]:
+        """
+        Save processed document chunks to disk as they stream through
+        The chunks are written to a compact per-document chunk store, which replaces the previous
+        one once all the chunks went through
         """
         # Create a directory for the document
-        doc_name = Path(file_path).stem
-        doc_dir = settings.PROCESSED_DATA_DIR / doc_name
-        os.makedirs(doc_dir, exist_ok=True)
+        doc_dir = self.processed_dir(file_path, namespace)
         
-        # Save each chunk
-        for i, doc in enumerate(documents):
-            chunk_path = doc_dir / f"chunk_{i}.txt"
-            with open(chunk_path, 'w', encoding='utf-8') as f:
-                f.write(doc.page_content)
-            
-            # Save metadata
-            metadata_path = doc_dir / f"chunk_{i}_metadata.json"
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                f.write(str(doc.metadata)) 
\ No newline at end of file
+        writer = ChunkStoreWriter(doc_dir)
+        try:
+            for doc in documents:
+                writer.append(doc.page_content, doc.metadata)
+                yield doc
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+    
+    @classmethod
+    def open_processed(cls, file_path: str, namespace: Optional[str] = None) -> Optional[ChunkStoreReader]:
+        """
+        Reader of the saved chunks of a document (None if it was never processed)
+        Documents processed before the directories were named by the full file name are read from
+        their legacy directory - which may hold the chunks of another file with the same stem
+        """
+        reader = open_chunk_store(cls.processed_dir(file_path, namespace))
+        if reader is None:
+            reader = open_chunk_store(cls.processed_dir(file_path, namespace, legacy=True))
+        return reader
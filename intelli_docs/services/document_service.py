@@ -2,6 +2,7 @@ from typing import List, Dict, Any
 import os
 from intelli_docs.core.config import settings
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from intelli_docs.services.document_processor import DocumentProcessor
 from intelli_docs.services.embedding_service import EmbeddingService
 
@@ -25,21 +26,19 @@ class DocumentService:
             content = await file.read()
             buffer.write(content)
         
-        documents = await self.document_processor.process_file(file_path)
-        
-        await self.document_processor.save_processed_document(file_path, documents)
-        
-        await self.embedding_service.add_documents(documents)
+        # the processing is blocking, keep it off the event loop - chunks are extracted,
+        # saved and embedded as a stream
+        await run_in_threadpool(self.embedding_service.process_document, file_path)
         return file.filename
     
     async def list_documents(self) -> List[Dict[str, Any]]:
         """
         List all processed documents
         """
-        return await self.embedding_service.get_all_documents()
+        return await run_in_threadpool(self.embedding_service.list_documents)
     
     async def delete_document(self, document_id: str):
         """
         Delete a document
         """
-        await self.embedding_service.delete_document(document_id) 
\ No newline at end of file
+        await run_in_threadpool(self.embedding_service.delete_document, document_id) 
\ No newline at end of file
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # no advisory file locks (windows) - a single writing process per directory
+    fcntl = None
+
+KEY_SIZE = hashlib.sha256().digest_size
+
+class EmbeddingDiskStore:
+    """
+    Append-only, memory-mapped store of float32 embeddings for a single embedding model
+
+    The store is made of three files in its directory:
+        - meta.json: the model name and vector dimension
+        - keys.bin: the sha256 digest of the text of every row, 32 bytes per row
+        - vectors.f32: the rows of float32 vectors, read back through a memory map
+
+    Vectors are always written before their keys, so a torn write is detected and truncated.
+    Stores are shared per directory within a process, and appends from several processes are
+    serialized by a lock file: each writer first picks up the rows the others appended, and rows are
+    numbered from the size of the vectors file, never from what one process remembers.
+    """
+
+    _open_stores: Dict[Path, "EmbeddingDiskStore"] = {}
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory: Path, model_name: str) -> "EmbeddingDiskStore":
+        """
+        Open the store of a directory, reusing the instance already open in this process
+        """
+        directory = Path(directory).resolve()
+        with cls._open_lock:
+            store = cls._open_stores.get(directory)
+            if store is None:
+                store = cls(directory, model_name)
+                cls._open_stores[directory] = store
+            return store
+
+    def __init__(self, directory: Path, model_name: str):
+        self.directory = Path(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.model_name = model_name
+        self.meta_path = self.directory / "meta.json"
+        self.keys_path = self.directory / "keys.bin"
+        self.vectors_path = self.directory / "vectors.f32"
+        self.lock_path = self.directory / "store.lock"
+
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        # rows of the files already read into `_rows` (a key written twice keeps its first row)
+        self._file_rows = 0
+        self._mmap: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive lock on the store files, across processes
+        """
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        with self._file_lock():
+            self._refresh()
+
+    def _refresh(self):
+        """
+        Read the keys appended since the last refresh (by any process) and drop partially written rows
+        Must hold the file lock
+        """
+        if self.dim is None:
+            if not self.meta_path.exists():
+                return
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.dim = int(json.load(f)["dim"])
+
+        key_bytes = os.path.getsize(self.keys_path) if self.keys_path.exists() else 0
+        vector_bytes = os.path.getsize(self.vectors_path) if self.vectors_path.exists() else 0
+        n_rows = min(key_bytes // KEY_SIZE, vector_bytes // (4 * self.dim))
+
+        # truncate torn writes so that appended rows stay aligned with their keys
+        for path, size in ((self.keys_path, n_rows * KEY_SIZE), (self.vectors_path, n_rows * 4 * self.dim)):
+            if path.exists() and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+        known = self._file_rows
+        if n_rows > known:
+            with open(self.keys_path, 'rb') as f:
+                f.seek(known * KEY_SIZE)
+                keys = f.read((n_rows - known) * KEY_SIZE)
+            for i in range(n_rows - known):
+                self._rows.setdefault(keys[i * KEY_SIZE:(i + 1) * KEY_SIZE], known + i)
+        self._file_rows = n_rows
+
+    def _remap(self):
+        """
+        Map the vectors file again after it grew
+        """
+        n_rows = self._file_rows
+        self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(n_rows, self.dim)) if n_rows else None
+        self._mapped_rows = n_rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Vector stored for a key, or None
+        """
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            if row >= self._mapped_rows:
+                self._remap()
+            return np.array(self._mmap[row])
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """
+        Append vectors for keys that are not stored yet
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            # another process may have appended rows (or created the store) since the last write
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+            new_rows = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in new_rows and vector.shape[0] == self.dim:
+                    new_rows[key] = vector
+            if not new_rows:
+                return
+
+            row_bytes = 4 * self.dim
+            with open(self.vectors_path, 'ab') as f:
+                first_row = os.fstat(f.fileno()).st_size // row_bytes
+                f.write(np.stack(list(new_rows.values())).tobytes())
+            with open(self.keys_path, 'ab') as f:
+                f.write(b"".join(new_rows.keys()))
+
+            for i, key in enumerate(new_rows):
+                self._rows[key] = first_row + i
+            self._file_rows = first_row + len(new_rows)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding cache in front of a langchain embedding model
+
+    Lookups go to an in-memory LRU (bounded by `max_memory_bytes`) first, then to the on-disk
+    store of the model, and only the remaining texts are sent through the model in one call.
+    Entries are keyed by (model name, sha256(text)) - every model gets its own disk store.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_dir: Optional[Path] = None,
+        max_memory_bytes: int = 64 * 1024 * 1024
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_bytes = max_memory_bytes
+
+        self.disk_store: Optional[EmbeddingDiskStore] = None
+        if cache_dir is not None:
+            model_slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            model_hash = hashlib.sha256(model_name.encode('utf-8')).hexdigest()[:8]
+            self.disk_store = EmbeddingDiskStore.open(Path(cache_dir) / f"{model_slug}-{model_hash}", model_name)
+
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """
+        Put a vector in the LRU and evict the least recently used ones beyond the budget
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        vector = self.disk_store.get(key) if self.disk_store is not None else None
+        with self._lock:
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+            else:
+                self.misses += 1
+        return vector
+
+    def _store(self, keys: List[bytes], vectors: List[List[float]]) -> List[np.ndarray]:
+        arrays = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        with self._lock:
+            for key, vector in zip(keys, arrays):
+                self._remember(key, vector)
+        if self.disk_store is not None and arrays:
+            self.disk_store.put_many(keys, np.stack(arrays))
+        return arrays
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, only running the model on the ones that are not cached
+        """
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            vectors.update(zip(missing.keys(), self._store(list(missing.keys()), computed)))
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, skipping the model when the same text was embedded before
+        """
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store([key], [self.embeddings.embed_query(text)])[0]
+        return vector.tolist()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit / miss counters and the size of the cache
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self.disk_store) if self.disk_store is not None else 0
+            }
@@ -1,102 +1,799 @@
-import chromadb
+import itertools
 import os
 import json
+import re
+import threading
+import time
 
-from typing import List, Dict, Any
-from chromadb.config import Settings
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Deque, Iterable, Iterator, Optional, Tuple
 from langchain.schema import Document as LangchainDocument
-from langchain.embeddings import HuggingFaceEmbeddings
 from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import metrics, EMBEDDED_TEXTS, EMBEDDING_BATCH_SECONDS, VECTOR_STORE_SECONDS
+from intelli_docs.core.registry import registry
+from intelli_docs.services.bm25_index import BM25Index, reciprocal_rank_fusion
+from intelli_docs.services.chunk_manifest import ChunkManifest, ChunkIdGenerator
+from intelli_docs.services.embedding_cache import CachedEmbeddings
+
+# collection names accepted by chroma: 3-63 characters, alphanumeric at both ends
+NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+# tags are stored as boolean chunk metadata `tag:<name>`, so they can be filtered on
+TAG_PREFIX = "tag:"
+# fields a document listing can include next to the ids -> their chroma `include` names
+DOCUMENT_FIELDS = {"content": "documents", "metadata": "metadatas"}
+
+class NamespaceNotFound(Exception):
+    """
+    Raised when reading from a namespace nothing was ever uploaded to
+    """
+
+class Namespace:
+    """
+    An isolated set of documents: its own vector store collection, chunk manifests and keyword index
+    """
+    
+    def __init__(self, name: str, collection: Any, manifest: ChunkManifest, bm25: BM25Index):
+        self.name = name
+        self.collection = collection
+        self.manifest = manifest
+        self.bm25 = bm25
 
 class EmbeddingService:
     """
     Handles document embeddings and vector storage
+    
+    Documents live in namespaces (one chroma collection each, "documents" by default), so that
+    queries restricted to one tenant / product line only search its share of the index
     """
     
     def __init__(self):
-        # Initialize the embedding model
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDING_MODEL
+        # The embedding model and the ChromaDB client are loaded once per process and shared by
+        # every service - the same model embeds both the chunks and the queries
+        self.embeddings = registry.get_embeddings(settings.EMBEDDING_MODEL)
+        self.client = registry.get_vector_store(settings.VECTOR_STORE_PATH)
+        
+        self._namespaces: Dict[str, Namespace] = {}
+        self._namespaces_lock = threading.Lock()
+        
+        # the default namespace is the collection used before namespaces existed
+        default_namespace = self.get_namespace(settings.DEFAULT_NAMESPACE, create=True)
+        self.collection = default_namespace.collection
+        self.manifest = default_namespace.manifest
+        self.bm25 = default_namespace.bm25
+        
+        # filled by `warm_start`
+        self.startup_stats: Dict[str, Any] = {}
+        
+        # callbacks notified with the sources whose chunks changed
+        self._change_listeners: List[Callable[[List[str]], Any]] = []
+        
+        metrics.counter_function(
+            "embedding_cache_lookups_total", "Lookups in the embedding cache by result", self._cache_lookups, ["result"]
         )
+    
+    def get_namespace(self, name: Optional[str] = None, create: bool = False) -> Namespace:
+        """
+        Collection, manifests and keyword index of a namespace
+        Only the writes `create` a namespace - reading from an unknown one raises `NamespaceNotFound`
+        instead of leaving an empty collection behind
+        """
+        name = name or settings.DEFAULT_NAMESPACE
+        if not NAMESPACE_PATTERN.match(name):
+            raise ValueError(
+                f"Invalid namespace: {name} (3-63 letters, digits, '_' or '-', starting and ending with a letter or digit)"
+            )
+        with self._namespaces_lock:
+            if name not in self._namespaces:
+                started = time.perf_counter()
+                # vectors are always computed by `self.embeddings`, so chroma's default
+                # embedding function is disabled to avoid loading a second model
+                if create:
+                    collection = self.client.get_or_create_collection(
+                        name=name,
+                        metadata={"hnsw:space": "cosine"}, # use cosine similarity metric
+                        embedding_function=None
+                    )
+                else:
+                    try:
+                        collection = self.client.get_collection(name=name, embedding_function=None)
+                    except ValueError:
+                        raise NamespaceNotFound(f"Unknown namespace: {name}")
+                if name == settings.DEFAULT_NAMESPACE:
+                    manifest_dir, bm25_path = settings.MANIFEST_DIR, settings.BM25_INDEX_PATH
+                else:
+                    manifest_dir = settings.MANIFEST_DIR / name
+                    bm25_path = settings.BM25_INDEX_PATH.with_name(f"bm25_index.{name}.npz")
+                
+                namespace = Namespace(
+                    name,
+                    collection,
+                    # per-source record of the stored chunk hashes for incremental re-ingestion
+                    ChunkManifest(manifest_dir),
+                    # keyword index over the same chunks, for exact terms (part numbers, error codes, acronyms)
+                    BM25Index(bm25_path, save_delay=settings.BM25_SAVE_DELAY_SECONDS)
+                )
+                self._sync_bm25(namespace)
+                self._namespaces[name] = namespace
+                registry.load_times[f"collection:{name}"] = time.perf_counter() - started
+            return self._namespaces[name]
+    
+    def close(self):
+        """
+        Save the pending changes of the keyword indexes
+        """
+        with self._namespaces_lock:
+            namespaces = list(self._namespaces.values())
+        for namespace in namespaces:
+            namespace.bm25.save()
+    
+    def has_namespace(self, name: Optional[str] = None) -> bool:
+        """
+        Whether documents were ever uploaded to a namespace
+        """
+        try:
+            self.get_namespace(name)
+            return True
+        except NamespaceNotFound:
+            return False
+    
+    def list_namespaces(self) -> List[str]:
+        """
+        Names of all the namespaces in the vector store
+        """
+        return sorted(collection.name for collection in self.client.list_collections())
+    
+    def _sync_bm25(self, namespace: Namespace):
+        """
+        Rebuild the keyword index from the vector store when they went out of step
+        (eg. the index file is missing or the vector store was reset)
+        """
+        n_chunks = namespace.collection.count()
+        if len(namespace.bm25) == n_chunks:
+            return
+        namespace.bm25.clear()
+        batch_size = self._write_batch_size()
+        for offset in range(0, n_chunks, batch_size):
+            results = namespace.collection.get(limit=batch_size, offset=offset, include=["documents"])
+            namespace.bm25.add(results['ids'], results['documents'])
+        namespace.bm25.save()
+    
+    def warm_start(self) -> Dict[str, Any]:
+        """
+        Startup of the persistent vector store: rebuild the namespaces whose index is missing from
+        the processed chunks on disk (`VECTOR_STORE_REBUILD_MISSING`), then load the vector index of
+        every namespace (`VECTOR_STORE_WARMUP`) so that the first queries do not pay for it
+        """
+        started = time.perf_counter()
+        rebuilt = self.rebuild_missing() if settings.VECTOR_STORE_REBUILD_MISSING else {}
+        indexes = {}
+        if settings.VECTOR_STORE_WARMUP:
+            for name in self.list_namespaces():
+                indexes[name] = self.warm_up(name)
+        self.startup_stats = {"seconds": time.perf_counter() - started, "rebuilt": rebuilt, "indexes": indexes}
+        print(f"Vector store ready in {self.startup_stats['seconds']:.2f}s: {json.dumps(self.startup_stats)}")
+        return self.startup_stats
+    
+    def warm_up(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load the vector index of a namespace with a one-result query and report how long it took
+        Chroma opens the persisted index of a collection on its first vector query
+        """
+        namespace = self.get_namespace(name)
+        started = time.perf_counter()
+        n_chunks = namespace.collection.count()
+        if n_chunks:
+            sample = namespace.collection.peek(1)
+            namespace.collection.query(query_embeddings=[sample['embeddings'][0]], n_results=1, include=[])
+        seconds = time.perf_counter() - started
+        registry.load_times[f"index:{namespace.name}"] = seconds
+        return {"chunks": n_chunks, "load_seconds": seconds}
+    
+    def rebuild_missing(self, max_workers: int = settings.VECTOR_STORE_REBUILD_WORKERS) -> Dict[str, Dict[str, int]]:
+        """
+        Re-index the namespaces that have chunk manifests but an empty collection (eg. the vector
+        store was lost) from the chunk stores of the processed documents, without extracting them again
+        Sources are re-indexed in parallel, each one in write batches - the embeddings come from the
+        embedding cache when it still has them
+        """
+        names = [settings.DEFAULT_NAMESPACE]
+        if settings.MANIFEST_DIR.exists():
+            names += sorted(
+                path.name for path in settings.MANIFEST_DIR.iterdir()
+                if path.is_dir() and NAMESPACE_PATTERN.match(path.name) and path.name != settings.DEFAULT_NAMESPACE
+            )
+        
+        jobs = []
+        for name in names:
+            namespace = self.get_namespace(name, create=True)
+            if namespace.collection.count():
+                continue
+            jobs.extend((namespace, source) for source in namespace.manifest.sources())
+        
+        stats: Dict[str, Dict[str, int]] = {}
+        if not jobs:
+            return stats
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="rebuild") as executor:
+            futures = {executor.submit(self._rebuild_source, namespace, source): (namespace.name, source) for namespace, source in jobs}
+            for future in as_completed(futures):
+                name, source = futures[future]
+                entry = stats.setdefault(name, {"sources": 0, "chunks": 0, "missing": 0})
+                try:
+                    n_chunks = future.result()
+                except Exception as e:
+                    print(f"Error rebuilding {source} in namespace {name}: {str(e)}")
+                    n_chunks = None
+                if n_chunks is None:
+                    entry["missing"] += 1
+                else:
+                    entry["sources"] += 1
+                    entry["chunks"] += n_chunks
+        return stats
+    
+    def _rebuild_source(self, namespace: Namespace, source: str) -> Optional[int]:
+        """
+        Re-index the chunks of a source listed in its manifest from its chunk store
+        (None if the chunk store is gone)
+        """
+        from .document_processor import DocumentProcessor
+        reader = DocumentProcessor.open_processed(source, namespace.name)
+        if reader is None:
+            print(f"No processed chunks for {source} in namespace {namespace.name}, it has to be uploaded again")
+            return None
+        
+        chunks = namespace.manifest.load(source)
+        # chunks deleted one by one since the upload are not brought back - the kept ones keep the ids
+        # of their position in the whole source, a duplicate chunk may not be its first occurrence anymore
+        id_generator = ChunkIdGenerator(source)
+        chunk_ids: Deque[str] = deque()
         
-        # Initialize ChromaDB client
-        self.client = chromadb.Client(
-            Settings(
-                persist_directory=str(settings.VECTOR_STORE_PATH)
+        def kept_documents() -> Iterator[LangchainDocument]:
+            for doc in reader:
+                chunk_id = id_generator.next_id(doc.page_content)
+                if chunk_id in chunks:
+                    chunk_ids.append(chunk_id)
+                    yield doc
+        
+        with reader:
+            documents = kept_documents()
+            first = next(documents, None)
+            if first is None:
+                # the chunk store is of another file (or version) - syncing nothing would empty the manifest
+                print(f"Warning: the processed chunks of {source} in namespace {namespace.name} are not the ones in its manifest, it has to be uploaded again")
+                return None
+            stats = self._sync_source(
+                namespace, source, itertools.chain([first], documents), incremental=False,
+                upload_metadata=namespace.manifest.load_upload(source) or None, chunk_ids=chunk_ids
             )
-        )
+        return stats["added"]
+    
+    @staticmethod
+    def upload_metadata(source: str, tags: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Metadata added to every chunk of an upload: file name, upload time and tags
+        """
+        metadata: Dict[str, Any] = {"filename": Path(source).name, "uploaded_at": time.time()}
+        for tag in tags or []:
+            if tag.strip():
+                metadata[TAG_PREFIX + tag.strip()] = True
+        return metadata
+    
+    @staticmethod
+    def build_where(
+        sources: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+        uploaded_after: Optional[float] = None,
+        uploaded_before: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Chroma `where` filter on the chunk metadata - None when there is nothing to filter on
+            - sources: file names (or full source paths) of the documents
+            - tags: the chunks must carry all of them
+            - uploaded_after / uploaded_before: bounds (unix time) on when the sources were last uploaded
+        """
+        conditions: List[Dict[str, Any]] = []
+        if sources:
+            conditions.append({"$or": [
+                {"filename": {"$in": list(sources)}},
+                {"source": {"$in": list(sources)}}
+            ]})
+        for tag in tags or []:
+            if tag.strip():
+                conditions.append({TAG_PREFIX + tag.strip(): True})
+        if uploaded_after is not None:
+            conditions.append({"uploaded_at": {"$gte": uploaded_after}})
+        if uploaded_before is not None:
+            conditions.append({"uploaded_at": {"$lte": uploaded_before}})
         
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"} # use cosine similarity metric
-        )
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
     
-    def add_documents(self, documents: List[LangchainDocument]):
+    def add_change_listener(self, listener: Callable[[List[str]], Any]):
         """
-        Add documents to the vector store
+        Register a callback that is called with the sources whose chunks were added, updated or deleted
         """
-        texts = [doc.page_content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-        ids = [f"doc_{idx}" for idx in range(len(documents))]
-        self.collection.add(
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        self._change_listeners.append(listener)
     
-    def search_similar(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def _notify_change(self, sources: Iterable[str]):
+        sources = list(sources)
+        if not sources:
+            return
+        for listener in self._change_listeners:
+            listener(sources)
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts with the configured model in micro-batches of `EMBEDDING_BATCH_SIZE`
+        """
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            with EMBEDDING_BATCH_SECONDS.time():
+                vectors.extend(self.embeddings.embed_documents(batch))
+            EMBEDDED_TEXTS.inc(len(batch))
+        return vectors
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Hit / miss counters of the embedding cache
+        """
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return {"enabled": True, **self.embeddings.stats()}
+        return {"enabled": False}
+    
+    def _cache_lookups(self) -> Dict[Tuple[str, ...], int]:
+        stats = self.cache_stats()
+        if not stats["enabled"]:
+            return {}
+        return {("memory_hit",): stats["memory_hits"], ("disk_hit",): stats["disk_hits"], ("miss",): stats["misses"]}
+    
+    def _write_batch_size(self) -> int:
+        """
+        Size of the bulk slices written to the vector store, bounded by what the client accepts
+        """
+        batch_size = max(1, settings.VECTOR_STORE_WRITE_BATCH_SIZE)
+        max_batch_size = getattr(self.client, "max_batch_size", None)
+        if isinstance(max_batch_size, int) and max_batch_size > 0:
+            batch_size = min(batch_size, max_batch_size)
+        return batch_size
+    
+    def add_documents(
+        self,
+        documents: List[LangchainDocument],
+        incremental: bool = True,
+        progress_callback: Optional[Callable[[int], Any]] = None,
+        namespace: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Add documents to the vector store (of a namespace) under content-addressed chunk ids
+        
+        The chunks of every source are diffed against the manifest of that source: chunks that are
+        already stored are not embedded again (unless `incremental` is disabled), new chunks are
+        embedded and written, and chunks that vanished from the source are deleted
+        `progress_callback` is called with the number of chunks handled after every written slice
+        Every chunk is stored with its file name, upload time and `tags` for filtering
+        """
+        target = self.get_namespace(namespace, create=True)
+        stats = {"added": 0, "unchanged": 0, "deleted": 0, "updated": 0}
+        changed_sources = []
+        
+        documents_by_source: Dict[str, List[LangchainDocument]] = {}
+        for doc in documents:
+            documents_by_source.setdefault(str(doc.metadata.get("source", "")), []).append(doc)
+        
+        try:
+            for source, source_documents in documents_by_source.items():
+                source_stats = self._sync_source(target, source, source_documents, incremental, progress_callback, tags)
+                for key, value in source_stats.items():
+                    stats[key] += value
+                if source_stats["added"] or source_stats["deleted"] or source_stats["updated"]:
+                    changed_sources.append(source)
+        finally:
+            # the sources synced before a failure did change
+            self._notify_change(changed_sources)
+        return stats
+    
+    def add_document_stream(
+        self,
+        source: str,
+        documents: Iterable[LangchainDocument],
+        incremental: bool = True,
+        progress_callback: Optional[Callable[[int], Any]] = None,
+        namespace: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Add the chunks of a single source as they are produced
+        
+        Chunks are embedded and written in slices of the write batch size, so memory is bounded by the
+        slice size rather than the document size and the first chunks are searchable before the whole
+        document is processed. Same diffing as `add_documents`
+        """
+        stats = self._sync_source(self.get_namespace(namespace, create=True), source, documents, incremental, progress_callback, tags)
+        if stats["added"] or stats["deleted"] or stats["updated"]:
+            self._notify_change([source])
+        return stats
+    
+    def _sync_source(
+        self,
+        namespace: Namespace,
+        source: str,
+        documents: Iterable[LangchainDocument],
+        incremental: bool,
+        progress_callback: Optional[Callable[[int], Any]] = None,
+        tags: Optional[List[str]] = None,
+        upload_metadata: Optional[Dict[str, Any]] = None,
+        chunk_ids: Optional[Deque[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Bring the stored chunks of one source in line with `documents`, one slice at a time
+        `upload_metadata` restores the metadata of an earlier upload instead of starting a new one
+        `chunk_ids` are the ids of the documents when they are not the whole source, taken from the
+        left as the documents are read
+        """
+        stats = {"added": 0, "unchanged": 0, "deleted": 0, "updated": 0}
+        if upload_metadata is None:
+            upload_metadata = self.upload_metadata(source, tags)
+        previous_chunks = namespace.manifest.load(source)
+        current_chunks: Dict[str, int] = {}
+        id_generator = ChunkIdGenerator(source)
+        
+        try:
+            for batch in self._batches(documents, self._write_batch_size()):
+                texts = [doc.page_content for doc in batch]
+                metadatas = [{**doc.metadata, **upload_metadata} for doc in batch]
+                if chunk_ids is not None:
+                    ids = [chunk_ids.popleft() for _ in texts]
+                else:
+                    ids = [id_generator.next_id(text) for text in texts]
+                
+                # the store is the source of truth for what is already embedded - the manifest
+                # may outlive the vector store
+                stored_metadatas: Dict[str, Dict[str, Any]] = {}
+                if incremental:
+                    with VECTOR_STORE_SECONDS.time(operation="get"):
+                        existing = namespace.collection.get(ids=ids, include=["metadatas"])
+                    stored_metadatas.update(zip(existing['ids'], existing['metadatas']))
+                
+                # recorded before they are written, so a failure midway cannot leave unlisted chunks behind
+                for chunk_id, metadata in zip(ids, metadatas):
+                    current_chunks[chunk_id] = metadata.get("chunk_index", len(current_chunks))
+                
+                new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in stored_metadatas]
+                # unchanged chunks only get their metadata refreshed (eg. a shifted chunk index, new tags or
+                # the time of this upload - all the chunks of a source carry the time it was last uploaded)
+                moved_metadatas = {}
+                for i, chunk_id in enumerate(ids):
+                    if chunk_id not in stored_metadatas:
+                        continue
+                    stored = stored_metadatas[chunk_id] or {}
+                    # chroma merges updated metadata and cannot unset keys - removed tags are set to False
+                    metadata = {
+                        **stored,
+                        **{key: False for key in stored if key.startswith(TAG_PREFIX)},
+                        **metadatas[i]
+                    }
+                    if metadata != stored:
+                        moved_metadatas[chunk_id] = metadata
+                
+                # embed only the new chunks through the same model that embeds the queries
+                if new_positions:
+                    new_texts = [texts[i] for i in new_positions]
+                    new_ids = [ids[i] for i in new_positions]
+                    new_embeddings = self.embed_texts(new_texts)
+                    with VECTOR_STORE_SECONDS.time(operation="upsert"):
+                        namespace.collection.upsert(
+                            ids=new_ids,
+                            embeddings=new_embeddings,
+                            documents=new_texts,
+                            metadatas=[metadatas[i] for i in new_positions]
+                        )
+                    namespace.bm25.add(new_ids, new_texts)
+                if moved_metadatas:
+                    with VECTOR_STORE_SECONDS.time(operation="update"):
+                        namespace.collection.update(
+                            ids=list(moved_metadatas.keys()),
+                            metadatas=list(moved_metadatas.values())
+                        )
+                
+                stats["added"] += len(new_positions)
+                stats["unchanged"] += len(ids) - len(new_positions)
+                stats["updated"] += len(moved_metadatas)
+                if progress_callback is not None:
+                    progress_callback(len(ids))
+        
+        except BaseException:
+            # extraction or embedding failed midway: the manifest keeps both the earlier chunks (still
+            # stored) and the ones written so far, so the next sync of the source deletes the stale ones
+            # instead of leaving them searchable as orphans
+            namespace.manifest.save(source, {**previous_chunks, **current_chunks}, upload_metadata)
+            namespace.bm25.save()
+            if current_chunks:
+                self._notify_change([source])
+            raise
+        
+        # remove the chunks that are no longer part of the source
+        stale_ids = [chunk_id for chunk_id in previous_chunks if chunk_id not in current_chunks]
+        batch_size = self._write_batch_size()
+        for start in range(0, len(stale_ids), batch_size):
+            with VECTOR_STORE_SECONDS.time(operation="delete"):
+                namespace.collection.delete(ids=stale_ids[start:start + batch_size])
+        namespace.bm25.delete(stale_ids)
+        stats["deleted"] = len(stale_ids)
+        
+        namespace.manifest.save(source, current_chunks, upload_metadata)
+        namespace.bm25.save()
+        return stats
+    
+    @staticmethod
+    def _batches(documents: Iterable[LangchainDocument], batch_size: int) -> Iterator[List[LangchainDocument]]:
+        """
+        Group a stream of documents into lists of `batch_size`
+        """
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def search_similar(
+        self,
+        query: str,
+        n_results: int = 5,
+        retrieval_mode: Optional[str] = None,
+        max_distance: Optional[float] = settings.RETRIEVAL_MAX_DISTANCE,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for similar documents to the query
+        
+        `retrieval_mode` is one of:
+            - vector: dense search over the embeddings
+            - bm25: keyword search over the inverted index
+            - hybrid: both rankings fused with reciprocal rank fusion
+        Dense hits farther than `max_distance` (cosine distance) from the query are dropped before
+        fusion - so an unrelated question may get no documents at all. Keyword hits are kept whatever
+        their distance, an exact term match is relevant even when the embedding disagrees
+        Only the chunks of `namespace` that match the `where` metadata filter (see `build_where`)
+        are searched - the filter is pushed down into the vector store query
         """
         query_embedding = self.embeddings.embed_query(query)
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results # returns the top `n` results
-        )
-
-        # only use the top result
+        return self.search_similar_batch(
+            [query], n_results, retrieval_mode, query_embeddings=[query_embedding], max_distance=max_distance,
+            namespace=namespace, where=where
+        )[0]
+    
+    def search_similar_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        retrieval_mode: Optional[str] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        max_distance: Optional[float] = settings.RETRIEVAL_MAX_DISTANCE,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for the documents similar to each of the queries, in order
+        
+        The queries are embedded in one batched pass (unless `query_embeddings` are given) and looked up
+        with a single multi-query call to the vector store; the chunks only found by keyword search are
+        fetched once for the whole batch. Same distance cutoff, namespace and filter as `search_similar`
+        """
+        retrieval_mode = retrieval_mode or settings.RETRIEVAL_MODE
+        if retrieval_mode not in ("vector", "bm25", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+        target = self.get_namespace(namespace)
+        if not queries:
+            return []
+        if query_embeddings is None:
+            query_embeddings = self.embed_texts(queries)
+        
+        n_candidates = n_results if retrieval_mode == "vector" else n_results * max(1, settings.HYBRID_CANDIDATES_FACTOR)
+        
+        # per query: chunk id -> result of the dense search
+        vector_results: List[Dict[str, Dict[str, Any]]] = [{} for _ in queries]
+        if retrieval_mode != "bm25":
+            with VECTOR_STORE_SECONDS.time(operation="query"):
+                results = target.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_candidates, # returns the top `n` results
+                    where=where
+                )
+            for q in range(len(queries)):
+                for i in range(len(results['documents'][q])):
+                    if not self._within_distance(results['distances'][q][i], max_distance):
+                        continue
+                    vector_results[q][results['ids'][q][i]] = {
+                        'id': results['ids'][q][i],
+                        'content': results['documents'][q][i],
+                        'metadata': results['metadatas'][q][i],
+                        'distance': results['distances'][q][i]
+                    }
+            if retrieval_mode == "vector":
+                return [list(by_id.values()) for by_id in vector_results]
+        
+        keyword_rankings = [[chunk_id for chunk_id, _ in target.bm25.search(query, n_candidates)] for query in queries]
+        if where is not None:
+            # the keyword index has no metadata - keep the hits that match the filter
+            allowed = self._matching_ids(target, {chunk_id for ranking in keyword_rankings for chunk_id in ranking}, where)
+            keyword_rankings = [[chunk_id for chunk_id in ranking if chunk_id in allowed] for ranking in keyword_rankings]
+        
+        rankings = []
+        for q, keyword_ids in enumerate(keyword_rankings):
+            if retrieval_mode == "bm25":
+                rankings.append(keyword_ids)
+                continue
+            
+            # the distance cutoff only applies to the dense hits (above) - a keyword hit matched the query terms
+            rankings.append(reciprocal_rank_fusion([list(vector_results[q]), keyword_ids], settings.RRF_K))
+        
+        # keyword-only hits are fetched from the store (once for the batch) to get their content and distance
+        missing_ids = {
+            chunk_id
+            for q, ids in enumerate(rankings)
+            for chunk_id in ids if chunk_id not in vector_results[q]
+        }
+        stored = self._fetch_chunks(target, sorted(missing_ids))
+        
         formatted_results = []
-        for i in range(len(results['documents'][0])):
-            formatted_results.append({
-                'content': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i] if 'distances' in results else None
-            })
+        for q, ids in enumerate(rankings):
+            query_results = []
+            for chunk_id in ids:
+                if len(query_results) == n_results:
+                    break
+                if chunk_id in vector_results[q]:
+                    query_results.append(vector_results[q][chunk_id])
+                elif chunk_id in stored:
+                    document, metadata, embedding = stored[chunk_id]
+                    query_results.append({
+                        'id': chunk_id,
+                        'content': document,
+                        'metadata': metadata,
+                        'distance': self._cosine_distance(query_embeddings[q], embedding)
+                    })
+            formatted_results.append(query_results)
         return formatted_results
     
-    def process_document(self, file_path: str):
+    def _matching_ids(self, namespace: Namespace, ids: Iterable[str], where: Dict[str, Any]) -> set:
+        """
+        The chunks among `ids` that match a `where` filter
+        """
+        ids = list(ids)
+        if not ids:
+            return set()
+        with VECTOR_STORE_SECONDS.time(operation="get"):
+            return set(namespace.collection.get(ids=ids, where=where, include=[])['ids'])
+    
+    def _fetch_chunks(self, namespace: Namespace, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any], List[float]]]:
         """
-        Process a document and add its chunks to the vector store
+        Stored (document, metadata, embedding) of chunks by id
+        """
+        if not ids:
+            return {}
+        with VECTOR_STORE_SECONDS.time(operation="get"):
+            results = namespace.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        return {
+            chunk_id: (document, metadata, embedding)
+            for chunk_id, document, metadata, embedding in zip(
+                results['ids'], results['documents'], results['metadatas'], results['embeddings']
+            )
+        }
+    
+    @staticmethod
+    def _within_distance(distance: Optional[float], max_distance: Optional[float]) -> bool:
+        return max_distance is None or distance is None or distance <= max_distance
+    
+    @staticmethod
+    def _cosine_distance(query_embedding: List[float], embedding: List[float]) -> float:
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norms = (np.linalg.norm(query_vector) * np.linalg.norm(vector)) or 1.0
+        return 1.0 - float(np.dot(query_vector, vector) / norms)
+    
+    def process_document(
+        self,
+        file_path: str,
+        namespace: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Process a document and add its chunks to the vector store (of a namespace)
         """
         from .document_processor import DocumentProcessor
         processor = DocumentProcessor()
 
-        # use concurrency for efficient exectution
-        import asyncio
-        # process file and save chunks
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        documents = loop.run_until_complete(processor.process_file(file_path))
-        loop.run_until_complete(processor.save_processed_document(file_path, documents))
-        # add to the vector store
-        self.add_documents(documents)
+        # process the file, saving and embedding the chunks as they are produced
+        documents = processor.iter_saved_documents(file_path, processor.iter_documents(file_path), namespace=namespace)
+        # add to the vector store, only embedding the chunks that changed
+        return self.add_document_stream(file_path, documents, namespace=namespace, tags=tags)
     
-    def list_documents(self) -> List[Dict[str, Any]]:
+    def list_documents(
+        self,
+        namespace: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Iterable[str] = DOCUMENT_FIELDS
+    ) -> List[Dict[str, Any]]:
         """
-        List all documents in the vector store
+        List a page of the documents in the vector store (of a namespace)
+        `include` picks the fields returned next to the id - leaving out the content keeps
+        large chunks from being read and serialized just to list them
         """
-        results = self.collection.get()
+        include = [field for field in DOCUMENT_FIELDS if field in set(include)]
+        results = self.get_namespace(namespace).collection.get(
+            limit=limit,
+            offset=offset or None,
+            include=[DOCUMENT_FIELDS[field] for field in include]
+        )
         formatted_results = []
-        for i in range(len(results['documents'])):
-            formatted_results.append({
-                'content': results['documents'][i],
-                'metadata': results['metadatas'][i],
-                'id': results['ids'][i]
-            })
+        for i, document_id in enumerate(results['ids']):
+            document = {'id': document_id}
+            for field in include:
+                document[field] = results[DOCUMENT_FIELDS[field]][i]
+            formatted_results.append(document)
         return formatted_results
     
-    def delete_document(self, document_id: str):
+    def count_documents(self, namespace: Optional[str] = None) -> int:
         """
-        Delete a document from the vector store
+        Number of documents in the vector store (of a namespace)
         """
-        self.collection.delete(ids=[document_id]) 
\ No newline at end of file
+        return self.get_namespace(namespace).collection.count()
+    
+    def list_sources(self, namespace: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        List a page of the ingested files (of a namespace) with their number of chunks and upload metadata
+        Served from the chunk manifests, so it never scans the vector store
+        """
+        sources = []
+        for entry in self.get_namespace(namespace).manifest.entries(limit=limit, offset=offset):
+            upload = entry["upload"]
+            sources.append({
+                "source": entry["source"],
+                "filename": upload.get("filename", Path(entry["source"]).name),
+                "chunks": entry["chunks"],
+                "uploaded_at": upload.get("uploaded_at"),
+                "tags": sorted(key[len(TAG_PREFIX):] for key in upload if key.startswith(TAG_PREFIX))
+            })
+        return sources
+    
+    def count_sources(self, namespace: Optional[str] = None) -> int:
+        """
+        Number of ingested files (of a namespace)
+        """
+        return self.get_namespace(namespace).manifest.count()
+    
+    def delete_document(self, document_id: str, namespace: Optional[str] = None):
+        """
+        Delete a document chunk from the vector store (of a namespace)
+        """
+        target = self.get_namespace(namespace)
+        existing = target.collection.get(ids=[document_id], include=["metadatas"])
+        target.collection.delete(ids=[document_id])
+        target.bm25.delete([document_id])
+        # chunks tend to be deleted one by one - their keyword index deletions are saved together
+        target.bm25.save_later()
+        
+        # keep the manifest of the chunk's source in sync
+        sources = []
+        for metadata in existing['metadatas']:
+            source = str((metadata or {}).get("source", ""))
+            sources.append(source)
+            chunks = target.manifest.load(source)
+            if chunks.pop(document_id, None) is not None:
+                # a source without chunks left drops out of the source listing
+                if chunks:
+                    target.manifest.save(source, chunks)
+                else:
+                    target.manifest.delete(source)
+        self._notify_change(sources) 
\ No newline at end of file
@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from intelli_docs.core.config import settings
+from intelli_docs.core.metrics import metrics
+from intelli_docs.services.document_processor import DocumentProcessor
+from intelli_docs.services.embedding_service import EmbeddingService
+
+class IngestionQueueFull(Exception):
+    """
+    Raised when the ingestion queue cannot accept more jobs
+    """
+
+class IngestionJob:
+    """
+    State and progress of the ingestion of one uploaded file
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        namespace: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        upload_path: Optional[str] = None
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.file_path = file_path
+        # uploaded file moved over `file_path` when the job starts (None when it is already in place)
+        self.upload_path = upload_path
+        self.namespace = namespace or settings.DEFAULT_NAMESPACE
+        self.tags = list(tags or [])
+        # one of: queued, extracting, embedding, completed, failed
+        self.stage = "queued"
+        # only known once the whole document was chunked
+        self.chunks_total: Optional[int] = None
+        self.chunks_processed = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, int]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def source_key(self) -> Tuple[str, str]:
+        return self.namespace, os.path.abspath(self.file_path)
+
+    @property
+    def done(self) -> bool:
+        return self.stage in ("completed", "failed")
+
+    def advance(self, n_chunks: int):
+        """
+        Record that `n_chunks` more chunks were embedded (or found unchanged)
+        """
+        self.chunks_processed += n_chunks
+
+    def throughput(self) -> Optional[float]:
+        """
+        Chunks processed per second since the job started
+        """
+        if self.started_at is None:
+            return None
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.chunks_processed / elapsed if elapsed > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": Path(self.file_path).name,
+            "namespace": self.namespace,
+            "tags": self.tags,
+            "stage": self.stage,
+            "chunks_total": self.chunks_total,
+            "chunks_processed": self.chunks_processed,
+            "throughput_chunks_per_second": self.throughput(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+class IngestionQueue:
+    """
+    Runs document ingestion (streamed extraction, chunking, saving and embedding) in the background
+
+    Jobs are executed by a bounded pool of `max_workers` threads. At most `max_pending` jobs may
+    wait for a worker - beyond that `submit` raises `IngestionQueueFull` so that the caller can
+    push back on the client instead of queueing unbounded work.
+    Jobs of the same file (and namespace) run one after the other, in the order they were submitted:
+    a re-upload waits behind the job still reading the previous version of the file.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        max_workers: int = settings.INGESTION_MAX_WORKERS,
+        max_pending: int = settings.INGESTION_QUEUE_SIZE,
+        history_size: int = settings.INGESTION_JOB_HISTORY
+    ):
+        self.embedding_service = embedding_service
+        self.document_processor = DocumentProcessor()
+        self.history_size = history_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        # one slot per running or waiting job
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        # jobs of every file with a job in progress - the first one is running (or about to)
+        self._sources: Dict[Tuple[str, str], Deque[IngestionJob]] = {}
+        self._lock = threading.Lock()
+        metrics.gauge("ingestion_queue_depth", "Ingestion jobs waiting for a worker").set_function(
+            lambda: {(): self.queue_depth()}
+        )
+
+    def submit(
+        self,
+        file_path: str,
+        namespace: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        upload_path: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Queue the ingestion of a file (into a namespace, with tags) and return its job right away
+        `upload_path` is a newly uploaded version of the file, only moved into place once the
+        earlier jobs of the file are done
+        """
+        if not self._slots.acquire(blocking=False):
+            raise IngestionQueueFull("Too many documents are being ingested, retry later")
+        job = IngestionJob(file_path, namespace, tags, upload_path)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+            pending = self._sources.setdefault(job.source_key, deque())
+            pending.append(job)
+            start = len(pending) == 1
+        if start:
+            try:
+                self.executor.submit(self._run, job)
+            except RuntimeError:
+                with self._lock:
+                    del self._sources[job.source_key]
+                self._slots.release()
+                raise
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        """
+        Number of jobs that are waiting for a worker
+        """
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.stage == "queued")
+
+    def _prune(self):
+        """
+        Forget the oldest finished jobs beyond the history size
+        """
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestionJob):
+        job.started_at = time.time()
+        try:
+            if job.upload_path is not None:
+                os.replace(job.upload_path, job.file_path)
+            job.stage = "extracting"
+            # extraction, chunking, saving and embedding are streamed - the job moves to the
+            # embedding stage as soon as the first slice of chunks is ready
+            documents = self.document_processor.iter_saved_documents(
+                job.file_path,
+                self.document_processor.iter_documents(job.file_path),
+                namespace=job.namespace
+            )
+            
+            def advance(n_chunks: int):
+                job.stage = "embedding"
+                job.advance(n_chunks)
+            
+            job.result = self.embedding_service.add_document_stream(
+                job.file_path,
+                documents,
+                progress_callback=advance,
+                namespace=job.namespace,
+                tags=job.tags
+            )
+            job.chunks_total = job.chunks_processed
+            job.stage = "completed"
+        except Exception as e:
+            print(f"Error ingesting {job.file_path}: {str(e)}\n{traceback.format_exc()}")
+            job.error = str(e)
+            job.stage = "failed"
+        finally:
+            if job.upload_path is not None and os.path.exists(job.upload_path):
+                # the upload never made it into place
+                os.remove(job.upload_path)
+            job.finished_at = time.time()
+            self._slots.release()
+            self._start_next(job)
+
+    def _start_next(self, job: IngestionJob):
+        """
+        Start the next job waiting on the file of a finished job
+        """
+        with self._lock:
+            pending = self._sources[job.source_key]
+            pending.popleft()
+            if not pending:
+                del self._sources[job.source_key]
+                return
+            next_job = pending[0]
+        try:
+            self.executor.submit(self._run, next_job)
+        except RuntimeError:
+            # shutting down: the waiting jobs of the file are dropped
+            with self._lock:
+                dropped = self._sources.pop(job.source_key, deque())
+            for dropped_job in dropped:
+                dropped_job.error = "Ingestion queue shut down"
+                dropped_job.stage = "failed"
+                self._slots.release()
+                if dropped_job.upload_path is not None and os.path.exists(dropped_job.upload_path):
+                    os.remove(dropped_job.upload_path)
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait)
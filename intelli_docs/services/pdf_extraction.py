@@ -0,0 +1,14 @@
+from typing import List
+import PyPDF2
+
+# Kept apart from the document processor so that the spawned worker processes of the PDF pool
+# only import this module and PyPDF2 - provided the server was not started as the __main__ of a
+# module importing the app (see intelli_docs/__main__.py)
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Extract the text of the pages [start, end) of a PDF file
+    """
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
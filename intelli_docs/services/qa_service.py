@@ -1,30 +1,69 @@
+import asyncio
+import functools
+import json
+import threading
 import traceback
-from typing import List, Dict, Any
-from langchain.llms import Ollama
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from intelli_docs.core.config import settings
-from intelli_docs.core.mcp import MCPPipeline, DOCUMENT_ANALYSIS_STEP, ANSWER_GENERATION_STEP
+from intelli_docs.core.llm_scheduler import BATCH, LLMOverloaded, ScheduledLLM, ScheduledOllamaClient, llm_priority
+from intelli_docs.core.mcp import MCPPipeline, DOCUMENT_ANALYSIS_STEP, ANSWER_GENERATION_STEP, COMBINED_ANALYSIS_STEP
+from intelli_docs.core.metrics import metrics, LLM_GENERATION_SECONDS, QA_ERRORS
+from intelli_docs.core.registry import registry
 from intelli_docs.services.embedding_service import EmbeddingService
+from intelli_docs.services.answer_cache import AnswerCache
+from intelli_docs.services.context_builder import ContextBuilder
 
 class QAService:
     """
     Handles question answering using Model Context Protocl (MCP) and Retrieval Augmented Generation (RAG)
     """
     
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
+    def __init__(self, embedding_service: Optional[EmbeddingService] = None):
+        # share the caller's embedding service (and its collection) when given
+        self.embedding_service = embedding_service if embedding_service is not None else EmbeddingService()
         
-        # init Ollama without any custom callbacks
-        self.llm = Ollama(model=settings.OLLAMA_MODEL)
+        # the LLM clients are shared process-wide through the registry - the async client
+        # holds the one pooled set of HTTP connections to Ollama, and the calls of both
+        # clients wait for a slot of the LLM scheduler
+        self.llm = ScheduledLLM(llm=registry.get_llm(settings.OLLAMA_MODEL))
+        self.ollama_client = ScheduledOllamaClient(registry.get_ollama_client(settings.OLLAMA_MODEL))
+        
+        # bounded pool for the blocking retrieval calls of the async path
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=settings.RETRIEVAL_MAX_WORKERS,
+            thread_name_prefix="retrieval"
+        )
+        # runs the MCP pipeline of synchronous requests next to their QA chain
+        self.pipeline_executor = ThreadPoolExecutor(
+            max_workers=settings.PIPELINE_MAX_WORKERS,
+            thread_name_prefix="qa-pipeline"
+        )
+        
+        # packs the retrieved chunks into the prompts' context
+        self.context_builder = ContextBuilder()
         
         # setup the MCP piepline for usage
-        self.mcp_pipeline = MCPPipeline(model_name=settings.OLLAMA_MODEL)
+        self.mcp_pipeline = MCPPipeline(
+            model_name=settings.OLLAMA_MODEL,
+            client=self.ollama_client,
+            llm=self.llm
+        )
         
         # Add the MCP steps for doc analysis and answer gen
         self.mcp_pipeline.add_step(DOCUMENT_ANALYSIS_STEP)
         self.mcp_pipeline.add_step(ANSWER_GENERATION_STEP)
         
+        # "cheap" mode: one structured call returns the analysis and the answer together
+        self.cheap_pipeline = MCPPipeline(
+            model_name=settings.OLLAMA_MODEL,
+            client=self.ollama_client,
+            llm=self.llm
+        )
+        self.cheap_pipeline.add_step(COMBINED_ANALYSIS_STEP)
+        
         # Create QA chain
         self.qa_prompt = PromptTemplate(
             template="""
@@ -40,98 +79,739 @@ class QAService:
             input_variables=["context", "question"]
         )
         self.qa_chain = LLMChain(llm=self.llm, prompt=self.qa_prompt)
+        
+        # answers of repeated (or near identical) questions are served from the cache
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+            )
+            # drop the cached answers of a document as soon as it is re-ingested or deleted
+            self.embedding_service.add_change_listener(self.answer_cache.invalidate_sources)
+        
+        # questions answered without any LLM call because no document passed the distance cutoff
+        self._counters_lock = threading.Lock()
+        self.early_exits = 0
+        self.llm_calls_avoided = 0
+        
+        # single-flight: identical questions asked while one is being answered share its answer
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._inflight_sync: Dict[Tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.coalesced_requests = 0
+        
+        metrics.counter_function(
+            "answer_cache_lookups_total", "Lookups in the answer cache by result", self._cache_lookups, ["result"]
+        )
+        metrics.counter_function(
+            "qa_coalesced_requests_total", "Questions answered by joining an identical question in flight",
+            lambda: {(): self.coalescing_stats()["coalesced_requests"]}
+        )
+        metrics.counter_function(
+            "qa_early_exits_total", "Questions answered without the LLM (no relevant document)",
+            lambda: {(): self.retrieval_stats()["early_exits"]}
+        )
     
-    def answer_question(self, question: str, n_context_docs: int = 3) -> Dict[str, Any]:
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Hit / miss counters of the answer cache
+        """
+        if self.answer_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.answer_cache.stats()}
+    
+    def _cache_lookups(self) -> Dict[Tuple[str, ...], int]:
+        stats = self.cache_stats()
+        if not stats["enabled"]:
+            return {}
+        return {("exact_hit",): stats["exact_hits"], ("semantic_hit",): stats["semantic_hits"], ("miss",): stats["misses"]}
+    
+    def retrieval_stats(self) -> Dict[str, Any]:
+        """
+        Counters of the questions that exited early (no relevant document, so no LLM call)
+        """
+        with self._counters_lock:
+            return {
+                "max_distance": settings.RETRIEVAL_MAX_DISTANCE,
+                "early_exits": self.early_exits,
+                "llm_calls_avoided": self.llm_calls_avoided
+            }
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """
+        Counters of the requests that joined an identical question being answered
+        """
+        with self._inflight_lock:
+            return {
+                "enabled": settings.REQUEST_COALESCING_ENABLED,
+                "in_flight": len(self._inflight) + len(self._inflight_sync),
+                "coalesced_requests": self.coalesced_requests
+            }
+    
+    def _coalescing_key(
+        self,
+        question: str,
+        n_context_docs: int,
+        retrieval_mode: Optional[str],
+        pipeline_mode: Optional[str],
+        namespace: Optional[str],
+        where: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple]:
+        """
+        Key of the requests that get the same answer: the normalized question and the cache scope
+        (None when coalescing is disabled or the request is invalid - it then fails on its own)
+        """
+        if not settings.REQUEST_COALESCING_ENABLED:
+            return None
+        try:
+            retrieval_mode, pipeline_mode = self._resolve_modes(retrieval_mode, pipeline_mode)
+        except ValueError:
+            return None
+        return (AnswerCache.normalize(question), self._cache_scope(n_context_docs, retrieval_mode, pipeline_mode, namespace, where))
+    
+    def _early_exit(self, pipeline_mode: str) -> Dict[str, Any]:
+        """
+        Canned response for a question without relevant documents, counting the LLM calls it saved
+        """
+        if pipeline_mode == "cheap":
+            llm_calls = len(self.cheap_pipeline.steps)
+        else:
+            llm_calls = len(self.mcp_pipeline.steps) + 1  # + the QA chain
+        with self._counters_lock:
+            self.early_exits += 1
+            self.llm_calls_avoided += llm_calls
+        return self._no_documents_response()
+    
+    @staticmethod
+    def _format_sources(relevant_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Format the retrieved documents as response sources
+        """
+        return [
+            {
+                "content": doc['content'],
+                "metadata": doc['metadata'],
+                "relevance_score": 1 - (doc['distance'] if doc['distance'] is not None else 0)
+            }
+            for doc in relevant_docs
+        ]
+    
+    @staticmethod
+    def _no_documents_response() -> Dict[str, Any]:
+        """
+        Canned response when no document is relevant to the question
+        """
+        return {
+            "answer": "No relevant documents found to answer your question.",
+            "sources": [],
+            "analysis": {
+                "document_analysis": {
+                    "key_points": ["No relevant documents found"],
+                    "relevance_score": 0.0
+                },
+                "answer_generation": {
+                    "answer": "No relevant documents found",
+                    "confidence": 0.0,
+                    "sources": ""
+                }
+            }
+        }
+    
+    @staticmethod
+    def _error_response(error_source: str, error: Exception, sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Response returned when answering the question failed
+        """
+        error_msg = f"Error in {error_source}: {str(error)}\n{traceback.format_exc()}"
+        print(error_msg)
+        QA_ERRORS.inc(stage=error_source)
+        return {
+            "answer": f"An error occurred while processing your question: {str(error)}",
+            "sources": sources,
+            "analysis": {
+                "document_analysis": {
+                    "key_points": [f"Error in {error_source}: {str(error)}"],
+                    "relevance_score": 0.0
+                },
+                "answer_generation": {
+                    "answer": f"Error in {error_source}: {str(error)}",
+                    "confidence": 0.0,
+                    "sources": ""
+                }
+            }
+        }
+    
+    @staticmethod
+    def _resolve_modes(retrieval_mode: Optional[str], pipeline_mode: Optional[str]) -> Tuple[str, str]:
+        """
+        Retrieval and pipeline modes of a request, defaulting to the settings
+        """
+        pipeline_mode = pipeline_mode or settings.PIPELINE_MODE
+        if pipeline_mode not in ("full", "cheap"):
+            raise ValueError(f"Unknown pipeline mode: {pipeline_mode}")
+        return retrieval_mode or settings.RETRIEVAL_MODE, pipeline_mode
+    
+    @staticmethod
+    def _cache_scope(
+        n_context_docs: int,
+        retrieval_mode: str,
+        pipeline_mode: str,
+        namespace: Optional[str],
+        where: Optional[Dict[str, Any]]
+    ) -> Tuple:
+        """
+        The request parameters a cached answer is only valid for
+        """
+        return (
+            n_context_docs,
+            retrieval_mode,
+            pipeline_mode,
+            namespace or settings.DEFAULT_NAMESPACE,
+            json.dumps(where, sort_keys=True) if where else None
+        )
+    
+    def _cache_lookup(
+        self,
+        question: str,
+        cache_scope: Tuple,
+        question_embedding: Optional[List[float]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Cached response of a question (if any) and the question embedding computed for the lookup
+        An already computed `question_embedding` is used as is
+        """
+        if self.answer_cache is None:
+            return None, question_embedding
+        embed = self.embedding_service.embeddings.embed_query
+        if question_embedding is not None:
+            embed = lambda _: question_embedding
+        return self.answer_cache.get(question, scope=cache_scope, embed=embed)
+    
+    def _cache_generation(self) -> Optional[int]:
+        """
+        Invalidation generation of the answer cache, read before retrieving the documents of an answer
+        """
+        return self.answer_cache.generation if self.answer_cache is not None else None
+    
+    @staticmethod
+    def _combined_answer(mcp_result: Dict[str, Any]) -> str:
+        """
+        Answer of the cheap pipeline - its single step failing means there is no answer, so this raises
+        instead of passing the error message on as one
+        """
+        errors = mcp_result.get("step_errors")
+        if errors:
+            raise RuntimeError("; ".join(f"{step}: {error}" for step, error in errors.items()))
+        return mcp_result["answer_generation"]["answer"]
+    
+    def _cache_store(
+        self,
+        question: str,
+        cache_scope: Tuple,
+        question_embedding: Optional[List[float]],
+        response: Dict[str, Any],
+        relevant_docs: List[Dict[str, Any]],
+        cache_generation: Optional[int]
+    ):
+        """
+        Cache a response along with the documents it was answered from
+        Responses with a failed MCP step are not cached, so the failure is not served again, nor
+        responses whose documents changed since `cache_generation`
+        """
+        if self.answer_cache is None or question_embedding is None:
+            return
+        if response["analysis"].get("step_errors"):
+            return
+        self.answer_cache.put(
+            question,
+            scope=cache_scope,
+            embedding=question_embedding,
+            response=response,
+            sources=[str(doc['metadata'].get("source", "")) for doc in relevant_docs],
+            generation=cache_generation
+        )
+    
+    def answer_question(
+        self,
+        question: str,
+        n_context_docs: int = 3,
+        retrieval_mode: Optional[str] = None,
+        pipeline_mode: Optional[str] = None,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Answer a question using RAG and MCP
+        `retrieval_mode` (vector, bm25 or hybrid) defaults to `settings.RETRIEVAL_MODE`
+        `pipeline_mode` defaults to `settings.PIPELINE_MODE`:
+            - full: the two MCP steps plus the QA chain (3 LLM calls)
+            - cheap: a single structured call returning the analysis and the answer
+        Only the documents of `namespace` matching the `where` metadata filter are searched
+        Concurrent calls with the same question and parameters wait for the first one's answer
+        Raises `LLMOverloaded` when the LLM scheduler sheds the request
         """
+        args = (question, n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+        key = self._coalescing_key(*args)
+        if key is None:
+            return self._answer_question(*args)
+        
+        with self._inflight_lock:
+            future = self._inflight_sync.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight_sync[key] = Future()
+            else:
+                self.coalesced_requests += 1
+        if not leader:
+            return future.result()
+        
+        try:
+            response = self._answer_question(*args)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight_sync[key]
+    
+    def _answer_question(
+        self,
+        question: str,
+        n_context_docs: int,
+        retrieval_mode: Optional[str],
+        pipeline_mode: Optional[str],
+        namespace: Optional[str],
+        where: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         error_source = "QA service"
         sources = []
         try:
+            # Serve repeated questions from the answer cache
+            retrieval_mode, pipeline_mode = self._resolve_modes(retrieval_mode, pipeline_mode)
+            cache_scope = self._cache_scope(n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+            cache_generation = self._cache_generation()
+            cached_response, question_embedding = self._cache_lookup(question, cache_scope)
+            if cached_response is not None:
+                return cached_response
+            
             # Search for relevant documents
             relevant_docs = self.embedding_service.search_similar(
                 query=question,
-                n_results=n_context_docs
+                n_results=n_context_docs,
+                retrieval_mode=retrieval_mode,
+                namespace=namespace,
+                where=where
             )
             
+            # nothing passed the distance cutoff - answer without calling the LLM
             if not relevant_docs:
-                return {
-                    "answer": "No relevant documents found to answer your question.",
-                    "sources": [],
-                    "analysis": {
-                        "document_analysis": {
-                            "key_points": ["No relevant documents found"],
-                            "relevance_score": 0.0
-                        },
-                        "answer_generation": {
-                            "answer": "No relevant documents found",
-                            "confidence": 0.0,
-                            "sources": ""
-                        }
-                    }
-                }
+                return self._early_exit(pipeline_mode)
             
-            # Prepare context from relevant documents
-            context = "\n\n".join([doc['content'] for doc in relevant_docs])
+            # Prepare context from relevant documents - overlaps merged, trimmed to the token budget
+            context = self.context_builder.build(relevant_docs)
             
             try:
-                # Execute MCP pipeline
-                mcp_result = self.mcp_pipeline.execute({
-                    "document_content": context,
-                    "query": question
-                })
-                
-                # Generate final answer using QA chain
-                answer = self.qa_chain.run(
-                    context=context,
-                    question=question
-                )
+                if pipeline_mode == "cheap":
+                    # the answer comes out of the single MCP call
+                    with LLM_GENERATION_SECONDS.time(pipeline_mode="cheap"):
+                        mcp_result = self.cheap_pipeline.execute({
+                            "document_content": context,
+                            "query": question
+                        })
+                    answer = self._combined_answer(mcp_result)
+                else:
+                    # Execute MCP pipeline in the background - the final answer does not depend on it
+                    mcp_future = self.pipeline_executor.submit(self.mcp_pipeline.execute, {
+                        "document_content": context,
+                        "query": question
+                    })
+                    
+                    try:
+                        # Generate final answer using QA chain
+                        with LLM_GENERATION_SECONDS.time(pipeline_mode="full"):
+                            answer = self.qa_chain.run(
+                                context=context,
+                                question=question
+                            )
+                        mcp_result = mcp_future.result()
+                    finally:
+                        # the answer failed (or was shed): the analysis is not needed if it has not started yet
+                        mcp_future.cancel()
                 
                 # Prepare response
                 response = {
                     "answer": answer,
-                    "sources": [
-                        {
-                            "content": doc['content'],
-                            "metadata": doc['metadata'],
-                            "relevance_score": 1 - (doc['distance'] if doc['distance'] is not None else 0)
-                        }
-                        for doc in relevant_docs
-                    ],
+                    "sources": self._format_sources(relevant_docs),
                     "analysis": mcp_result
                 }
                 
+                self._cache_store(question, cache_scope, question_embedding, response, relevant_docs, cache_generation)
                 return response
                 
             except Exception as e:
                 error_source = "MCP pipeline"
-                sources = [
-                    {
-                        "content": doc['content'],
-                        "metadata": doc['metadata'],
-                        "relevance_score": 1 - (doc['distance'] if doc['distance'] is not None else 0)
-                    }
-                    for doc in relevant_docs
-                ]
+                sources = self._format_sources(relevant_docs)
                 raise e
+        except LLMOverloaded:
+            # shed by the scheduler: let the caller reject the request
+            raise
         except Exception as e:
-            error_msg = f"Error in {error_source}: {str(e)}\n{traceback.format_exc()}"
-            print(error_msg)
-            return {
-                "answer": f"An error occurred while processing your question: {str(e)}",
-                "sources": sources,
-                "analysis": {
-                    "document_analysis": {
-                        "key_points": [f"Error in {error_source}: {str(e)}"],
-                        "relevance_score": 0.0
-                    },
-                    "answer_generation": {
-                        "answer": f"Error in {error_source}: {str(e)}",
-                        "confidence": 0.0,
-                        "sources": ""
-                    }
-                }
+            return self._error_response(error_source, e, sources)
+    
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking call (embedding, vector store) on the bounded retrieval pool
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.retrieval_executor, functools.partial(func, *args, **kwargs))
+    
+    async def aanswer_question(
+        self,
+        question: str,
+        n_context_docs: int = 3,
+        retrieval_mode: Optional[str] = None,
+        pipeline_mode: Optional[str] = None,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a question using RAG and MCP without blocking the event loop
+        Concurrent requests with the same question and parameters share one computation, which
+        keeps running for the others if the request that started it is cancelled
+        """
+        args = (question, n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+        key = self._coalescing_key(*args)
+        if key is None:
+            return await self._aanswer_question(*args)
+        
+        with self._inflight_lock:
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._aanswer_question(*args))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._forget_inflight(key))
+            else:
+                self.coalesced_requests += 1
+        return await asyncio.shield(task)
+    
+    def _forget_inflight(self, key: Tuple):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+    
+    async def _aanswer_question(
+        self,
+        question: str,
+        n_context_docs: int,
+        retrieval_mode: Optional[str],
+        pipeline_mode: Optional[str],
+        namespace: Optional[str],
+        where: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        try:
+            retrieval_mode, pipeline_mode = self._resolve_modes(retrieval_mode, pipeline_mode)
+            cache_scope = self._cache_scope(n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+            cache_generation = self._cache_generation()
+            cached_response, question_embedding = await self._run_blocking(self._cache_lookup, question, cache_scope)
+            if cached_response is not None:
+                return cached_response
+            
+            relevant_docs = await self._run_blocking(
+                self.embedding_service.search_similar,
+                query=question,
+                n_results=n_context_docs,
+                retrieval_mode=retrieval_mode,
+                namespace=namespace,
+                where=where
+            )
+        except Exception as e:
+            return self._error_response("QA service", e, [])
+        
+        return await self._agenerate_response(
+            question, relevant_docs, cache_scope, question_embedding, pipeline_mode, cache_generation
+        )
+    
+    async def _agenerate_response(
+        self,
+        question: str,
+        relevant_docs: List[Dict[str, Any]],
+        cache_scope: Tuple,
+        question_embedding: Optional[List[float]],
+        pipeline_mode: str,
+        cache_generation: Optional[int]
+    ) -> Dict[str, Any]:
+        """
+        Answer a question from its retrieved documents and cache the response
+        """
+        if not relevant_docs:
+            return self._early_exit(pipeline_mode)
+        
+        try:
+            context = self.context_builder.build(relevant_docs)
+            
+            if pipeline_mode == "cheap":
+                with LLM_GENERATION_SECONDS.time(pipeline_mode="cheap"):
+                    mcp_result = await self.cheap_pipeline.aexecute({
+                        "document_content": context,
+                        "query": question
+                    })
+                answer = self._combined_answer(mcp_result)
+            else:
+                # the MCP pipeline and the final answer are independent, so they run concurrently
+                tasks = [
+                    asyncio.ensure_future(self.mcp_pipeline.aexecute({
+                        "document_content": context,
+                        "query": question
+                    })),
+                    asyncio.ensure_future(self._agenerate_answer(context, question))
+                ]
+                try:
+                    mcp_result, answer = await asyncio.gather(*tasks)
+                finally:
+                    # if one of them failed (or was shed) the other one is not needed anymore
+                    for task in tasks:
+                        if not task.done():
+                            task.cancel()
+            
+            response = {
+                "answer": answer,
+                "sources": self._format_sources(relevant_docs),
+                "analysis": mcp_result
             }
+            
+            self._cache_store(question, cache_scope, question_embedding, response, relevant_docs, cache_generation)
+            return response
+        except LLMOverloaded:
+            # shed by the scheduler: let the caller reject the request
+            raise
+        except Exception as e:
+            return self._error_response("MCP pipeline", e, self._format_sources(relevant_docs))
+    
+    async def _agenerate_answer(self, context: str, question: str) -> str:
+        """
+        Final answer of the QA prompt
+        """
+        with LLM_GENERATION_SECONDS.time(pipeline_mode="full"):
+            return await self.ollama_client.generate(self.qa_prompt.format(context=context, question=question))
+    
+    def _retrieve_batch(
+        self,
+        questions: List[str],
+        cache_scope: Tuple,
+        n_context_docs: int,
+        retrieval_mode: Optional[str],
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Optional[Dict[str, Any]]], List[List[Dict[str, Any]]], List[List[float]]]:
+        """
+        Cached responses, retrieved documents and embeddings of a batch of questions
+        The questions are embedded in one pass and the uncached ones are looked up with a single query
+        """
+        question_embeddings = self.embedding_service.embed_texts(questions)
+        cached_responses = [
+            self._cache_lookup(question, cache_scope, embedding)[0]
+            for question, embedding in zip(questions, question_embeddings)
+        ]
+        
+        uncached = [i for i, response in enumerate(cached_responses) if response is None]
+        relevant_docs: List[List[Dict[str, Any]]] = [[] for _ in questions]
+        results = self.embedding_service.search_similar_batch(
+            [questions[i] for i in uncached],
+            n_results=n_context_docs,
+            retrieval_mode=retrieval_mode,
+            query_embeddings=[question_embeddings[i] for i in uncached],
+            namespace=namespace,
+            where=where
+        )
+        for i, docs in zip(uncached, results):
+            relevant_docs[i] = docs
+        return cached_responses, relevant_docs, question_embeddings
+    
+    async def aanswer_batch(
+        self,
+        questions: List[str],
+        n_context_docs: int = 3,
+        retrieval_mode: Optional[str] = None,
+        pipeline_mode: Optional[str] = None,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        concurrency: int = settings.BATCH_LLM_CONCURRENCY
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Answer a batch of questions, yielding (index of the question, response) as the answers finish
+        
+        Retrieval is done once for the whole batch, repeated questions are answered once and at most
+        `concurrency` questions are generated by the LLM at the same time. Questions shed by the LLM
+        scheduler are retried until LLM_BATCH_QUEUE_TIMEOUT_SECONDS after the batch started
+        """
+        # indexes of the questions by their normalized text
+        groups: Dict[str, List[int]] = {}
+        for i, question in enumerate(questions):
+            groups.setdefault(AnswerCache.normalize(question), []).append(i)
+        indexes = list(groups.values())
+        unique_questions = [questions[group[0]] for group in indexes]
+        
+        try:
+            retrieval_mode, pipeline_mode = self._resolve_modes(retrieval_mode, pipeline_mode)
+            cache_scope = self._cache_scope(n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+            cache_generation = self._cache_generation()
+            cached_responses, relevant_docs, question_embeddings = await self._run_blocking(
+                self._retrieve_batch, unique_questions, cache_scope, n_context_docs, retrieval_mode, namespace, where
+            )
+        except Exception as e:
+            response = self._error_response("QA service", e, [])
+            for i in range(len(questions)):
+                yield i, response
+            return
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LLM_BATCH_QUEUE_TIMEOUT_SECONDS
+        
+        async def answer(q: int) -> Tuple[int, Dict[str, Any]]:
+            if cached_responses[q] is not None:
+                return q, cached_responses[q]
+            # batch questions queue behind the interactive ones (this task's copy of the context)
+            llm_priority.set(BATCH)
+            async with semaphore:
+                while True:
+                    try:
+                        return q, await self._agenerate_response(
+                            unique_questions[q], relevant_docs[q], cache_scope, question_embeddings[q], pipeline_mode,
+                            cache_generation
+                        )
+                    except LLMOverloaded as e:
+                        # evicted by (or turned away for) interactive calls: the batch waits for its
+                        # deadline rather than failing while the interactive load lasts
+                        delay = min(e.retry_after, deadline - loop.time())
+                        if delay <= 0:
+                            return q, self._error_response("LLM scheduler", e, self._format_sources(relevant_docs[q]))
+                        await asyncio.sleep(delay)
+        
+        tasks = [asyncio.create_task(answer(q)) for q in range(len(unique_questions))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                q, response = await next_done
+                for i in indexes[q]:
+                    yield i, response
+        finally:
+            # the client may have gone away before the whole batch was answered
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def astream_answer(
+        self,
+        question: str,
+        n_context_docs: int = 3,
+        retrieval_mode: Optional[str] = None,
+        pipeline_mode: Optional[str] = None,
+        namespace: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Answer a question as a stream of (event, data) pairs:
+            - "sources": the retrieved sources, as soon as retrieval is done
+            - "token": the pieces of the answer as the LLM produces them
+            - "analysis": the MCP analysis, once the answer is complete
+            - "error": if answering failed midway
+        The MCP pipeline runs concurrently while the answer is streamed - in the cheap pipeline mode the
+        answer only exists once the single structured call is done, so it comes as one "token" event
+        """
+        error_source = "QA service"
+        mcp_task = None
+        try:
+            retrieval_mode, pipeline_mode = self._resolve_modes(retrieval_mode, pipeline_mode)
+            cache_scope = self._cache_scope(n_context_docs, retrieval_mode, pipeline_mode, namespace, where)
+            cache_generation = self._cache_generation()
+            cached_response, question_embedding = await self._run_blocking(self._cache_lookup, question, cache_scope)
+            if cached_response is not None:
+                yield "sources", cached_response["sources"]
+                yield "token", cached_response["answer"]
+                yield "analysis", cached_response["analysis"]
+                return
+            
+            relevant_docs = await self._run_blocking(
+                self.embedding_service.search_similar,
+                query=question,
+                n_results=n_context_docs,
+                retrieval_mode=retrieval_mode,
+                namespace=namespace,
+                where=where
+            )
+            
+            if not relevant_docs:
+                response = self._early_exit(pipeline_mode)
+                yield "sources", response["sources"]
+                yield "token", response["answer"]
+                yield "analysis", response["analysis"]
+                return
+            
+            sources = self._format_sources(relevant_docs)
+            yield "sources", sources
+            
+            context = self.context_builder.build(relevant_docs)
+            
+            error_source = "MCP pipeline"
+            if pipeline_mode == "cheap":
+                with LLM_GENERATION_SECONDS.time(pipeline_mode="cheap"):
+                    mcp_result = await self.cheap_pipeline.aexecute({
+                        "document_content": context,
+                        "query": question
+                    })
+                answer = self._combined_answer(mcp_result)
+                yield "token", answer
+                yield "analysis", mcp_result
+                self._cache_store(question, cache_scope, question_embedding, {
+                    "answer": answer,
+                    "sources": sources,
+                    "analysis": mcp_result
+                }, relevant_docs, cache_generation)
+                return
+            
+            mcp_task = asyncio.create_task(self.mcp_pipeline.aexecute({
+                "document_content": context,
+                "query": question
+            }))
+            
+            # stream the answer of the QA prompt token by token
+            answer_parts = []
+            with LLM_GENERATION_SECONDS.time(pipeline_mode="full"):
+                async for token in self.ollama_client.stream(self.qa_prompt.format(context=context, question=question)):
+                    answer_parts.append(token)
+                    yield "token", token
+            
+            mcp_result = await mcp_task
+            yield "analysis", mcp_result
+            
+            self._cache_store(question, cache_scope, question_embedding, {
+                "answer": "".join(answer_parts),
+                "sources": sources,
+                "analysis": mcp_result
+            }, relevant_docs, cache_generation)
+        except LLMOverloaded as e:
+            QA_ERRORS.inc(stage="LLM scheduler")
+            yield "error", {"detail": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"Error in {error_source}: {str(e)}\n{traceback.format_exc()}")
+            QA_ERRORS.inc(stage=error_source)
+            yield "error", {"detail": f"Error in {error_source}: {str(e)}"}
+        finally:
+            # the client may have gone away before the analysis was needed
+            if mcp_task is not None and not mcp_task.done():
+                mcp_task.cancel()
+    
+    def close(self):
+        """
+        Release the retrieval and pipeline threads - the shared Ollama connections are released by the registry
+        """
+        self.retrieval_executor.shutdown(wait=False)
+        self.pipeline_executor.shutdown(wait=False)
+        self.mcp_pipeline.close()
+        self.cheap_pipeline.close()
     
     def get_answer_with_sources(self, question: str) -> Dict[str, Any]:
         """
@@ -144,7 +824,7 @@ class QAService:
         )
         
         # prepare the context
-        context = "\n\n".join([doc['content'] for doc in relevant_docs])
+        context = self.context_builder.build(relevant_docs)
         
         # gen. answer
         answer = self.qa_chain.run(
@@ -154,12 +834,5 @@ class QAService:
         
         return {
             "answer": answer,
-            "sources": [
-                {
-                    "content": doc['content'],
-                    "metadata": doc['metadata'],
-                    "relevance_score": 1 - (doc['distance'] if doc['distance'] is not None else 0)
-                }
-                for doc in relevant_docs
-            ]
+            "sources": self._format_sources(relevant_docs)
         } 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import re
+from collections import deque
+from typing import List, Optional
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+class _Merge:
+    """
+    `TextSplitter._merge_splits` fed one split at a time (the separators are kept in the splits)
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.current: deque = deque()
+        self.total = 0
+
+    def add(self, split: str) -> List[str]:
+        chunks = []
+        length = len(split)
+        if self.total + length > self.chunk_size and self.current:
+            chunks.extend(self.flush(keep_overlap=True, next_length=length))
+        self.current.append(split)
+        self.total += length
+        return chunks
+
+    def flush(self, keep_overlap: bool = False, next_length: int = 0) -> List[str]:
+        chunk = "".join(self.current).strip()
+        if keep_overlap:
+            # the splits at the end of the chunk start the next one
+            while self.total > self.chunk_overlap or (self.total + next_length > self.chunk_size and self.total > 0):
+                self.total -= len(self.current.popleft())
+        else:
+            self.current.clear()
+            self.total = 0
+        return [chunk] if chunk else []
+
+class _Level:
+    """
+    `RecursiveCharacterTextSplitter._split_text` of one piece of text, fed as it arrives
+
+    The piece is split on the first of the separators it contains - as only a prefix of the piece is
+    known, that is the first one seen so far, and the level moves up to a better separator when one
+    shows up: everything before it becomes the first split of the piece, which is split exactly as
+    the level did so far when it is too long to be merged (and was not merged yet when it is not).
+    Splits too long to be merged are split the same way by a child level over the next separators.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: List[str]):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators
+        # index of the separator the piece is split on - the last one ("") until another one is seen
+        self.k = len(separators) - 1
+        self.merge = _Merge(chunk_size, chunk_overlap)
+        # text of the current split while it is short enough to be merged
+        self.split = ""
+        # level splitting the current split once it is too long to be merged
+        self.child: Optional["_Level"] = None
+        # text of the piece so far, until it is too long to be a single merged split
+        self.head: Optional[str] = ""
+        # text not processed yet: the end of it may be the start of a separator
+        self.pending = ""
+        self._compile()
+
+    def _compile(self):
+        candidates = [separator for separator in self.separators[:self.k + 1] if separator]
+        self._pattern = re.compile("|".join(re.escape(separator) for separator in candidates)) if candidates else None
+        self._lookahead = max((len(separator) for separator in candidates), default=1) - 1
+        self._indexes = {separator: i for i, separator in enumerate(self.separators)}
+
+    def feed(self, text: str) -> List[str]:
+        self.pending += text
+        return self._process(final=False)
+
+    def finish(self) -> List[str]:
+        chunks = self._process(final=True)
+        chunks.extend(self._end_split())
+        chunks.extend(self.merge.flush())
+        return chunks
+
+    def _process(self, final: bool) -> List[str]:
+        chunks: List[str] = []
+        text = self.pending
+        position = 0
+        moved = True
+        while moved:
+            moved = False
+            # a separator can only be told apart from a shorter one once the text after it is known
+            limit = len(text) if final else len(text) - self._lookahead
+            for match in self._pattern.finditer(text, position) if self._pattern is not None else ():
+                start = match.start()
+                if start >= limit:
+                    break
+                chunks.extend(self._consume(text[position:start]))
+                position = start
+                index = self._indexes[match.group()]
+                if index < self.k:
+                    # looked for again with the separators of the new level
+                    self._move_up(index)
+                    moved = True
+                    break
+                # the separator starts the next split
+                chunks.extend(self._end_split())
+                chunks.extend(self._consume(match.group()))
+                position = match.end()
+            if not moved and position < limit:
+                chunks.extend(self._consume(text[position:limit]))
+                position = limit
+        self.pending = text[position:]
+        return chunks
+
+    def _consume(self, text: str) -> List[str]:
+        if not text:
+            return []
+        if self.head is not None:
+            self.head += text
+            if len(self.head) >= self.chunk_size:
+                self.head = None
+
+        chunks: List[str] = []
+        if self.separators[self.k] == "":
+            # every character is a split
+            for character in text:
+                chunks.extend(self.merge.add(character))
+            return chunks
+        if self.child is not None:
+            return self.child.feed(text)
+        self.split += text
+        if len(self.split) >= self.chunk_size:
+            # too long to be merged: the splits before it are merged on their own
+            chunks.extend(self.merge.flush())
+            self.child = _Level(self.chunk_size, self.chunk_overlap, self.separators[self.k + 1:])
+            chunks.extend(self.child.feed(self.split))
+            self.split = ""
+        return chunks
+
+    def _end_split(self) -> List[str]:
+        if self.child is not None:
+            chunks = self.child.finish()
+            self.child = None
+            return chunks
+        split, self.split = self.split, ""
+        return self.merge.add(split) if split else []
+
+    def _move_up(self, index: int):
+        """
+        Split the piece on a better separator: what was seen so far is its first split
+        """
+        first = _Level(self.chunk_size, self.chunk_overlap, self.separators[index + 1:])
+        first.k = self.k - index - 1
+        first.merge, first.split, first.child = self.merge, self.split, self.child
+        first._compile()
+
+        self.k = index
+        self._compile()
+        self.merge = _Merge(self.chunk_size, self.chunk_overlap)
+        self.child = None
+        self.split = ""
+        if self.head is None:
+            # too long to be merged: it keeps being split as it was
+            self.child = first
+        else:
+            # nothing came out of it yet, it is merged as a whole
+            self.split = self.head
+
+class StreamingTextSplitter:
+    """
+    Incremental `RecursiveCharacterTextSplitter` for one text: the text is fed piece by piece (pages,
+    paragraphs, blocks) and chunks come out as soon as they are complete - the same chunks as splitting
+    the whole text at once, while only holding about a chunk of text per separator level
+
+    Supports the default splitter setup: plain separators ending with "", kept in the chunks, and
+    lengths counted in characters
+    """
+
+    def __init__(self, splitter: RecursiveCharacterTextSplitter):
+        separators = list(splitter._separators)
+        if (
+            not splitter._keep_separator or splitter._is_separator_regex or splitter._length_function is not len
+            or not separators or separators[-1] != ""
+        ):
+            raise ValueError("Only splitters with plain, kept separators ending with \"\" and character lengths can stream")
+        self._level = _Level(splitter._chunk_size, splitter._chunk_overlap, separators)
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add the next piece of the text and return the chunks it completed
+        """
+        return self._level.feed(text)
+
+    def finish(self) -> List[str]:
+        """
+        Remaining chunks, once the whole text was fed
+        """
+        return self._level.finish()
@@ -31,6 +31,18 @@ class DocumentQATester:
             self.print_response(response, "Upload Response")
             return response.json()
 
+    def wait_for_job(self, job_id: str, timeout: float = 300.0) -> Dict[str, Any]:
+        """Poll an ingestion job until it completes or fails."""
+        print(f"\nWaiting for ingestion job: {job_id}")
+        deadline = time.time() + timeout
+        while True:
+            response = requests.get(f"{self.api_url}/jobs/{job_id}")
+            job = response.json()
+            if job.get("stage") in ("completed", "failed") or time.time() > deadline:
+                self.print_response(response, "Job Status")
+                return job
+            time.sleep(0.5)
+
     def ask_question(self, question: str, n_context_docs: int = 3) -> Dict[str, Any]:
         """Ask a question about the documents."""
         print(f"\nAsking question: {question}")
@@ -73,7 +85,8 @@ def main():
         
         # Wait for processing
         print("Waiting for document processing...")
-        time.sleep(2)
+        if upload_response.get('job_id'):
+            tester.wait_for_job(upload_response['job_id'])
         
         # 2. List documents
         tester.list_documents()
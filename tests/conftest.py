@@ -0,0 +1,91 @@
+import asyncio
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytest
+
+from langchain.llms.base import LLM
+
+from benchmarks.fake_embeddings import HashingEmbeddings
+from intelli_docs.core.config import settings
+from intelli_docs.core.registry import registry
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # every test gets its own vector store, manifests and processed chunks
+    monkeypatch.setattr(settings, "PROCESSED_DATA_DIR", tmp_path / "processed")
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", tmp_path / "processed" / "vector_store")
+    monkeypatch.setattr(settings, "MANIFEST_DIR", tmp_path / "manifests")
+    monkeypatch.setattr(settings, "BM25_INDEX_PATH", tmp_path / "bm25" / "bm25_index.npz")
+    return tmp_path
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    # hashing embeddings instead of downloading the model
+    embeddings = HashingEmbeddings()
+    monkeypatch.setattr(registry, "get_embeddings", lambda model_name=settings.EMBEDDING_MODEL: embeddings)
+    return embeddings
+
+@pytest.fixture
+def embedding_service(data_dir, embeddings):
+    from intelli_docs.services.embedding_service import EmbeddingService
+    service = EmbeddingService()
+    yield service
+    service.close()
+
+class FakeLLM(LLM):
+    """
+    Synchronous LLM answering every prompt with "answer to <question of the prompt>"
+    """
+    calls: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        self.calls.append(prompt)
+        return fake_answer(prompt)
+
+class FakeOllamaClient:
+    """
+    Async client answering like `FakeLLM`, after `release` is set (set from the start)
+    """
+
+    def __init__(self):
+        self.calls: List[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def generate(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        self.calls.append(prompt)
+        await self.release.wait()
+        return fake_answer(prompt)
+
+    async def stream(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        for token in (await self.generate(prompt, options)).split(" "):
+            yield token + " "
+
+    async def aclose(self):
+        pass
+
+def fake_answer(prompt: str) -> str:
+    question = re.search(r"(?:Question|Query): (.*)", prompt).group(1).strip()
+    if "Respond with a single JSON object" in prompt:
+        return json.dumps({"key_points": [question], "relevance_score": 1.0, "answer": f"answer to {question}", "confidence": 1.0})
+    return f"answer to {question}"
+
+@pytest.fixture
+def ollama_client(monkeypatch):
+    client = FakeOllamaClient()
+    monkeypatch.setattr(registry, "get_llm", lambda model=settings.OLLAMA_MODEL: FakeLLM(calls=[]))
+    monkeypatch.setattr(registry, "get_ollama_client", lambda model=settings.OLLAMA_MODEL: client)
+    return client
+
+@pytest.fixture
+def qa_service(embedding_service, ollama_client):
+    from intelli_docs.services.qa_service import QAService
+    service = QAService(embedding_service)
+    yield service
+    service.close()
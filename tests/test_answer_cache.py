@@ -0,0 +1,85 @@
+from intelli_docs.services.answer_cache import AnswerCache
+
+SCOPE = (3, "vector", "full", "documents", None)
+
+EMBEDDINGS = {
+    "what is the warranty period": [1.0, 0.0, 0.0],
+    "how long is the warranty": [0.99, 0.1, 0.0],
+    "who signed the contract": [0.0, 1.0, 0.0],
+}
+
+def embed(question):
+    return EMBEDDINGS[question]
+
+def response(answer):
+    return {"answer": answer, "sources": [], "analysis": {}}
+
+def cache_with_answer(**kwargs) -> AnswerCache:
+    cache = AnswerCache(**kwargs)
+    cache.put("what is the warranty period", SCOPE, embed("what is the warranty period"), response("two years"), ["manual.pdf"])
+    return cache
+
+def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = cache_with_answer()
+    cached, embedding = cache.get("  What is the   WARRANTY period?", SCOPE)
+    assert cached == response("two years")
+    # the question was not embedded for an exact match
+    assert embedding is None
+    assert cache.stats()["exact_hits"] == 1
+
+def test_semantic_hit_above_the_threshold():
+    cache = cache_with_answer(similarity_threshold=0.95)
+    cached, embedding = cache.get("how long is the warranty", SCOPE, embed=embed)
+    assert cached == response("two years")
+    assert embedding == EMBEDDINGS["how long is the warranty"]
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_miss_below_the_threshold_returns_the_embedding():
+    cache = cache_with_answer(similarity_threshold=0.95)
+    cached, embedding = cache.get("who signed the contract", SCOPE, embed=embed)
+    assert cached is None
+    assert embedding == EMBEDDINGS["who signed the contract"]
+    assert cache.stats()["misses"] == 1
+
+def test_scopes_do_not_share_answers():
+    cache = cache_with_answer()
+    other_scope = (5,) + SCOPE[1:]
+    assert cache.get("what is the warranty period", other_scope, embed=embed)[0] is None
+    assert cache.get("how long is the warranty", other_scope, embed=embed)[0] is None
+
+def test_cached_responses_are_copies():
+    cache = cache_with_answer()
+    cache.get("what is the warranty period", SCOPE)[0]["answer"] = "changed"
+    assert cache.get("what is the warranty period", SCOPE)[0]["answer"] == "two years"
+
+def test_invalidation_drops_the_answers_of_a_source():
+    cache = cache_with_answer()
+    cache.put("who signed the contract", SCOPE, embed("who signed the contract"), response("Alice"), ["contract.docx"])
+    assert cache.invalidate_sources(["manual.pdf"]) == 1
+    assert cache.get("what is the warranty period", SCOPE, embed=embed)[0] is None
+    assert cache.get("who signed the contract", SCOPE)[0] == response("Alice")
+    assert cache.stats()["invalidations"] == 1
+
+def test_answer_retrieved_before_an_invalidation_is_not_stored():
+    cache = AnswerCache()
+    generation = cache.generation
+    # a document changes while the answer is generated from its old chunks
+    cache.invalidate_sources(["manual.pdf"])
+    cache.put("what is the warranty period", SCOPE, embed("what is the warranty period"), response("two years"), ["manual.pdf"], generation=generation)
+    assert cache.get("what is the warranty period", SCOPE)[0] is None
+
+    generation = cache.generation
+    cache.put("what is the warranty period", SCOPE, embed("what is the warranty period"), response("three years"), ["manual.pdf"], generation=generation)
+    assert cache.get("what is the warranty period", SCOPE)[0] == response("three years")
+
+def test_expired_entries_are_not_served():
+    cache = cache_with_answer(ttl_seconds=0)
+    assert cache.get("what is the warranty period", SCOPE)[0] is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = cache_with_answer(max_entries=2)
+    cache.put("who signed the contract", SCOPE, embed("who signed the contract"), response("Alice"), [])
+    cache.get("what is the warranty period", SCOPE)
+    cache.put("how long is the warranty", (5,), embed("how long is the warranty"), response("two years"), [])
+    assert cache.get("who signed the contract", SCOPE)[0] is None
+    assert cache.get("what is the warranty period", SCOPE)[0] is not None
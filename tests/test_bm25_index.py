@@ -0,0 +1,96 @@
+import time
+
+from intelli_docs.services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "pump": "The pump reports error E-1234 when the pressure drops",
+    "valve": "Close the valve before servicing the pump",
+    "manual": "This manual covers installation and maintenance",
+    "firmware": "Firmware XJ9.2 fixes the pressure sensor drift",
+}
+
+def build(path=None, **kwargs) -> BM25Index:
+    index = BM25Index(path, **kwargs)
+    index.add(list(DOCUMENTS), list(DOCUMENTS.values()))
+    return index
+
+def test_tokenize_keeps_codes_whole_and_by_parts():
+    assert tokenize("Error E-1234 on XJ9.2") == ["error", "e-1234", "e", "1234", "on", "xj9.2", "xj9", "2"]
+
+def test_search_ranks_exact_terms():
+    index = build()
+    assert [doc_id for doc_id, _ in index.search("E-1234")] == ["pump"]
+    assert index.search("xj9.2")[0][0] == "firmware"
+    # both mention the pump, only one of them twice with "pressure"
+    assert [doc_id for doc_id, _ in index.search("pump pressure")][:1] == ["pump"]
+    assert index.search("unrelated words") == []
+
+def test_search_limits_results():
+    index = build()
+    results = index.search("the pump pressure", n_results=2)
+    assert len(results) == 2
+    assert results[0][1] >= results[1][1]
+
+def test_add_skips_indexed_ids():
+    index = build()
+    index.add(["pump"], ["something else entirely"])
+    assert len(index) == len(DOCUMENTS)
+    assert index.search("E-1234")[0][0] == "pump"
+
+def test_deleted_documents_are_not_found():
+    index = build()
+    index.delete(["pump", "missing"])
+    assert "pump" not in index
+    assert len(index) == len(DOCUMENTS) - 1
+    assert index.search("E-1234") == []
+    assert [doc_id for doc_id, _ in index.search("pump")] == ["valve"]
+
+def test_compaction_keeps_the_live_documents():
+    index = BM25Index()
+    ids = [f"doc-{i}" for i in range(3000)]
+    index.add(ids, [f"common word{i}" for i in range(3000)])
+    index.delete(ids[:2500])
+    # compacted once tombstones outnumber the live documents
+    assert len(index._doc_ids) == 500
+    assert index.search("word2999")[0][0] == "doc-2999"
+    assert index.search("word10") == []
+
+def test_save_and_load_keep_tombstones(tmp_path):
+    path = tmp_path / "bm25.npz"
+    index = build(path)
+    index.delete(["valve"])
+    index.save()
+
+    loaded = BM25Index(path)
+    assert len(loaded) == len(DOCUMENTS) - 1
+    assert "valve" not in loaded
+    assert loaded.search("pump pressure") == index.search("pump pressure")
+    # numbering goes on after the tombstones
+    loaded.add(["new"], ["brand new valve"])
+    assert loaded.search("valve")[0][0] == "new"
+
+def test_save_only_when_changed(tmp_path):
+    path = tmp_path / "bm25.npz"
+    index = build(path)
+    index.save()
+    modified = path.stat().st_mtime_ns
+    index.save()
+    assert path.stat().st_mtime_ns == modified
+
+def test_save_later_batches_changes(tmp_path):
+    path = tmp_path / "bm25.npz"
+    index = build(path, save_delay=0.05)
+    index.save_later()
+    index.delete(["manual"])
+    index.save_later()
+    assert not path.exists()
+    time.sleep(0.3)
+    assert "manual" not in BM25Index(path)
+
+def test_reciprocal_rank_fusion_order():
+    dense = ["a", "b", "c"]
+    keyword = ["c", "d", "a"]
+    # a: 1/61 + 1/63, c: 1/63 + 1/61 (tie, first seen wins), b: 1/62, d: 1/62
+    assert reciprocal_rank_fusion([dense, keyword], k=60) == ["a", "c", "b", "d"]
+    assert reciprocal_rank_fusion([dense], k=60) == dense
+    assert reciprocal_rank_fusion([[], []]) == []
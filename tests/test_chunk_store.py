@@ -0,0 +1,82 @@
+import json
+
+from intelli_docs.services.chunk_store import (
+    INDEX_FILE, METADATA_INDEX_FILE, ChunkStoreReader, ChunkStoreWriter, open_chunk_store
+)
+
+CHUNKS = [
+    ("first chunk", {"source": "doc.txt", "chunk_index": 0}),
+    ("", {"source": "doc.txt", "chunk_index": 1}),
+    ("ünïcödé – 文字", {"source": "doc.txt", "chunk_index": 2, "tag:a": True}),
+]
+
+def write_store(doc_dir, chunks=CHUNKS):
+    writer = ChunkStoreWriter(doc_dir)
+    for text, metadata in chunks:
+        writer.append(text, metadata)
+    writer.commit()
+
+def test_round_trip(tmp_path):
+    write_store(tmp_path)
+    with open_chunk_store(tmp_path) as reader:
+        assert len(reader) == len(CHUNKS)
+        assert [(doc.page_content, doc.metadata) for doc in reader] == CHUNKS
+        # random access, in any order
+        assert reader.metadata(2) == CHUNKS[2][1]
+        assert reader.text(0) == CHUNKS[0][0]
+
+def test_empty_store(tmp_path):
+    write_store(tmp_path, [])
+    with open_chunk_store(tmp_path) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+
+def test_commit_replaces_previous_store(tmp_path):
+    write_store(tmp_path)
+    write_store(tmp_path, [("new", {"chunk_index": 0})])
+    with open_chunk_store(tmp_path) as reader:
+        assert [(doc.page_content, doc.metadata) for doc in reader] == [("new", {"chunk_index": 0})]
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_concurrent_writers_do_not_share_temp_files(tmp_path):
+    write_store(tmp_path)
+    first, second = ChunkStoreWriter(tmp_path), ChunkStoreWriter(tmp_path)
+    first.append("from the first writer", {"chunk_index": 0})
+    second.append("from the second writer", {"chunk_index": 0})
+    first.abort()
+    second.commit()
+    with open_chunk_store(tmp_path) as reader:
+        assert reader.text(0) == "from the second writer"
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_abort_keeps_previous_store(tmp_path):
+    write_store(tmp_path)
+    writer = ChunkStoreWriter(tmp_path)
+    writer.append("discarded", {})
+    writer.abort()
+    with open_chunk_store(tmp_path) as reader:
+        assert len(reader) == len(CHUNKS)
+
+def test_store_without_metadata_index(tmp_path):
+    # stores written before the metadata index existed
+    write_store(tmp_path)
+    (tmp_path / METADATA_INDEX_FILE).unlink()
+    with ChunkStoreReader(tmp_path) as reader:
+        assert [doc.metadata for doc in reader] == [metadata for _, metadata in CHUNKS]
+
+def test_legacy_migration(tmp_path):
+    (tmp_path / "chunk_0.txt").write_text("legacy zero", encoding="utf-8")
+    (tmp_path / "chunk_1.txt").write_text("legacy one", encoding="utf-8")
+    # the legacy metadata files hold `str(dict)`, or JSON
+    (tmp_path / "chunk_0_metadata.json").write_text(str({"source": "old.pdf", "chunk_index": 0}), encoding="utf-8")
+    (tmp_path / "chunk_1_metadata.json").write_text(json.dumps({"source": "old.pdf", "chunk_index": 1}), encoding="utf-8")
+
+    with open_chunk_store(tmp_path) as reader:
+        assert [(doc.page_content, doc.metadata["chunk_index"]) for doc in reader] == [("legacy zero", 0), ("legacy one", 1)]
+        assert reader.metadata(0)["source"] == "old.pdf"
+    assert (tmp_path / INDEX_FILE).exists()
+    assert not list(tmp_path.glob("chunk_*"))
+
+def test_missing_store(tmp_path):
+    assert open_chunk_store(tmp_path / "missing") is None
+    assert open_chunk_store(tmp_path) is None
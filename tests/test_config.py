@@ -0,0 +1,12 @@
+import pytest
+
+from intelli_docs.core.config import Settings
+
+@pytest.mark.parametrize("value", ["", " ", "0", "-1"])
+def test_distance_cutoff_can_be_disabled_from_the_environment(monkeypatch, value):
+    monkeypatch.setenv("RETRIEVAL_MAX_DISTANCE", value)
+    assert Settings().RETRIEVAL_MAX_DISTANCE is None
+
+def test_distance_cutoff_from_the_environment(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_MAX_DISTANCE", "0.5")
+    assert Settings().RETRIEVAL_MAX_DISTANCE == 0.5
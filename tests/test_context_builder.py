@@ -0,0 +1,78 @@
+from intelli_docs.services.context_builder import ContextBuilder
+
+def doc(text, source="manual.pdf", chunk_index=None):
+    metadata = {"source": source}
+    if chunk_index is not None:
+        metadata["chunk_index"] = chunk_index
+    return {"content": text, "metadata": metadata}
+
+OVERLAP = "the shared overlap between both chunks "
+FIRST = "The first chunk starts the section and ends with " + OVERLAP
+SECOND = OVERLAP + "and the second chunk carries on from there."
+
+def test_adjacent_chunks_are_merged_with_their_overlap_once():
+    builder = ContextBuilder(token_budget=1000)
+    # retrieved in the opposite order of the source
+    context = builder.build([doc(SECOND, chunk_index=4), doc(FIRST, chunk_index=3)])
+    assert context == FIRST + SECOND[len(OVERLAP):]
+
+def test_adjacent_chunks_without_overlap_are_joined():
+    builder = ContextBuilder(token_budget=1000)
+    assert builder.pack([doc("alpha text", chunk_index=0), doc("beta text", chunk_index=1)]) == ["alpha text\n\nbeta text"]
+
+def test_distant_chunks_and_other_sources_stay_apart_in_rank_order():
+    builder = ContextBuilder(token_budget=1000)
+    spans = builder.pack([
+        doc("most relevant", chunk_index=9),
+        doc("other source", source="contract.docx", chunk_index=0),
+        doc("far away chunk", chunk_index=1),
+        doc("no position", source="notes.txt"),
+    ])
+    assert spans == ["most relevant", "other source", "far away chunk", "no position"]
+
+def test_merged_span_takes_the_rank_of_its_best_chunk():
+    builder = ContextBuilder(token_budget=1000)
+    spans = builder.pack([
+        doc("unrelated best", source="other.txt", chunk_index=0),
+        doc(SECOND, chunk_index=4),
+        doc("least relevant", source="third.txt", chunk_index=0),
+        doc(FIRST, chunk_index=3),
+    ])
+    assert spans == ["unrelated best", FIRST + SECOND[len(OVERLAP):], "least relevant"]
+
+def test_duplicate_chunks_are_dropped():
+    builder = ContextBuilder(token_budget=1000)
+    spans = builder.pack([
+        doc("same words", source="a.txt", chunk_index=0),
+        doc("same words", source="b.txt", chunk_index=5),
+        doc("same words"),
+    ])
+    assert spans == ["same words"]
+
+def test_spans_beyond_the_budget_are_cut_then_dropped():
+    builder = ContextBuilder(token_budget=20, chars_per_token=1.0, min_overlap=4)
+    spans = builder.pack([
+        doc("ten chars!", source="a.txt"),
+        doc("this one does not fit whole", source="b.txt"),
+        doc("never reached", source="c.txt"),
+    ])
+    # 10 tokens, 2 for the separator, the second span is cut at a word boundary to the 8 left
+    assert spans == ["ten chars!", "this one"]
+
+def test_first_span_is_cut_even_when_it_alone_exceeds_the_budget():
+    builder = ContextBuilder(token_budget=3, chars_per_token=1.0)
+    assert builder.pack([doc("abcdefgh")]) == ["abc"]
+
+def test_saved_ratio_counts_both_sides_the_same_way():
+    builder = ContextBuilder(token_budget=1000)
+    # nothing to merge or drop: the packed context is the unpacked one
+    docs = [doc("alpha text", source="a.txt"), doc("beta text", source="b.txt"), doc("gamma text", source="c.txt")]
+    builder.build(docs)
+    stats = builder.stats()
+    assert stats["retrieved_tokens"] == stats["packed_tokens"]
+    assert stats["saved_tokens_ratio"] == 0
+
+    builder.build([doc(FIRST, chunk_index=3), doc(SECOND, chunk_index=4), doc(FIRST, chunk_index=3)])
+    stats = builder.stats()
+    assert stats["contexts"] == 2
+    assert stats["saved_tokens_ratio"] > 0
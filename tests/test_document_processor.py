@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from docx import Document
+
+from intelli_docs.services.document_processor import DocumentProcessor
+
+def paragraphs(n_paragraphs: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa"]
+    for _ in range(n_paragraphs):
+        sentences = []
+        for _ in range(rng.randint(1, 12)):
+            sentences.append(" ".join(rng.choice(words) for _ in range(rng.randint(3, 25))).capitalize() + ".")
+        yield " ".join(sentences)
+
+def whole_text_chunks(processor: DocumentProcessor, text: str):
+    return processor.text_splitter.split_text(text)
+
+@pytest.mark.parametrize("separator", ["\n", "\n\n"])
+def test_streamed_txt_chunks_match_the_whole_text_split(tmp_path, separator):
+    processor = DocumentProcessor()
+    text = separator.join(paragraphs(1500))
+    # larger than the extraction blocks, so chunks straddle the block boundaries
+    assert len(text) > 3 * 64 * 1024
+    path = tmp_path / "doc.txt"
+    path.write_text(text, encoding="utf-8")
+
+    documents = list(processor.iter_documents(str(path)))
+    assert [doc.page_content for doc in documents] == whole_text_chunks(processor, text)
+    assert [doc.metadata["chunk_index"] for doc in documents] == list(range(len(documents)))
+    assert {doc.metadata["source"] for doc in documents} == {str(path)}
+
+def test_streamed_docx_chunks_match_the_whole_text_split(tmp_path):
+    processor = DocumentProcessor()
+    texts = list(paragraphs(400, seed=11))
+    document = Document()
+    for text in texts:
+        document.add_paragraph(text)
+    path = tmp_path / "doc.docx"
+    document.save(str(path))
+
+    streamed = [doc.page_content for doc in processor.iter_documents(str(path))]
+    assert streamed == whole_text_chunks(processor, "".join(text + "\n" for text in texts))
+
+def test_short_file_is_a_single_chunk(tmp_path):
+    path = tmp_path / "short.txt"
+    path.write_text("just a few words", encoding="utf-8")
+    documents = DocumentProcessor().process_file(str(path))
+    assert [doc.page_content for doc in documents] == ["just a few words"]
+
+def test_unsupported_extension_is_rejected(tmp_path):
+    path = tmp_path / "doc.csv"
+    path.write_text("a,b", encoding="utf-8")
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        DocumentProcessor().process_file(str(path))
@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+import pytest
+
+from langchain.embeddings.base import Embeddings
+
+from intelli_docs.services.embedding_cache import CachedEmbeddings, EmbeddingDiskStore, fcntl
+
+MODEL = "test-model"
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def restart(monkeypatch):
+    # a new process starts without any store open
+    monkeypatch.setattr(EmbeddingDiskStore, "_open_stores", {})
+
+def test_only_missing_texts_reach_the_model(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, MODEL, cache_dir=tmp_path)
+    first = cache.embed_documents(["a", "bb"])
+    second = cache.embed_documents(["bb", "ccc", "a", "ccc"])
+    assert model.calls == [["a", "bb"], ["ccc"]]
+    assert second == [first[1], [3.0, 1.0, 2.0], first[0], [3.0, 1.0, 2.0]]
+    assert cache.stats()["memory_hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+def test_vectors_survive_a_restart(tmp_path, monkeypatch):
+    cache = CachedEmbeddings(CountingEmbeddings(), MODEL, cache_dir=tmp_path)
+    vectors = cache.embed_documents(["a", "bb", "ccc"])
+
+    restart(monkeypatch)
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, MODEL, cache_dir=tmp_path)
+    assert cache.embed_documents(["ccc", "a", "bb"]) == [vectors[2], vectors[0], vectors[1]]
+    assert model.calls == []
+    assert cache.stats()["disk_hits"] == 3
+    assert cache.stats()["disk_entries"] == 3
+
+def test_every_model_gets_its_own_store(tmp_path):
+    CachedEmbeddings(CountingEmbeddings(), MODEL, cache_dir=tmp_path).embed_documents(["a"])
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, "other/model", cache_dir=tmp_path).embed_documents(["a"])
+    assert model.calls == [["a"]]
+
+def test_torn_write_is_truncated(tmp_path):
+    store = EmbeddingDiskStore(tmp_path, MODEL)
+    store.put_many([b"k" * 32, b"l" * 32], np.ones((2, 3)))
+    # a crash after the vector of a third row was written, before its key
+    with open(store.vectors_path, 'ab') as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes()[:7])
+
+    store = EmbeddingDiskStore(tmp_path, MODEL)
+    assert len(store) == 2
+    store.put_many([b"m" * 32], np.full((1, 3), 2.0))
+    assert np.array_equal(store.get(b"m" * 32), np.full(3, 2.0, dtype=np.float32))
+    assert np.array_equal(store.get(b"l" * 32), np.ones(3, dtype=np.float32))
+
+def test_writers_sharing_a_directory_append_after_each_other(tmp_path):
+    # two processes with the same store open
+    first, second = EmbeddingDiskStore(tmp_path, MODEL), EmbeddingDiskStore(tmp_path, MODEL)
+    first.put_many([b"a" * 32], np.full((1, 3), 1.0))
+    second.put_many([b"b" * 32], np.full((1, 3), 2.0))
+    first.put_many([b"c" * 32, b"b" * 32], np.full((2, 3), 3.0))
+
+    assert len(first) == 3
+    for store in (first, second, EmbeddingDiskStore(tmp_path, MODEL)):
+        store._refresh()
+        assert np.array_equal(store.get(b"a" * 32), np.full(3, 1.0, dtype=np.float32))
+        assert np.array_equal(store.get(b"b" * 32), np.full(3, 2.0, dtype=np.float32))
+        assert np.array_equal(store.get(b"c" * 32), np.full(3, 3.0, dtype=np.float32))
+
+@pytest.mark.skipif(fcntl is None, reason="no advisory file locks")
+def test_appends_wait_for_the_file_lock(tmp_path):
+    holder, writer = EmbeddingDiskStore(tmp_path, MODEL), EmbeddingDiskStore(tmp_path, MODEL)
+    done = threading.Event()
+
+    def append():
+        writer.put_many([b"a" * 32], np.ones((1, 3)))
+        done.set()
+
+    with holder._file_lock():
+        thread = threading.Thread(target=append)
+        thread.start()
+        assert not done.wait(0.2)
+    thread.join(5)
+    assert done.is_set()
+    assert len(writer) == 1
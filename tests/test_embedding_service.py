@@ -0,0 +1,80 @@
+from langchain.schema import Document
+
+from intelli_docs.core.config import settings
+
+def chunks(source, texts):
+    return [Document(page_content=text, metadata={"source": source, "chunk_index": i}) for i, text in enumerate(texts)]
+
+def test_reingesting_an_unchanged_source_embeds_nothing(embedding_service):
+    texts = ["alpha beta", "gamma delta", "epsilon zeta"]
+    stats = embedding_service.add_documents(chunks("doc.txt", texts))
+    assert stats == {"added": 3, "unchanged": 0, "deleted": 0, "updated": 0}
+
+    stats = embedding_service.add_documents(chunks("doc.txt", texts))
+    assert stats["added"] == 0
+    assert stats["unchanged"] == 3
+    assert stats["deleted"] == 0
+    assert embedding_service.collection.count() == 3
+
+def test_reingesting_an_edited_source_only_writes_the_difference(embedding_service):
+    embedding_service.add_documents(chunks("doc.txt", ["alpha beta", "gamma delta", "epsilon zeta"]))
+
+    # one chunk edited, one removed, one moved to another position
+    stats = embedding_service.add_documents(chunks("doc.txt", ["epsilon zeta", "alpha beta edited"]))
+    assert stats == {"added": 1, "unchanged": 1, "deleted": 2, "updated": 1}
+    stored = embedding_service.collection.get(include=["documents", "metadatas"])
+    assert sorted(stored["documents"]) == ["alpha beta edited", "epsilon zeta"]
+    assert {doc: meta["chunk_index"] for doc, meta in zip(stored["documents"], stored["metadatas"])} == {
+        "epsilon zeta": 0, "alpha beta edited": 1
+    }
+    assert len(embedding_service.manifest.load("doc.txt")) == 2
+
+def test_duplicate_chunks_get_distinct_ids(embedding_service):
+    stats = embedding_service.add_documents(chunks("doc.txt", ["same text", "other text", "same text"]))
+    assert stats["added"] == 3
+    assert embedding_service.collection.count() == 3
+
+    stats = embedding_service.add_documents(chunks("doc.txt", ["same text", "other text"]))
+    assert stats["deleted"] == 1
+    assert stats["unchanged"] == 2
+
+def test_sources_are_synced_independently(embedding_service):
+    embedding_service.add_documents(chunks("a.txt", ["shared text", "only in a"]) + chunks("b.txt", ["shared text"]))
+    assert embedding_service.collection.count() == 3
+
+    stats = embedding_service.add_documents(chunks("a.txt", ["only in a"]))
+    assert stats["deleted"] == 1
+    assert embedding_service.manifest.load("b.txt")
+    assert embedding_service.collection.count() == 2
+
+def test_reuploaded_chunks_match_the_listed_upload_time(embedding_service):
+    embedding_service.add_documents(chunks("doc.txt", ["alpha beta", "gamma delta"]))
+    embedding_service.add_documents(chunks("doc.txt", ["alpha beta", "gamma delta", "epsilon zeta"]))
+
+    uploaded_at = embedding_service.list_sources()[0]["uploaded_at"]
+    where = embedding_service.build_where(uploaded_after=uploaded_at)
+    stored = embedding_service.collection.get(where=where)
+    assert len(stored["ids"]) == 3
+
+def test_rebuild_keeps_the_ids_of_the_manifest(embedding_service):
+    from intelli_docs.services.chunk_store import ChunkStoreWriter
+    from intelli_docs.services.document_processor import DocumentProcessor
+
+    documents = chunks("doc.txt", ["same text", "other text", "same text"])
+    writer = ChunkStoreWriter(DocumentProcessor.processed_dir("doc.txt"))
+    for doc in documents:
+        writer.append(doc.page_content, doc.metadata)
+    writer.commit()
+    embedding_service.add_documents(documents)
+
+    # the first of the two duplicates is deleted, the manifest lists its second occurrence
+    first = embedding_service.collection.get(where={"chunk_index": 0})["ids"][0]
+    embedding_service.delete_document(first)
+    listed = set(embedding_service.manifest.load("doc.txt"))
+    assert len(listed) == 2
+
+    # the vector store is lost
+    embedding_service.collection.delete(ids=embedding_service.collection.get()["ids"])
+    assert embedding_service.rebuild_missing()[settings.DEFAULT_NAMESPACE]["chunks"] == 2
+    assert set(embedding_service.collection.get()["ids"]) == listed
+    assert set(embedding_service.manifest.load("doc.txt")) == listed
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from langchain.llms.fake import FakeListLLM
+from langchain.schema import Generation, LLMResult
+
+from intelli_docs.core.llm_scheduler import (
+    BACKGROUND, BATCH, INTERACTIVE, LLMQueueFull, LLMQueueTimeout, LLMScheduler, ScheduledLLM
+)
+from intelli_docs.core.metrics import LLM_TOKENS
+
+def scheduler(max_concurrency=1, max_queue=2, timeout=5.0) -> LLMScheduler:
+    return LLMScheduler(
+        max_concurrency=max_concurrency,
+        max_queue=max_queue,
+        queue_timeouts={INTERACTIVE: timeout, BATCH: timeout, BACKGROUND: timeout}
+    )
+
+async def settle():
+    # let the queued calls reach their wait
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_free_slot_is_taken_right_away():
+    async def main():
+        llm = scheduler(max_concurrency=2)
+        await llm.acquire()
+        await llm.acquire()
+        assert llm.stats()["running"] == 2
+        llm.release()
+        llm.release()
+        assert llm.stats()["running"] == 0
+        assert llm.stats()["admitted"] == 2
+
+    asyncio.run(main())
+
+def test_waiters_get_the_slot_by_priority_then_arrival():
+    async def main():
+        llm = scheduler(max_queue=4)
+        order = []
+
+        async def call(name, priority):
+            async with llm.slot(priority):
+                order.append(name)
+
+        await llm.acquire()
+        tasks = [
+            asyncio.create_task(call("background", BACKGROUND)),
+            asyncio.create_task(call("batch", BATCH)),
+            asyncio.create_task(call("first", INTERACTIVE)),
+            asyncio.create_task(call("second", INTERACTIVE)),
+        ]
+        await settle()
+        assert llm.stats()["queued"] == 4
+        llm.release()
+        await asyncio.gather(*tasks)
+        assert order == ["first", "second", "batch", "background"]
+        assert llm.stats()["running"] == 0
+
+    asyncio.run(main())
+
+def test_full_queue_evicts_the_newest_less_urgent_call():
+    async def main():
+        llm = scheduler(max_queue=2)
+        await llm.acquire()
+        old_batch = asyncio.create_task(llm.acquire(BATCH))
+        new_batch = asyncio.create_task(llm.acquire(BATCH))
+        await settle()
+
+        urgent = asyncio.create_task(llm.acquire(INTERACTIVE))
+        await settle()
+        with pytest.raises(LLMQueueFull):
+            await new_batch
+        assert not old_batch.done()
+        assert llm.stats()["rejected"]["evicted"] == 1
+
+        # the interactive call goes first, then the remaining batch call
+        llm.release()
+        await urgent
+        llm.release()
+        await old_batch
+        llm.release()
+        assert llm.stats()["running"] == 0
+
+    asyncio.run(main())
+
+def test_full_queue_rejects_calls_that_cannot_evict():
+    async def main():
+        llm = scheduler(max_queue=1)
+        await llm.acquire()
+        queued = asyncio.create_task(llm.acquire(INTERACTIVE))
+        await settle()
+        with pytest.raises(LLMQueueFull) as rejected:
+            await llm.acquire(BATCH)
+        assert rejected.value.retry_after >= 1
+        assert llm.stats()["rejected"]["queue_full"] == 1
+        llm.release()
+        await queued
+        llm.release()
+
+    asyncio.run(main())
+
+def test_waiting_past_the_deadline_gives_up():
+    async def main():
+        llm = scheduler(timeout=0.05)
+        await llm.acquire()
+        with pytest.raises(LLMQueueTimeout):
+            await llm.acquire()
+        assert llm.stats()["queued"] == 0
+        assert llm.stats()["rejected"]["deadline"] == 1
+        # the slot is freed instead of being handed to the call that gave up
+        llm.release()
+        assert llm.stats()["running"] == 0
+
+    asyncio.run(main())
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        llm = scheduler()
+        await llm.acquire()
+        waiter = asyncio.create_task(llm.acquire())
+        await settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert llm.stats()["queued"] == 0
+        llm.release()
+        assert llm.stats()["running"] == 0
+
+    asyncio.run(main())
+
+def test_check_admission():
+    async def main():
+        llm = scheduler(max_queue=1)
+        llm.check_admission()
+        await llm.acquire()
+        # a free place in the queue
+        llm.check_admission()
+        queued = asyncio.create_task(llm.acquire(BATCH))
+        await settle()
+        # full, but an interactive call would evict the batch one
+        llm.check_admission(INTERACTIVE)
+        with pytest.raises(LLMQueueFull):
+            llm.check_admission(BATCH)
+        llm.release()
+        await queued
+        llm.release()
+
+    asyncio.run(main())
+
+def test_sync_and_async_calls_share_the_slots():
+    async def main():
+        llm = scheduler()
+        await llm.acquire()
+        got_slot = threading.Event()
+
+        def sync_call():
+            with llm.sync_slot():
+                got_slot.set()
+
+        thread = threading.Thread(target=sync_call)
+        thread.start()
+        for _ in range(100):
+            if llm.stats()["queued"]:
+                break
+            time.sleep(0.01)
+        assert llm.stats()["queued"] == 1
+        assert not got_slot.is_set()
+        llm.release()
+        thread.join(5)
+        assert got_slot.is_set()
+        assert llm.stats()["running"] == 0
+
+    asyncio.run(main())
+
+def test_sync_wait_past_the_deadline_gives_up():
+    llm = scheduler(timeout=0.05)
+    llm.acquire_sync()
+    with pytest.raises(LLMQueueTimeout):
+        llm.acquire_sync()
+    llm.release()
+    assert llm.stats()["running"] == 0
+    assert llm.stats()["queued"] == 0
+
+def test_scheduled_llm_holds_a_slot_per_call():
+    llm = scheduler(max_queue=0)
+    scheduled = ScheduledLLM(llm=FakeListLLM(responses=["first", "second"]), scheduler=llm)
+    assert scheduled("question") == "first"
+    assert llm.stats()["admitted"] == 1
+
+    # no slot and no room in the queue: the call is shed
+    llm.acquire_sync()
+    with pytest.raises(LLMQueueFull):
+        scheduled("question")
+    llm.release()
+    assert scheduled("question") == "second"
+
+class CountingLLM(FakeListLLM):
+    """
+    Reports token counts the way the langchain Ollama LLM does, in the generation info
+    """
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs) -> LLMResult:
+        return LLMResult(generations=[
+            [Generation(text="answer", generation_info={"done": True, "prompt_eval_count": 7, "eval_count": 3})]
+            for _ in prompts
+        ])
+
+def test_scheduled_llm_counts_the_tokens():
+    before = {direction: LLM_TOKENS._values.get((direction,), 0) for direction in ("in", "out")}
+    scheduled = ScheduledLLM(llm=CountingLLM(responses=[]), scheduler=scheduler())
+    assert scheduled("question") == "answer"
+    assert LLM_TOKENS._values[("in",)] - before["in"] == 7
+    assert LLM_TOKENS._values[("out",)] - before["out"] == 3
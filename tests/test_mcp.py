@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from typing import Any, List, Optional
+
+import pytest
+
+from langchain.llms.base import LLM
+
+from intelli_docs.core.mcp import MCPPipeline, MCPStep
+
+class EchoLLM(LLM):
+    """
+    Answers every prompt with the prompt itself, after all the calls expected to overlap have started
+    """
+    calls: List[str] = []
+    barrier: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        self.calls.append(prompt)
+        if self.barrier is not None and prompt.startswith("parallel"):
+            self.barrier.wait(5)
+        return prompt
+
+class EchoClient:
+    def __init__(self):
+        self.calls = []
+        self.started = asyncio.Event()
+
+    async def generate(self, prompt: str, options=None) -> str:
+        self.calls.append(prompt)
+        if prompt.startswith("parallel"):
+            # both parallel steps must be in flight for either one to finish
+            if sum(call.startswith("parallel") for call in self.calls) == 2:
+                self.started.set()
+            await asyncio.wait_for(self.started.wait(), 5)
+        return prompt
+
+def step(name, inputs, template, outputs=None, depends_on=None) -> MCPStep:
+    return MCPStep(
+        name=name,
+        description=name,
+        input_schema={key: "str" for key in inputs},
+        output_schema={key: "str" for key in outputs or []},
+        prompt_template=template,
+        depends_on=depends_on
+    )
+
+def pipeline(llm=None, client=None) -> MCPPipeline:
+    mcp = MCPPipeline(llm=llm or EchoLLM(), client=client or EchoClient())
+    # added out of order: `summary` needs the output of `left` and `right`
+    mcp.add_step(step("summary", ["left", "right"], "summary of {left} and {right}"))
+    mcp.add_step(step("left", ["query"], "parallel left {query}"))
+    mcp.add_step(step("right", ["query"], "parallel right {query}"))
+    return mcp
+
+def test_steps_are_ordered_after_the_steps_producing_their_inputs():
+    mcp = pipeline()
+    assert mcp.dependencies == {"summary": ["left", "right"], "left": [], "right": []}
+    assert [s.name for s in mcp.steps] == ["left", "right", "summary"]
+    mcp.close()
+
+def test_explicit_dependencies_override_the_derived_ones():
+    mcp = MCPPipeline(llm=EchoLLM(), client=EchoClient())
+    mcp.add_step(step("first", ["query"], "{query}"))
+    mcp.add_step(step("second", ["query"], "{query}", depends_on=["first"]))
+    assert mcp.dependencies["second"] == ["first"]
+    with pytest.raises(ValueError, match="unknown steps"):
+        mcp.add_step(step("third", ["query"], "{query}", depends_on=["missing"]))
+    mcp.close()
+
+def test_cycles_are_rejected_and_the_pipeline_is_left_unchanged():
+    mcp = MCPPipeline(llm=EchoLLM(), client=EchoClient())
+    mcp.add_step(step("a", ["y"], "{y}", outputs=["x"]))
+    with pytest.raises(ValueError, match="Cyclic"):
+        mcp.add_step(step("b", ["x"], "{x}", outputs=["y"]))
+    assert [s.name for s in mcp.steps] == ["a"]
+    assert "b" not in mcp.chains
+    mcp.close()
+
+def test_prompt_variables_must_be_inputs():
+    mcp = MCPPipeline(llm=EchoLLM(), client=EchoClient())
+    with pytest.raises(ValueError, match="missing from its input schema"):
+        mcp.add_step(step("a", ["query"], "{query} {other}"))
+    mcp.close()
+
+def test_execute_runs_independent_steps_concurrently():
+    llm = EchoLLM(calls=[], barrier=threading.Barrier(2))
+    mcp = pipeline(llm=llm)
+    result = mcp.execute({"query": "q"})
+    assert result["summary"] == "summary of parallel left q and parallel right q"
+    assert llm.calls[-1].startswith("summary")
+    assert result["step_errors"] == {}
+    assert set(result["step_timings"]) == {"left", "right", "summary"}
+    mcp.close()
+
+def test_aexecute_runs_independent_steps_concurrently():
+    client = EchoClient()
+    mcp = pipeline(client=client)
+    result = asyncio.run(mcp.aexecute({"query": "q"}))
+    assert result["summary"] == "summary of parallel left q and parallel right q"
+    assert client.calls[-1].startswith("summary")
+    assert result["step_errors"] == {}
+    mcp.close()
+
+def test_failed_step_is_reported():
+    class FailingClient(EchoClient):
+        async def generate(self, prompt: str, options=None) -> str:
+            if prompt.startswith("parallel right"):
+                raise RuntimeError("model went away")
+            return await super().generate(prompt, options)
+
+    client = FailingClient()
+    # the left step would wait for the right one forever
+    client.started.set()
+    mcp = pipeline(client=client)
+    result = asyncio.run(mcp.aexecute({"query": "q"}))
+    assert result["step_errors"] == {"right": "model went away"}
+    assert result["summary"].startswith("summary of parallel left q")
+    mcp.close()
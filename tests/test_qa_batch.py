@@ -0,0 +1,113 @@
+import asyncio
+
+from langchain.schema import Document
+
+from intelli_docs.core.config import settings
+from intelli_docs.core.llm_scheduler import INTERACTIVE, LLMScheduler
+
+DOCUMENTS = [
+    "The warranty period of the device is two years",
+    "The contract was signed by Alice and Bob",
+]
+
+def ingest(qa_service):
+    qa_service.embedding_service.add_documents([
+        Document(page_content=text, metadata={"source": "doc.txt", "chunk_index": i}) for i, text in enumerate(DOCUMENTS)
+    ])
+
+async def answer_batch_async(qa_service, questions, **kwargs):
+    return [item async for item in qa_service.aanswer_batch(questions, **kwargs)]
+
+def answer_batch(qa_service, questions, **kwargs):
+    return asyncio.run(answer_batch_async(qa_service, questions, **kwargs))
+
+def test_repeated_questions_are_answered_once(qa_service, ollama_client):
+    ingest(qa_service)
+    questions = [
+        "What is the warranty period of the device?",
+        "who signed the contract",
+        "what is the WARRANTY period of the device",
+        "Who signed the contract?",
+        "  what is the warranty period of the device ",
+    ]
+    results = answer_batch(qa_service, questions, pipeline_mode="cheap")
+
+    # one LLM call per distinct question
+    assert len(ollama_client.calls) == 2
+    assert sorted(index for index, _ in results) == list(range(len(questions)))
+    responses = dict(results)
+    assert responses[0]["answer"] == "answer to What is the warranty period of the device?"
+    assert responses[2] == responses[0]
+    assert responses[4] == responses[0]
+    assert responses[1]["answer"] == "answer to who signed the contract"
+    assert responses[3] == responses[1]
+
+def test_every_question_gets_its_own_answer(qa_service, ollama_client):
+    ingest(qa_service)
+    questions = [f"warranty period of device {i}" for i in range(6)] + ["contract signed by Alice"]
+    results = answer_batch(qa_service, questions, pipeline_mode="cheap", concurrency=2)
+
+    assert len(results) == len(questions)
+    for index, response in results:
+        assert response["answer"] == f"answer to {questions[index]}"
+        assert response["sources"]
+
+def test_answers_are_yielded_as_they_finish(qa_service, ollama_client):
+    ingest(qa_service)
+    slow = asyncio.Event()
+
+    async def generate(prompt, options=None):
+        ollama_client.calls.append(prompt)
+        if "first" in prompt:
+            await slow.wait()
+        return '{"answer": "done"}'
+
+    ollama_client.generate = generate
+
+    async def collect():
+        order = []
+        async for index, _ in qa_service.aanswer_batch(
+            ["warranty period first", "warranty period second"], pipeline_mode="cheap"
+        ):
+            order.append(index)
+            slow.set()
+        return order
+
+    # the second question does not wait for the first one
+    assert asyncio.run(collect()) == [1, 0]
+
+def test_evicted_batch_questions_wait_for_a_slot(qa_service, ollama_client):
+    ingest(qa_service)
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+    qa_service.ollama_client.scheduler = scheduler
+
+    async def main():
+        # an interactive call holds the only slot
+        await scheduler.acquire(INTERACTIVE)
+        batch = asyncio.ensure_future(answer_batch_async(qa_service, ["warranty period of the device"], pipeline_mode="cheap"))
+        while not scheduler.stats()["queued"]:
+            await asyncio.sleep(0.01)
+        # another interactive call takes the place of the batch question in the full queue
+        interactive = asyncio.ensure_future(scheduler.acquire(INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["rejected"]["evicted"] == 1
+        scheduler.release()
+        await interactive
+        scheduler.release()
+        return await batch
+
+    [(index, response)] = asyncio.run(main())
+    assert response["answer"] == "answer to warranty period of the device"
+
+def test_batch_questions_give_up_at_the_deadline(qa_service, ollama_client, monkeypatch):
+    ingest(qa_service)
+    monkeypatch.setattr(settings, "LLM_BATCH_QUEUE_TIMEOUT_SECONDS", 0)
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=0)
+    qa_service.ollama_client.scheduler = scheduler
+
+    async def main():
+        await scheduler.acquire(INTERACTIVE)
+        return await answer_batch_async(qa_service, ["warranty period of the device"], pipeline_mode="cheap")
+
+    [(index, response)] = asyncio.run(main())
+    assert response["answer"].startswith("An error occurred")
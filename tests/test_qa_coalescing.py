@@ -0,0 +1,66 @@
+import asyncio
+
+from langchain.schema import Document
+
+def ingest(qa_service):
+    qa_service.embedding_service.add_documents([
+        Document(page_content="The warranty period of the device is two years", metadata={"source": "doc.txt", "chunk_index": 0})
+    ])
+
+async def settle():
+    # let the requests reach the LLM (retrieval runs on the thread pool)
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+
+def test_concurrent_identical_questions_share_one_answer(qa_service, ollama_client):
+    ingest(qa_service)
+    # the cache would answer the late requests on its own
+    qa_service.answer_cache = None
+    ollama_client.release.clear()
+
+    async def main():
+        requests = [
+            asyncio.ensure_future(qa_service.aanswer_question(question, pipeline_mode="cheap"))
+            for question in ["What is the warranty period?", "what is the WARRANTY period", "What is the warranty period?"]
+        ]
+        await settle()
+        ollama_client.release.set()
+        return await asyncio.gather(*requests)
+
+    responses = asyncio.run(main())
+    assert len(ollama_client.calls) == 1
+    assert responses[0]["answer"] == "answer to What is the warranty period?"
+    assert responses[1] == responses[0] and responses[2] == responses[0]
+    assert qa_service.coalescing_stats()["coalesced_requests"] == 2
+    assert qa_service.coalescing_stats()["in_flight"] == 0
+
+def test_different_questions_are_not_coalesced(qa_service, ollama_client):
+    ingest(qa_service)
+    qa_service.answer_cache = None
+
+    async def main():
+        return await asyncio.gather(
+            qa_service.aanswer_question("What is the warranty period?", pipeline_mode="cheap"),
+            qa_service.aanswer_question("What is the warranty period?", n_context_docs=1, pipeline_mode="cheap"),
+            qa_service.aanswer_question("How long is the device warranty?", pipeline_mode="cheap")
+        )
+
+    asyncio.run(main())
+    assert len(ollama_client.calls) == 3
+    assert qa_service.coalescing_stats()["coalesced_requests"] == 0
+
+def test_cancelled_request_does_not_cancel_the_shared_answer(qa_service, ollama_client):
+    ingest(qa_service)
+    qa_service.answer_cache = None
+    ollama_client.release.clear()
+
+    async def main():
+        first = asyncio.ensure_future(qa_service.aanswer_question("What is the warranty period?", pipeline_mode="cheap"))
+        second = asyncio.ensure_future(qa_service.aanswer_question("What is the warranty period?", pipeline_mode="cheap"))
+        await settle()
+        first.cancel()
+        ollama_client.release.set()
+        return await second
+
+    assert asyncio.run(main())["answer"] == "answer to What is the warranty period?"
+    assert len(ollama_client.calls) == 1
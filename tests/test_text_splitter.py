@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from intelli_docs.services.text_splitter import StreamingTextSplitter
+
+PIECES = ["a", "bb", "word", " ", "  ", "\n", "\n\n", "\n\n\n", "\n \n", "abcdefghijklmnop"]
+
+def stream_split(splitter, pieces):
+    streaming = StreamingTextSplitter(splitter)
+    chunks = []
+    for piece in pieces:
+        chunks.extend(streaming.feed(piece))
+    chunks.extend(streaming.finish())
+    return chunks
+
+def random_cut(rng, text):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 12))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_any_cut_of_the_text_gives_the_chunks_of_the_whole_text(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        chunk_size = rng.randint(2, 40)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=rng.randint(0, chunk_size - 1))
+        text = "".join(rng.choice(PIECES) * rng.choice([1, 1, 1, 5, 20]) for _ in range(rng.randint(0, 60)))
+        assert stream_split(splitter, random_cut(rng, text)) == splitter.split_text(text), repr(text)
+
+def test_separator_split_across_pieces():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=10, chunk_overlap=0)
+    text = "first part\n\nsecond one\nthird"
+    assert stream_split(splitter, ["first part\n", "\nsecond one\n", "third"]) == splitter.split_text(text)
+
+def test_chunks_come_out_before_the_end_of_the_text():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=20, chunk_overlap=5)
+    streaming = StreamingTextSplitter(splitter)
+    chunks = []
+    for _ in range(50):
+        chunks.extend(streaming.feed("some words of a paragraph\n\n"))
+    assert len(chunks) > 40
+
+def test_unsupported_splitter_is_rejected():
+    with pytest.raises(ValueError):
+        StreamingTextSplitter(RecursiveCharacterTextSplitter(separators=["\n\n", "\n"]))
+    with pytest.raises(ValueError):
+        StreamingTextSplitter(RecursiveCharacterTextSplitter(keep_separator=False))